@@ -0,0 +1,184 @@
+"""Aggregated matching: interchangeable students are solved as one class with a count."""
+
+import time
+
+import numpy as np
+import pandas as pd
+import pulp
+
+import utils
+from utils import (
+    MATCH_COLUMNS,
+    INTEGRALITY_TOLERANCE,
+    PairTable,
+    problem_constraints,
+    solution_values,
+    is_totally_unimodular,
+    run_config
+)
+
+# -------------------------- START CLASS FUNCTIONS -------------------------
+
+def objective_coefficients(pairs, previous=None):
+    """Objective coefficient of each candidate pair, as in perform_ilp_matching."""
+    run_config()
+    if previous is not None:
+        return (1 - utils.SIMILARITY_WEIGHT) * pairs.probability + utils.SIMILARITY_WEIGHT * pairs.previous
+    return pairs.probability
+
+
+def student_classes(pairs, coefficients):
+    """
+    Group students whose candidate rows are identical.
+
+    Two students are interchangeable when they have the same candidate projects
+    with the same objective coefficients. Exclusions, the similarity term and
+    zero-probability pairs are already reflected in the candidate pairs, and
+    locked students were assigned beforehand, so swapping two students of a
+    class never changes the objective or feasibility.
+
+    Parameters:
+    pairs (PairTable): Candidate pairs
+    coefficients (np.ndarray): Objective coefficient of each candidate
+
+    Returns:
+    tuple: (class code of each student, candidate positions ordered by student
+        then project, start of each student's candidates in that order)
+    """
+    order = np.lexsort((pairs.project, pairs.student))
+    starts = np.searchsorted(pairs.student[order], np.arange(len(pairs.students) + 1))
+    projects = pairs.project[order]
+    ordered_coefficients = coefficients[order]
+
+    signatures = {}
+    class_of = np.empty(len(pairs.students), dtype=np.int64)
+    for student in range(len(pairs.students)):
+        row = slice(starts[student], starts[student + 1])
+        signature = (projects[row].tobytes(), ordered_coefficients[row].tobytes())
+        class_of[student] = signatures.setdefault(signature, len(signatures))
+    return class_of, order, starts
+
+# -------------------------- END CLASS FUNCTIONS -------------------------
+
+# -------------------------- START AGGREGATED MATCHING FUNCTIONS -------------------------
+
+def aggregated_matching(input_data: pd.DataFrame, faculty_slots: dict, exclusions: list = None,
+                        previous: pd.DataFrame = None, relax: bool = False, stats: dict = None,
+                        log_path: str = None):
+    """
+    Solve the matching with one integer count variable per (student class, project).
+
+    Students with identical candidate rows form a class; the model chooses how
+    many members of each class go to each project, with each class bounded by
+    its size and each project by its slots. The constraint matrix is still a
+    bipartite incidence matrix, so the optimum is the same as perform_ilp_matching's.
+    The counts are then handed out to the class members in name order, and the
+    projects in name order, so the result is deterministic.
+
+    Parameters:
+        input_data (pd.DataFrame): Pair table from process_preferences (after mandatory matches)
+        faculty_slots (dict): Dictionary mapping faculty projects to number of open slots
+        exclusions (list): Optional list of excluded (project, student) tuples
+        previous (pd.DataFrame): Optional previous matching used for the similarity term
+        relax (bool): Solve the LP relaxation (re-solved as an ILP if fractional)
+        stats (dict): Optional dictionary filled with the perform_ilp_matching statistics
+            plus 'students' and 'student_classes'
+        log_path (str): Optional file CBC writes its log to while solving
+
+    Returns:
+        pd.DataFrame: The optimal matches, with the same columns as perform_ilp_matching
+    """
+    pairs = PairTable.from_frame(input_data, exclusions, previous)
+    if stats is None:
+        stats = {}
+    stats.update({'candidate_pairs': len(input_data), 'pruned_pairs': len(input_data) - len(pairs),
+                  'variables': 0, 'constraints': 0, 'method': 'lp' if relax else 'mip',
+                  'solver_status': 'Not Solved', 'solver_objective': None, 'gap': None, 'solve_seconds': 0.0,
+                  'students': len(pairs.students), 'student_classes': 0})
+    if len(pairs) == 0:
+        stats.update({'solver_status': 'Empty', 'solver_objective': 0.0, 'gap': 0.0})
+        return pd.DataFrame(columns=MATCH_COLUMNS)
+
+    coefficients = objective_coefficients(pairs, previous)
+    class_of, order, starts = student_classes(pairs, coefficients)
+    n_classes = int(class_of.max()) + 1
+    sizes = np.bincount(class_of)
+    members = [[] for _ in range(n_classes)]
+    for student in np.argsort(np.asarray(pairs.students, dtype=str), kind='stable'):
+        members[class_of[student]].append(student)
+
+    # One variable per candidate of each class's first member, bounded by the class constraint
+    problem = pulp.LpProblem("Aggregated_Matching", pulp.LpMaximize)
+    category = 'Continuous' if relax else 'Integer'
+    class_candidates = []
+    for code in range(n_classes):
+        first = members[code][0]
+        class_candidates.append(order[starts[first]:starts[first + 1]])
+    y = []
+    for code, candidates in enumerate(class_candidates):
+        for position in candidates:
+            var = utils.new_variable(problem, f"count_{code}_{pairs.project[position]}", category)
+            var.upBound = None
+            y.append(var)
+    offsets = np.cumsum([0] + [len(candidates) for candidates in class_candidates])
+    all_candidates = np.concatenate(class_candidates)
+    problem += pulp.LpAffineExpression(zip(y, coefficients[all_candidates].tolist()))
+
+    for code in range(n_classes):
+        problem += (pulp.LpAffineExpression([(var, 1) for var in y[offsets[code]:offsets[code + 1]]])
+                    <= int(sizes[code]), f"Student_Assignment_class_{code}")
+    by_project = {}
+    for var, position in zip(y, all_candidates):
+        by_project.setdefault(pairs.project[position], []).append(var)
+    for project, variables in by_project.items():
+        faculty_project = pairs.projects[project]
+        if faculty_project in faculty_slots:
+            problem += (pulp.LpAffineExpression([(var, 1) for var in variables]) <= faculty_slots[faculty_project],
+                        f"Faculty_Openings_{faculty_project}")
+
+    if relax and not is_totally_unimodular(problem):
+        relax = False
+        for var in y:
+            var.cat = pulp.LpInteger
+    stats.update({'variables': len(y), 'constraints': len(problem_constraints(problem)), 'student_classes': n_classes,
+                  'method': 'lp' if relax else 'mip'})
+    solve_start = time.perf_counter()
+    problem.solve(pulp.PULP_CBC_CMD(msg=False, mip=not relax, logPath=log_path))
+    stats['solve_seconds'] = time.perf_counter() - solve_start
+    stats['solver_status'] = pulp.LpStatus[problem.status]
+    if pulp.LpStatus[problem.status] != "Optimal":
+        print(f"Warning: No optimal solution found. Status: {pulp.LpStatus[problem.status]}")
+        return pd.DataFrame()
+
+    counts = solution_values(y)
+    if relax and (np.abs(counts - np.round(counts)) > INTEGRALITY_TOLERANCE).any():
+        print("Note: Aggregated LP solution is fractional; re-solving as an ILP.")
+        for var in y:
+            var.cat = pulp.LpInteger
+        solve_start = time.perf_counter()
+        problem.solve(pulp.PULP_CBC_CMD(msg=False, logPath=log_path))
+        stats['solve_seconds'] += time.perf_counter() - solve_start
+        stats['solver_status'] = pulp.LpStatus[problem.status]
+        stats['method'] = 'mip'
+        if pulp.LpStatus[problem.status] != "Optimal":
+            print(f"Warning: No optimal solution found. Status: {pulp.LpStatus[problem.status]}")
+            return pd.DataFrame()
+        counts = solution_values(y)
+    stats['solver_objective'] = float(pulp.value(problem.objective) or 0.0)
+    stats['gap'] = 0.0
+    counts = np.round(counts).astype(np.int64)
+
+    # Hand out each class's counts: members in name order, projects in name order
+    matched = []
+    for code in range(n_classes):
+        candidates = class_candidates[code]
+        assigned = 0
+        for j in sorted(range(len(candidates)), key=lambda j: pairs.projects[pairs.project[candidates[j]]]):
+            for student in members[code][assigned:assigned + counts[offsets[code] + j]]:
+                # Members share the first member's project order, so the j-th candidate matches
+                matched.append(order[starts[student] + j])
+            assigned += counts[offsets[code] + j]
+    matched = np.sort(np.array(matched, dtype=np.int64))
+    return input_data.take(pairs.rows[matched])[MATCH_COLUMNS].reset_index(drop=True)
+
+# -------------------------- END AGGREGATED MATCHING FUNCTIONS -------------------------
@@ -0,0 +1,234 @@
+"""Manifest-driven batch matching for many cohorts."""
+
+import argparse
+import os
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+import yaml
+
+from config import CONFIG_PARAMS, set_config_overrides
+from utils import (
+    process_preferences,
+    process_locks_exclusions,
+    assign_mandatory_matches,
+    name_resolution_warning,
+    matching_objective
+)
+from planner import EXACT_ENGINES, SolvePlan, estimate_problem, plan_solve, solve_planned
+from metrics import build_run_metrics, append_jsonl, write_prometheus_textfile
+
+# Manifest columns that name the input files of a cohort
+FILE_KEYS = ['student_file', 'faculty_file', 'locking_file', 'previous_file']
+
+# -------------------------- START MANIFEST FUNCTIONS -------------------------
+
+def load_manifest(manifest_path):
+    """
+    Load a batch manifest listing the cohorts to match.
+
+    A YAML manifest is either a list of cohorts or a mapping with a 'cohorts' list.
+    A CSV manifest has one row per cohort. Each cohort needs 'name', 'student_file'
+    and 'faculty_file'; 'locking_file', 'previous_file' and any configuration
+    parameter (e.g. 'faculty_weight') are optional per-cohort overrides. Relative
+    file paths are resolved against the manifest's directory.
+
+    Parameters:
+    manifest_path (str): Path to the .yaml/.yml or .csv manifest
+
+    Returns:
+    list: List of cohort dictionaries
+    """
+    if manifest_path.endswith('.csv'):
+        manifest_df = pd.read_csv(manifest_path)
+        cohorts = [
+            {key: value for key, value in row.items() if not pd.isna(value)}
+            for row in manifest_df.to_dict("records")
+        ]
+    else:
+        with open(manifest_path, 'r') as manifest_file:
+            manifest = yaml.safe_load(manifest_file)
+        cohorts = manifest.get('cohorts', []) if isinstance(manifest, dict) else manifest
+    if not cohorts:
+        raise ValueError(f"Manifest '{manifest_path}' does not list any cohorts.")
+
+    base_dir = os.path.dirname(os.path.abspath(manifest_path))
+    names = set()
+    for cohort in cohorts:
+        missing = [key for key in ['name', 'student_file', 'faculty_file'] if key not in cohort]
+        if missing:
+            raise ValueError(f"Cohort {cohort} is missing: {', '.join(missing)}")
+        cohort['name'] = str(cohort['name'])
+        if cohort['name'] in names:
+            raise ValueError(f"Duplicate cohort name '{cohort['name']}' in manifest.")
+        names.add(cohort['name'])
+
+        unknown = [key for key in cohort if key not in ['name'] + FILE_KEYS + CONFIG_PARAMS]
+        if unknown:
+            raise ValueError(f"Cohort '{cohort['name']}' has unknown settings: {', '.join(unknown)}")
+        for key in FILE_KEYS:
+            if key in cohort:
+                cohort[key] = os.path.join(base_dir, str(cohort[key]))
+    return cohorts
+
+# -------------------------- END MANIFEST FUNCTIONS -------------------------
+
+# -------------------------- START BATCH FUNCTIONS -------------------------
+
+def run_cohort(cohort, output_dir, engine='auto'):
+    """
+    Run the full matching pipeline for one cohort and write its matches.
+
+    Failures are reported in the returned summary instead of being raised, so one
+    bad cohort does not stop the rest of the batch.
+
+    Parameters:
+    cohort (dict): Cohort from load_manifest
+    output_dir (str): Directory for the cohort's output CSV
+    engine (str): 'auto' to let the planner choose, or one of EXACT_ENGINES
+
+    Returns:
+    dict: Summary of the run with per-stage timings in seconds
+    """
+    summary = {'cohort': cohort['name'], 'status': 'failed', 'students': None, 'projects': None,
+               'matched': None, 'objective': None, 'engine': None, 'plan': None, 'read_seconds': None,
+               'preferences_seconds': None, 'mandatory_seconds': None, 'ilp_seconds': None,
+               'total_seconds': None, 'output': None, 'error': None}
+    start = time.perf_counter()
+    try:
+        set_config_overrides({key: cohort[key] for key in CONFIG_PARAMS if key in cohort})
+
+        stage_start = time.perf_counter()
+        df_student = pd.read_csv(cohort['student_file'])
+        df_faculty = pd.read_csv(cohort['faculty_file'])
+        df_locking = pd.read_csv(cohort['locking_file']) if 'locking_file' in cohort else None
+        df_previous = pd.read_csv(cohort['previous_file']) if 'previous_file' in cohort else None
+        summary['read_seconds'] = time.perf_counter() - stage_start
+
+        stage_start = time.perf_counter()
+        name_issues = []
+        input_data, faculty_slots = process_preferences(df_student, df_faculty, name_issues)
+        warning = name_resolution_warning(name_issues)
+        if warning is not None:
+            print(f"[{cohort['name']}] {warning}")
+        pair_table = input_data
+        if df_locking is not None:
+            locks, exclusions = process_locks_exclusions(df_locking)
+        else:
+            locks = None
+            exclusions = None
+        summary['preferences_seconds'] = time.perf_counter() - stage_start
+        summary['students'] = df_student['Full Name'].nunique()
+        summary['projects'] = len(faculty_slots)
+
+        stage_start = time.perf_counter()
+        input_data, mandatory_matches, updated_slots = assign_mandatory_matches(input_data, faculty_slots, locks)
+        summary['mandatory_seconds'] = time.perf_counter() - stage_start
+
+        estimate = estimate_problem(input_data, updated_slots, locks, exclusions, df_previous)
+        if engine == 'auto':
+            plan = plan_solve(estimate)
+        else:
+            plan = SolvePlan(engine, estimate, [f"engine '{engine}' requested"])
+        summary['engine'] = plan.engine
+        summary['plan'] = plan.summary()
+        print(f"[{cohort['name']}] Plan: {plan.summary()}")
+
+        stage_start = time.perf_counter()
+        solver_stats = {}
+        ilp_matches = solve_planned(plan, input_data, updated_slots, exclusions, df_previous, stats=solver_stats)
+        summary['ilp_seconds'] = time.perf_counter() - stage_start
+
+        combined_matches = pd.concat([mandatory_matches, ilp_matches], ignore_index=True)
+        output_path = os.path.join(output_dir, f"{cohort['name']}.csv")
+        combined_matches.to_csv(output_path, index=False)
+
+        summary['matched'] = len(combined_matches)
+        summary['objective'] = matching_objective(combined_matches, df_previous)
+        summary['output'] = output_path
+        summary['status'] = 'ok'
+        stage_seconds = {'read': summary['read_seconds'], 'preprocess': summary['preferences_seconds'],
+                         'mandatory': summary['mandatory_seconds'], 'solve': summary['ilp_seconds']}
+        summary['metrics'] = build_run_metrics(cohort['name'], plan.engine, pair_table, faculty_slots, combined_matches,
+                                               mandatory_matches, stage_seconds, solver_stats, df_previous,
+                                               time.perf_counter() - start)
+    except Exception as e:
+        summary['error'] = f"{type(e).__name__}: {e}"
+        traceback.print_exc()
+    finally:
+        set_config_overrides({})
+    summary['total_seconds'] = time.perf_counter() - start
+    return summary
+
+
+def run_batch(cohorts, output_dir, processes=None, prometheus_path=None, engine='auto'):
+    """
+    Match every cohort in parallel worker processes.
+
+    A metrics record for every successful cohort is appended to
+    <output_dir>/metrics.jsonl.
+
+    Parameters:
+    cohorts (list): Cohorts from load_manifest
+    output_dir (str): Directory for per-cohort outputs and summary.csv
+    processes (int): Number of worker processes (defaults to the CPU count)
+    prometheus_path (str): Optional node-exporter textfile for the cohorts' metrics
+    engine (str): 'auto' to plan each cohort separately, or one of EXACT_ENGINES
+
+    Returns:
+    pd.DataFrame: One summary row per cohort, in manifest order
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    if processes is None:
+        processes = os.cpu_count() or 1
+    processes = max(1, min(processes, len(cohorts)))
+
+    summaries = []
+    with ProcessPoolExecutor(max_workers=processes) as pool:
+        futures = [pool.submit(run_cohort, cohort, output_dir, engine) for cohort in cohorts]
+        for cohort, future in zip(cohorts, futures):
+            try:
+                summaries.append(future.result())
+            except Exception as e:
+                # The worker process itself died; record it and keep going
+                summaries.append({'cohort': cohort['name'], 'status': 'failed',
+                                  'error': f"{type(e).__name__}: {e}"})
+
+    records = [summary.pop('metrics') for summary in summaries if 'metrics' in summary]
+    for record in records:
+        append_jsonl(record, os.path.join(output_dir, 'metrics.jsonl'))
+    if prometheus_path is not None and records:
+        write_prometheus_textfile(records, prometheus_path)
+
+    summary_df = pd.DataFrame(summaries)
+    summary_df.to_csv(os.path.join(output_dir, 'summary.csv'), index=False)
+    return summary_df
+
+
+def main(argv=None):
+    """Command line entry point: python main.py batch <manifest> [--output-dir DIR] [--workers N] [--engine E]"""
+    parser = argparse.ArgumentParser(prog='python main.py batch',
+                                     description='Run the matching for every cohort in a manifest')
+    parser.add_argument('manifest', help='YAML or CSV manifest listing the cohorts')
+    parser.add_argument('--output-dir', default='batch_output', help='Directory for outputs and summary.csv')
+    parser.add_argument('--workers', type=int, help='Number of worker processes')
+    parser.add_argument('--prometheus', help='Node-exporter textfile for the run metrics')
+    parser.add_argument('--engine', choices=['auto'] + EXACT_ENGINES, default='auto',
+                        help='Solve engine (auto: chosen per cohort by problem size)')
+    args = parser.parse_args(argv)
+
+    try:
+        cohorts = load_manifest(args.manifest)
+    except Exception as e:
+        print(f"Error loading manifest: {e}")
+        return 1
+
+    print(f"Running {len(cohorts)} cohorts...")
+    summary_df = run_batch(cohorts, args.output_dir, args.workers, args.prometheus, args.engine)
+    print(summary_df[['cohort', 'status', 'engine', 'matched', 'total_seconds', 'error']].to_string(index=False))
+    print(f"Summary written to {os.path.join(args.output_dir, 'summary.csv')}")
+    return 0 if (summary_df['status'] == 'ok').all() else 1
+
+# -------------------------- END BATCH FUNCTIONS -------------------------
@@ -0,0 +1,171 @@
+"""Bounded LRU cache of solve results keyed by a fingerprint of the solve inputs."""
+
+import hashlib
+import os
+import pickle
+import tempfile
+import threading
+from collections import OrderedDict
+
+import pandas as pd
+
+# Bump when the layout of cached results changes so old disk entries are ignored
+CACHE_FORMAT = 1
+
+# -------------------------- START FINGERPRINT FUNCTIONS -------------------------
+
+def _hash_frame(hasher, frame):
+    """Add a DataFrame's columns and contents to a hash."""
+    if frame is None:
+        hasher.update(b'<none>')
+        return
+    hasher.update(repr(list(frame.columns)).encode('utf-8'))
+    hasher.update(pd.util.hash_pandas_object(frame, index=False).to_numpy().tobytes())
+
+
+def solve_fingerprint(input_data: pd.DataFrame, faculty_slots: dict, locks: list = None,
+                      exclusions: list = None, previous: pd.DataFrame = None, config: dict = None,
+                      **options):
+    """
+    Hash everything that determines a solve's result.
+
+    Parameters:
+    input_data (pd.DataFrame): Pair table from process_preferences
+    faculty_slots (dict): Effective slots per faculty project
+    locks (list): Locked (project, student) tuples
+    exclusions (list): Excluded (project, student) tuples
+    previous (pd.DataFrame): Previous matching used for the similarity term
+    config (dict): Configuration snapshot
+    **options: Any other solve options (e.g. engine), included in the hash
+
+    Returns:
+    str: Hex digest identifying the solve
+    """
+    hasher = hashlib.sha256(f"format {CACHE_FORMAT}".encode('utf-8'))
+    _hash_frame(hasher, input_data)
+    hasher.update(repr(sorted(faculty_slots.items())).encode('utf-8'))
+    hasher.update(repr(sorted(locks or [])).encode('utf-8'))
+    hasher.update(repr(sorted(exclusions or [])).encode('utf-8'))
+    _hash_frame(hasher, previous)
+    hasher.update(repr(sorted((config or {}).items())).encode('utf-8'))
+    hasher.update(repr(sorted(options.items())).encode('utf-8'))
+    return hasher.hexdigest()
+
+# -------------------------- END FINGERPRINT FUNCTIONS -------------------------
+
+# -------------------------- START CACHE CLASS -------------------------
+
+class SolutionCache:
+    """
+    Least-recently-used cache of solve results.
+
+    Entries are kept in memory and, when a directory is set, also written to
+    <directory>/<fingerprint>.pkl so they survive a restart. Both are bounded
+    by max_entries.
+
+    Disk entries are pickles, and unpickling runs code named in the file, so the
+    directory must only be writable by trusted users. It is created private to
+    the current user (mode 0o700).
+    """
+
+    def __init__(self, max_entries=16, directory=None):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+        self.directory = None
+        if directory is not None:
+            self.set_directory(directory)
+
+    def set_directory(self, directory):
+        """Persist entries to a directory (None keeps them in memory only)."""
+        with self.lock:
+            self.directory = directory
+            if directory is not None:
+                os.makedirs(directory, mode=0o700, exist_ok=True)
+                self._trim_directory()
+
+    def _path(self, key):
+        return os.path.join(self.directory, f"{key}.pkl")
+
+    def _disk_keys(self):
+        """Fingerprints stored on disk, least recently used first."""
+        files = [name for name in os.listdir(self.directory) if name.endswith('.pkl')]
+        files.sort(key=lambda name: os.path.getmtime(os.path.join(self.directory, name)))
+        return [name[:-len('.pkl')] for name in files]
+
+    def _trim_directory(self):
+        keys = self._disk_keys()
+        for key in keys[:max(len(keys) - self.max_entries, 0)]:
+            os.remove(self._path(key))
+
+    def get(self, key):
+        """Return the cached result for a fingerprint, or None."""
+        with self.lock:
+            if key in self.entries:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                if self.directory is not None and os.path.exists(self._path(key)):
+                    os.utime(self._path(key))
+                return self.entries[key]
+            if self.directory is not None and os.path.exists(self._path(key)):
+                try:
+                    with open(self._path(key), 'rb') as handle:
+                        stored_format, value = pickle.load(handle)
+                except Exception:
+                    stored_format, value = None, None
+                if stored_format == CACHE_FORMAT:
+                    os.utime(self._path(key))
+                    self._remember(key, value)
+                    self.hits += 1
+                    return value
+            self.misses += 1
+            return None
+
+    def put(self, key, value):
+        """Store a result, evicting the least recently used entries beyond max_entries."""
+        with self.lock:
+            self._remember(key, value)
+            if self.directory is not None:
+                handle, temp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+                with os.fdopen(handle, 'wb') as temp_file:
+                    pickle.dump((CACHE_FORMAT, value), temp_file, protocol=pickle.HIGHEST_PROTOCOL)
+                os.replace(temp_path, self._path(key))
+                self._trim_directory()
+
+    def _remember(self, key, value):
+        self.entries[key] = value
+        self.entries.move_to_end(key)
+        self._evict()
+
+    def _evict(self):
+        """Drop least recently used entries (and their disk copies) beyond max_entries."""
+        while len(self.entries) > self.max_entries:
+            evicted, _ = self.entries.popitem(last=False)
+            if self.directory is not None and os.path.exists(self._path(evicted)):
+                os.remove(self._path(evicted))
+
+    def resize(self, max_entries):
+        """Change the maximum number of entries."""
+        with self.lock:
+            self.max_entries = max_entries
+            self._evict()
+            if self.directory is not None:
+                self._trim_directory()
+
+    def clear(self):
+        """Remove every entry (including the disk copies) and reset the statistics."""
+        with self.lock:
+            self.entries.clear()
+            self.hits = self.misses = 0
+            if self.directory is not None:
+                for key in self._disk_keys():
+                    os.remove(self._path(key))
+
+    def stats(self):
+        """Hit/miss counts and sizes."""
+        return {'hits': self.hits, 'misses': self.misses, 'entries': len(self.entries),
+                'max_entries': self.max_entries, 'directory': self.directory}
+
+# -------------------------- END CACHE CLASS -------------------------
@@ -3,8 +3,50 @@ import os
 
 CONFIG_PATH = 'config.yaml'
 
+# Configuration parameters used by the matching algorithm
+CONFIG_PARAMS = ['faculty_weight', 'student_no_rank_penalty', 'faculty_no_rank_penalty', 'low_rank_penalty', 'similarity_weight']
+
+# Parameters that change the pair table (the rest only change the ILP objective)
+PAIR_TABLE_PARAMS = ['faculty_weight', 'student_no_rank_penalty', 'faculty_no_rank_penalty', 'low_rank_penalty']
+
+# In-memory values that take precedence over the configuration file
+_config_overrides = {}
+
+
+def set_config_overrides(overrides):
+    """
+    Replace the in-memory configuration overrides.
+    
+    Parameters:
+    overrides (dict): Configuration values that take precedence over the YAML file
+    """
+    unknown = [key for key in overrides if key not in CONFIG_PARAMS]
+    if unknown:
+        raise ValueError(f"Unknown configuration parameters: {', '.join(unknown)}")
+    _config_overrides.clear()
+    _config_overrides.update(overrides)
+
+def get_config_overrides():
+    """
+    Get a copy of the in-memory configuration overrides.
+    
+    Returns:
+    dict: Configuration values that take precedence over the YAML file
+    """
+    return dict(_config_overrides)
 
 def load_config():
+    """
+    Load algorithm configuration parameters from YAML file, with in-memory overrides applied.
+    
+    Returns:
+    dict: Configuration parameters
+    """
+    config = _load_config_file()
+    config.update(_config_overrides)
+    return config
+
+def _load_config_file():
     """
     Load algorithm configuration parameters from YAML file.
     
@@ -32,8 +74,7 @@ def load_config():
             config = yaml.safe_load(config_file)
             
         # Validate required parameters
-        required_params = ['faculty_weight', 'student_no_rank_penalty', 'faculty_no_rank_penalty', 'low_rank_penalty', 'similarity_weight']
-        for param in required_params:
+        for param in CONFIG_PARAMS:
             if param not in config:
                 print(f"Warning: Missing parameter '{param}' in config. Using default value.")
                 config[param] = 0.5
@@ -101,6 +142,6 @@ def set_config_value(key, value):
     key (str): Configuration key
     value: Configuration value
     """
-    config = load_config()
+    config = _load_config_file()
     config[key] = value
     save_config(config)
\ No newline at end of file
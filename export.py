@@ -0,0 +1,217 @@
+"""Streaming multi-format export of matching results."""
+
+import gzip
+import os
+import re
+import tempfile
+
+import pandas as pd
+
+from utils import MATCH_COLUMNS
+
+# File formats export_matches can write
+EXPORT_FORMATS = ['csv', 'jsonl', 'parquet']
+
+# Compression options for the text formats (Parquet uses its own codecs)
+COMPRESSIONS = [None, 'gzip']
+
+# Parquet column types of an export without rows (other columns are written as strings)
+PARQUET_EMPTY_TYPES = {'probability_of_match': 'float64', 'student_rank': 'float64', 'faculty_rank': 'float64'}
+
+# Process umask, read once at import: reading it means setting it, which is not thread-safe
+_UMASK = os.umask(0)
+os.umask(_UMASK)
+
+# -------------------------- START WRITER CLASSES -------------------------
+
+def replace_with_mode(temp_path, path, mode=0o666):
+    """
+    Rename a finished temporary file into place with a umask-based mode.
+
+    mkstemp creates files readable by the owner only, and os.replace keeps that
+    mode, so the file is given mode & ~umask first, as open() would have.
+    """
+    os.chmod(temp_path, mode & ~_UMASK)
+    os.replace(temp_path, path)
+
+
+class _AtomicWriter:
+    """Writes to a temporary file next to the target and renames it into place on commit."""
+
+    def __init__(self, path):
+        self.path = path
+        directory = os.path.dirname(path) or '.'
+        os.makedirs(directory, exist_ok=True)
+        handle, self.temp_path = tempfile.mkstemp(dir=directory, prefix='.' + os.path.basename(path) + '.',
+                                                  suffix='.tmp')
+        os.close(handle)
+
+    def commit(self):
+        self.close()
+        replace_with_mode(self.temp_path, self.path)
+
+    def abort(self):
+        try:
+            self.close()
+        finally:
+            if os.path.exists(self.temp_path):
+                os.remove(self.temp_path)
+
+
+class _TextWriter(_AtomicWriter):
+    """CSV or JSON Lines writer, optionally gzip-compressed."""
+
+    def __init__(self, path, file_format, compression):
+        super().__init__(path)
+        self.file_format = file_format
+        if compression == 'gzip':
+            self.handle = gzip.open(self.temp_path, 'wt', encoding='utf-8', newline='')
+        else:
+            self.handle = open(self.temp_path, 'w', encoding='utf-8', newline='')
+        self.wrote_header = False
+
+    def write(self, chunk):
+        if self.file_format == 'csv':
+            chunk.to_csv(self.handle, index=False, header=not self.wrote_header)
+            self.wrote_header = True
+        elif not chunk.empty:
+            text = chunk.to_json(orient='records', lines=True)
+            self.handle.write(text if text.endswith('\n') else text + '\n')
+
+    def close(self):
+        if not self.handle.closed:
+            self.handle.close()
+
+
+class _ParquetWriter(_AtomicWriter):
+    """Parquet writer that appends one row group per chunk (requires pyarrow)."""
+
+    def __init__(self, path, compression):
+        import pyarrow
+        import pyarrow.parquet
+        super().__init__(path)
+        self.pyarrow = pyarrow
+        self.codec = compression or 'snappy'
+        self.writer = None
+        self.columns = list(MATCH_COLUMNS)
+
+    def write(self, chunk):
+        self.columns = list(chunk.columns)
+        if chunk.empty:
+            # Empty columns have no type to infer; commit writes the typed schema if no rows follow
+            return
+        table = self.pyarrow.Table.from_pandas(chunk, preserve_index=False)
+        if self.writer is None:
+            self.writer = self.pyarrow.parquet.ParquetWriter(self.temp_path, table.schema, compression=self.codec)
+        self.writer.write_table(table)
+
+    def commit(self):
+        if self.writer is None:
+            schema = self.pyarrow.schema([(column, PARQUET_EMPTY_TYPES.get(column, 'string'))
+                                          for column in self.columns])
+            self.pyarrow.parquet.write_table(schema.empty_table(), self.temp_path, compression=self.codec)
+        super().commit()
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+            self.writer = None
+
+# -------------------------- END WRITER CLASSES -------------------------
+
+# -------------------------- START EXPORT FUNCTIONS -------------------------
+
+def safe_file_name(name):
+    """Turn a faculty name into a file name."""
+    return re.sub(r'[^\w.-]+', '_', str(name)).strip('_') or 'unnamed'
+
+
+def _file_name(base, file_format, compression):
+    extension = 'jsonl' if file_format == 'jsonl' else file_format
+    if compression == 'gzip' and file_format != 'parquet':
+        extension += '.gz'
+    return f"{base}.{extension}"
+
+
+def _open_writer(path, file_format, compression):
+    if file_format == 'parquet':
+        return _ParquetWriter(path, compression)
+    return _TextWriter(path, file_format, compression)
+
+
+def export_matches(matches: pd.DataFrame, output_dir: str, formats: list = None, by_faculty: bool = False,
+                   compression: str = None, name: str = 'matches', chunk_size: int = 10000):
+    """
+    Write matches in several formats, and optionally one file per faculty member, in one pass.
+
+    Rows are streamed in chunks to every open writer. Each file is written to a
+    temporary file and renamed into place only once every file is complete, so
+    readers never see partial output.
+
+    Parameters:
+    matches (pd.DataFrame): Matches to export
+    output_dir (str): Directory for the exported files
+    formats (list): Any of 'csv', 'jsonl' and 'parquet' (default ['csv'])
+    by_faculty (bool): Also write by_faculty/<faculty name>.<ext> for each format
+    compression (str): None or 'gzip' ('gzip' also sets the Parquet codec)
+    name (str): Base name of the combined files
+    chunk_size (int): Number of rows written per chunk
+
+    Returns:
+    list: Paths of the written files
+    """
+    formats = formats or ['csv']
+    unknown = [file_format for file_format in formats if file_format not in EXPORT_FORMATS]
+    if unknown:
+        raise ValueError(f"Unknown export formats: {', '.join(unknown)}. Choose from {', '.join(EXPORT_FORMATS)}.")
+    if compression not in COMPRESSIONS:
+        raise ValueError(f"Unknown compression '{compression}'. Choose gzip or none.")
+    if 'parquet' in formats:
+        try:
+            import pyarrow.parquet  # noqa: F401
+        except ImportError:
+            raise ImportError("Parquet export requires pyarrow (pip install pyarrow).")
+
+    writers = {}
+    faculty_files = {}
+    try:
+        for file_format in formats:
+            writers[(None, file_format)] = _open_writer(
+                os.path.join(output_dir, _file_name(name, file_format, compression)), file_format, compression)
+
+        for start in range(0, max(len(matches), 1), chunk_size):
+            chunk = matches.iloc[start:start + chunk_size]
+            for file_format in formats:
+                writers[(None, file_format)].write(chunk)
+            if not by_faculty:
+                continue
+            for faculty_name, faculty_chunk in chunk.groupby('faculty_name', sort=False):
+                for file_format in formats:
+                    key = (faculty_name, file_format)
+                    if key not in writers:
+                        if faculty_name not in faculty_files:
+                            base = safe_file_name(faculty_name)
+                            if base in faculty_files.values():
+                                # Two faculty names that only differ in punctuation
+                                base = f"{base}_{len(faculty_files)}"
+                            faculty_files[faculty_name] = base
+                        path = os.path.join(output_dir, 'by_faculty',
+                                            _file_name(faculty_files[faculty_name], file_format, compression))
+                        writers[key] = _open_writer(path, file_format, compression)
+                    writers[key].write(faculty_chunk)
+    except Exception:
+        for writer in writers.values():
+            writer.abort()
+        raise
+
+    try:
+        for writer in writers.values():
+            writer.commit()
+    except Exception:
+        # Writers already committed have no temporary file left, so this only cleans up the rest
+        for writer in writers.values():
+            writer.abort()
+        raise
+    return [writer.path for writer in writers.values()]
+
+# -------------------------- END EXPORT FUNCTIONS -------------------------
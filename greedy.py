@@ -0,0 +1,124 @@
+"""Greedy matching: an instant approximate preview of the exact solve."""
+
+import time
+
+import numpy as np
+import pandas as pd
+
+from utils import (
+    MATCH_COLUMNS,
+    PairTable,
+    matching_objective
+)
+from aggregate import objective_coefficients
+
+# -------------------------- START GREEDY MATCHING FUNCTIONS -------------------------
+
+def with_previous(pairs: PairTable, previous: pd.DataFrame = None):
+    """
+    Flag the candidates of a pair table built without a previous matching.
+
+    Previous pairs with zero probability are not candidates of such a table, so
+    they stay out; that is fine for a preview but not for an exact solve.
+
+    Parameters:
+    pairs (PairTable): Candidate pairs from PairTable.from_frame without previous
+    previous (pd.DataFrame): Optional previous matching
+
+    Returns:
+    PairTable: The same candidates with 'previous' set
+    """
+    if previous is None or previous.empty:
+        return pairs
+    pair_index = pd.MultiIndex.from_arrays([np.asarray(pairs.projects)[pairs.project],
+                                            np.asarray(pairs.students)[pairs.student]])
+    in_previous = pair_index.isin(list(zip(previous['faculty_project'], previous['student_name'])))
+    return PairTable(pairs.rows, pairs.student, pairs.project, pairs.probability, in_previous,
+                     pairs.students, pairs.projects)
+
+
+def greedy_matching(input_data: pd.DataFrame, faculty_slots: dict, exclusions: list = None,
+                    previous: pd.DataFrame = None, stats: dict = None, pairs: PairTable = None):
+    """
+    Match candidate pairs greedily, best objective coefficient first.
+
+    Pairs are visited in decreasing order of their objective coefficient
+    (probability_of_match, blended with the similarity term when a previous
+    matching is given); a pair is taken if its student is still free and its
+    project has a slot left. Excluded pairs are never taken, and locks are
+    expected to have been assigned by assign_mandatory_matches beforehand.
+    The result is feasible but not necessarily optimal.
+
+    Parameters:
+        input_data (pd.DataFrame): Pair table from process_preferences (after mandatory matches)
+        faculty_slots (dict): Dictionary mapping faculty projects to number of open slots
+        exclusions (list): Optional list of excluded (project, student) tuples
+        previous (pd.DataFrame): Optional previous matching used for the similarity term
+        stats (dict): Optional dictionary filled with 'candidate_pairs', 'solver_status',
+            'solver_objective' and 'solve_seconds'
+        pairs (PairTable): Optional candidate pairs of input_data already built with the
+            exclusions (e.g. by the pipeline's 'candidates' stage), see with_previous
+
+    Returns:
+        pd.DataFrame: The greedy matches, with the same columns as perform_ilp_matching
+    """
+    start = time.perf_counter()
+    if pairs is None:
+        pairs = PairTable.from_frame(input_data, exclusions, previous)
+    else:
+        pairs = with_previous(pairs, previous)
+    if stats is None:
+        stats = {}
+    stats.update({'candidate_pairs': len(input_data), 'pruned_pairs': len(input_data) - len(pairs),
+                  'method': 'greedy', 'solver_status': 'Heuristic', 'gap': None})
+    if len(pairs) == 0:
+        stats.update({'solver_objective': 0.0, 'solve_seconds': time.perf_counter() - start})
+        return pd.DataFrame(columns=MATCH_COLUMNS)
+
+    coefficients = objective_coefficients(pairs, previous)
+    order = np.argsort(-coefficients, kind='stable')
+    # Projects missing from faculty_slots are not slot-constrained, as in perform_ilp_matching
+    slots_left = [faculty_slots.get(project, len(pairs.students)) for project in pairs.projects]
+    student_free = [True] * len(pairs.students)
+    students_left = len(pairs.students)
+    matched = []
+    for position, student, project in zip(order.tolist(), pairs.student[order].tolist(),
+                                          pairs.project[order].tolist()):
+        if student_free[student] and slots_left[project] > 0:
+            student_free[student] = False
+            slots_left[project] -= 1
+            matched.append(position)
+            students_left -= 1
+            if students_left == 0:
+                break
+
+    matched.sort()
+    matches = input_data.take(pairs.rows[matched])[MATCH_COLUMNS].reset_index(drop=True)
+    stats.update({'solver_objective': float(coefficients[matched].sum()),
+                  'solve_seconds': time.perf_counter() - start})
+    return matches
+
+
+def preview_gap(preview: pd.DataFrame, exact: pd.DataFrame, previous: pd.DataFrame = None):
+    """
+    Compare a preview matching with the exact result.
+
+    Parameters:
+    preview (pd.DataFrame): Preview matches (e.g. from greedy_matching)
+    exact (pd.DataFrame): Exact matches of the same problem
+    previous (pd.DataFrame): Optional previous matching used for the similarity term
+
+    Returns:
+    dict: 'preview_objective', 'exact_objective', 'gap' (relative shortfall of the
+        preview) and 'changed_students' (students matched differently or only in one)
+    """
+    preview_objective = matching_objective(preview, previous)
+    exact_objective = matching_objective(exact, previous)
+    preview_pairs = set(zip(preview['student_name'], preview['faculty_project']))
+    exact_pairs = set(zip(exact['student_name'], exact['faculty_project']))
+    changed = {student for student, _ in preview_pairs ^ exact_pairs}
+    return {'preview_objective': preview_objective, 'exact_objective': exact_objective,
+            'gap': (exact_objective - preview_objective) / max(abs(exact_objective), 1e-9),
+            'changed_students': len(changed)}
+
+# -------------------------- END GREEDY MATCHING FUNCTIONS -------------------------
@@ -0,0 +1,131 @@
+"""Hash indexes over the matches and the pair table for per-student and per-faculty queries."""
+
+import numpy as np
+import pandas as pd
+
+from utils import NameIndex
+
+# Columns shown for a student's candidate pairs
+CANDIDATE_COLUMNS = ['faculty_project', 'probability_of_match', 'student_rank', 'faculty_rank', 'status']
+
+# -------------------------- START LOOKUP CLASS -------------------------
+
+class CandidateIndex:
+    """
+    Positions of each student's rows in a pair table, and the faculty of each project.
+
+    Built once per pair table with vectorised grouping, so it can be shared by
+    every MatchLookup made while the pair table stays the same.
+    """
+
+    def __init__(self, pair_table: pd.DataFrame):
+        self.pair_table = pair_table
+        codes, students = pd.factorize(pair_table['student_name'])
+        order = np.argsort(codes, kind='stable')
+        starts = np.searchsorted(codes[order], np.arange(len(students) + 1))
+        self.rows = {student: order[starts[code]:starts[code + 1]] for code, student in enumerate(students)}
+        first = pair_table.drop_duplicates('faculty_project')
+        self.faculty_of = dict(zip(first['faculty_project'], first['faculty_name']))
+
+
+class MatchLookup:
+    """
+    Answers "where did student X land?" and "who did faculty Y get?" from hash indexes.
+
+    Names typed by the user are resolved with NameIndex (exact, normalized or
+    fuzzy), so case and small typos do not matter.
+    """
+
+    def __init__(self, matches: pd.DataFrame, candidates: CandidateIndex = None, faculty_slots: dict = None,
+                 exclusions: list = None):
+        self.matches = matches.reset_index(drop=True)
+        self.candidates = candidates
+        self.faculty_slots = faculty_slots or {}
+        self.exclusions = set(exclusions or [])
+
+        self.by_student = {student: position for position, student in enumerate(self.matches['student_name'])}
+        self.by_project = {}
+        for position, project in enumerate(self.matches['faculty_project']):
+            self.by_project.setdefault(project, []).append(position)
+
+        faculty_of = dict(candidates.faculty_of) if candidates is not None else {}
+        faculty_of.update(zip(self.matches['faculty_project'], self.matches['faculty_name']))
+        self.projects_of = {}
+        for project, faculty in faculty_of.items():
+            self.projects_of.setdefault(faculty, []).append(project)
+
+        students = list(self.by_student) + (list(candidates.rows) if candidates is not None else [])
+        self.student_names = NameIndex(students)
+        self.group_names = NameIndex(list(self.projects_of) + list(faculty_of))
+
+    def open_slots(self, project):
+        """Slots of a project not taken by the current matches (None if its slots are unknown)."""
+        if project not in self.faculty_slots:
+            return None
+        return self.faculty_slots[project] - len(self.by_project.get(project, []))
+
+    def resolve_student(self, value):
+        """Resolve a typed student name; returns (name, status, candidates) as NameIndex.resolve."""
+        return self.student_names.resolve(value)
+
+    def resolve_group(self, value):
+        """Resolve a typed faculty name or faculty project; returns (name, status, candidates)."""
+        return self.group_names.resolve(value)
+
+    def match_of(self, student):
+        """The student's match as a Series, or None if unmatched."""
+        position = self.by_student.get(student)
+        return None if position is None else self.matches.iloc[position]
+
+    def roster(self, name):
+        """
+        Matches of a faculty project, or of every project of a faculty member.
+
+        Parameters:
+        name (str): Canonical faculty name or faculty project
+
+        Returns:
+        list: (project, open slots or None, matches DataFrame) per project
+        """
+        projects = self.projects_of.get(name, [name])
+        return [(project, self.open_slots(project), self.matches.take(self.by_project.get(project, [])))
+                for project in projects]
+
+    def candidate_pairs(self, student):
+        """
+        The student's candidate pairs, best probability first.
+
+        Each pair's 'status' is 'matched', 'excluded', 'open' (the project has a
+        slot left) or 'full'.
+
+        Parameters:
+        student (str): Canonical student name
+
+        Returns:
+        pd.DataFrame: Columns CANDIDATE_COLUMNS (empty without a pair table)
+        """
+        if self.candidates is None or student not in self.candidates.rows:
+            return pd.DataFrame(columns=CANDIDATE_COLUMNS)
+        pairs = self.candidates.pair_table.take(self.candidates.rows[student])
+        pairs = pairs.sort_values('probability_of_match', ascending=False, kind='mergesort')
+        match = self.match_of(student)
+        matched_project = None if match is None else match['faculty_project']
+
+        def status(project):
+            if project == matched_project:
+                return 'matched'
+            if (project, student) in self.exclusions:
+                return 'excluded'
+            slots = self.open_slots(project)
+            return 'open' if slots is None or slots > 0 else 'full'
+
+        pairs = pairs.assign(status=[status(project) for project in pairs['faculty_project']])
+        return pairs[CANDIDATE_COLUMNS].reset_index(drop=True)
+
+    def alternatives(self, student, limit=5):
+        """The student's best candidate pairs (non-zero probability) whose project still has a slot left."""
+        pairs = self.candidate_pairs(student)
+        pairs = pairs[(pairs['status'] == 'open') & (pairs['probability_of_match'] > 0)]
+        return pairs.head(limit).reset_index(drop=True)
+
+# -------------------------- END LOOKUP CLASS -------------------------
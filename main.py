@@ -1,16 +1,11 @@
 # -------------------------- START IMPORTS -------------------------
 
 from shell import MatchingShell
-
-import pandas as pd
-
-# Display all rows
-pd.set_option('display.max_rows', None)
-
-# # Display all columns (optional)
-# pd.set_option('display.max_columns', None)
+import batch
+import service
 
 import sys
+import shlex
 
 from config import (
     get_config_value
@@ -23,20 +18,42 @@ from config import (
 def main():
     """Main function to run the RA/TA matching shell."""
 
-    if len(sys.argv) < 3:
-        print("Usage: python main.py <student_file.csv> <faculty_file.csv> [<locking_file.csv>]")
+    if len(sys.argv) > 1 and sys.argv[1] == 'batch':
+        sys.exit(batch.main(sys.argv[2:]))
+    if len(sys.argv) > 1 and sys.argv[1] == 'serve':
+        sys.exit(service.main(sys.argv[2:]))
+
+    args = sys.argv[1:]
+    options = {}
+    for flag in ['--script', '--resume']:
+        if flag in args:
+            index = args.index(flag)
+            options[flag] = args[index + 1] if index + 1 < len(args) else None
+            del args[index:index + 2]
+    script_file = options.get('--script')
+    session_file = options.get('--resume')
+
+    if (len(args) < 2 and session_file is None) or None in options.values():
+        print("Usage: python main.py <student_file.csv> <faculty_file.csv> [<locking_file.csv>] [<previous_file.csv>] [--script FILE] [--resume SESSION]")
+        print("       python main.py --resume SESSION [--script FILE]")
+        print("       python main.py batch <manifest.yaml|manifest.csv> [--output-dir DIR] [--workers N] [--engine E]")
+        print("       python main.py serve <student_file.csv> <faculty_file.csv> [<locking_file.csv>] [<previous_file.csv>] [--host HOST] [--port PORT]")
         sys.exit(1)
 
-    file_path_student = sys.argv[1]
-    file_path_faculty = sys.argv[2]
+    file_path_student = args[0] if len(args) > 0 else None
+    file_path_faculty = args[1] if len(args) > 1 else None
     file_path_locking = None
-    if len(sys.argv) > 3:
-        file_path_locking = sys.argv[3]
+    if len(args) > 2:
+        file_path_locking = args[2]
     file_path_previous = None
-    if len(sys.argv) > 4:
-        file_path_previous = sys.argv[4]
-
-    shell = MatchingShell(file_path_student, file_path_faculty, file_path_locking, file_path_previous)
+    if len(args) > 3:
+        file_path_previous = args[3]
+
+    shell = MatchingShell(file_path_student, file_path_faculty, file_path_locking, file_path_previous, session_file)
+    if script_file is not None:
+        # Batch mode: run the script instead of the interactive shell
+        # A non-zero exit status tells a replay that the script stopped early
+        sys.exit(0 if shell.run_script(shlex.quote(script_file)) else 1)
     shell.cmdloop("\nRA/TA Matching Shell\n" +
                   f"Initial faculty weight: {get_config_value('faculty_weight')}\n" +
                   "Type 'help' for available commands")
@@ -0,0 +1,178 @@
+"""Structured run metrics: one record per solve, written as JSON Lines or a Prometheus textfile."""
+
+import json
+import os
+import tempfile
+from datetime import datetime, timezone
+
+import pandas as pd
+
+from export import replace_with_mode
+from utils import perform_ilp_matching, matching_objective
+
+# Bump when a field is renamed or removed; adding fields keeps the version
+METRICS_SCHEMA_VERSION = 1
+
+# Fields of every metrics record, in output order. Do not rename: alerts depend on them.
+METRIC_FIELDS = [
+    'schema_version', 'timestamp', 'run', 'engine',
+    'students', 'projects', 'total_slots', 'pairs',
+    'candidate_pairs', 'pruned_pairs', 'variables', 'constraints',
+    'stage_seconds', 'total_seconds',
+    'solver_status', 'objective', 'gap',
+    'matched', 'mandatory_matched', 'unmatched_students',
+    'student_rank_histogram', 'faculty_rank_histogram',
+    'pipeline_stages',
+]
+
+# Solver statistics reported when no solver ran (cache hits, stable engine)
+NO_SOLVER_STATS = {'candidate_pairs': None, 'pruned_pairs': None, 'variables': None, 'constraints': None,
+                   'solver_status': None, 'gap': None}
+
+# Solver statuses of runs where no exact solver ran, so no optimality gauge is exported for them
+NO_OPTIMALITY_STATUSES = (None, 'Cached', 'Heuristic')
+
+# -------------------------- START METRICS FUNCTIONS -------------------------
+
+def solve_with_stats(*args, solver=perform_ilp_matching, **kwargs):
+    """Run a solver (perform_ilp_matching by default) and also return its statistics (usable in a solver process)."""
+    stats = {}
+    matches = solver(*args, stats=stats, **kwargs)
+    return matches, stats
+
+
+def rank_histogram(ranks):
+    """Count matches per rank as {'1': n, '2': n, ..., 'unranked': n}."""
+    if ranks is None or len(ranks) == 0:
+        return {}
+    ranks = pd.Series(ranks).astype(int)
+    histogram = {str(rank): int(count) for rank, count in ranks[ranks > 0].value_counts().sort_index().items()}
+    unranked = int((ranks <= 0).sum())
+    if unranked:
+        histogram['unranked'] = unranked
+    return histogram
+
+
+def build_run_metrics(run, engine, input_data, faculty_slots, matches, mandatory_matches=None,
+                      stage_seconds=None, solver_stats=None, previous=None, total_seconds=None,
+                      pipeline_stages=None):
+    """
+    Build one metrics record for a solve.
+
+    Parameters:
+    run (str): Run label (e.g. 'matching' or a batch cohort name)
+    engine (str): Engine that produced the matches
+    input_data (pd.DataFrame): Full pair table from process_preferences
+    faculty_slots (dict): Slots per faculty project
+    matches (pd.DataFrame): Combined matches (mandatory and solved)
+    mandatory_matches (pd.DataFrame): Mandatory matches
+    stage_seconds (dict): Seconds spent per pipeline stage
+    solver_stats (dict): Statistics filled in by perform_ilp_matching (stats=...)
+    previous (pd.DataFrame): Previous matching used for the objective
+    total_seconds (float): Wall time of the run (default: sum of stage_seconds)
+    pipeline_stages (dict): 'hit' or 'recomputed' per cached pipeline stage
+
+    Returns:
+    dict: Record with exactly the fields in METRIC_FIELDS
+    """
+    stats = dict(NO_SOLVER_STATS)
+    stats.update(solver_stats or {})
+    stage_seconds = {stage: round(float(seconds), 6) for stage, seconds in (stage_seconds or {}).items()}
+    empty = matches is None or matches.empty
+    students = int(input_data['student_name'].nunique()) if input_data is not None else 0
+    matched = 0 if empty else len(matches)
+    record = {
+        'schema_version': METRICS_SCHEMA_VERSION,
+        'timestamp': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'run': run,
+        'engine': engine,
+        'students': students,
+        'projects': len(faculty_slots),
+        'total_slots': int(sum(faculty_slots.values())),
+        'pairs': 0 if input_data is None else len(input_data),
+        'candidate_pairs': stats['candidate_pairs'],
+        'pruned_pairs': stats['pruned_pairs'],
+        'variables': stats['variables'],
+        'constraints': stats['constraints'],
+        'stage_seconds': stage_seconds,
+        'total_seconds': round(float(total_seconds if total_seconds is not None else sum(stage_seconds.values())), 6),
+        'solver_status': stats['solver_status'],
+        'objective': matching_objective(matches, previous),
+        'gap': stats['gap'],
+        'matched': matched,
+        'mandatory_matched': 0 if mandatory_matches is None else len(mandatory_matches),
+        'unmatched_students': students - matched,
+        'student_rank_histogram': {} if empty else rank_histogram(matches['student_rank']),
+        'faculty_rank_histogram': {} if empty else rank_histogram(matches['faculty_rank']),
+        'pipeline_stages': dict(pipeline_stages or {}),
+    }
+    return {field: record[field] for field in METRIC_FIELDS}
+
+
+def append_jsonl(record, path):
+    """Append one record as a line of JSON."""
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(path, 'a', encoding='utf-8') as handle:
+        handle.write(json.dumps(record, sort_keys=False) + '\n')
+
+
+def _label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', ' ')
+
+
+def format_prometheus(records):
+    """
+    Format records in the Prometheus text exposition format.
+
+    Every numeric field becomes a gauge named ra_matching_<field> with a 'run'
+    label; stage timings, pipeline cache hits and rank histograms get a 'stage'
+    or 'rank' label. ra_matching_solver_optimal is only exported for runs of an
+    exact solver (see NO_OPTIMALITY_STATUSES); solution cache hits are reported
+    by ra_matching_solution_cache_hit instead.
+    """
+    samples = {}
+    for record in records:
+        run = f'run="{_label(record["run"])}",engine="{_label(record["engine"])}"'
+        for field in METRIC_FIELDS:
+            value = record.get(field)
+            if isinstance(value, bool) or not isinstance(value, (int, float)):
+                continue
+            samples.setdefault(f"ra_matching_{field}", []).append(f"{{{run}}} {value}")
+        for stage, seconds in record['stage_seconds'].items():
+            samples.setdefault('ra_matching_stage_seconds', []).append(
+                f'{{{run},stage="{_label(stage)}"}} {seconds}')
+        for side in ['student', 'faculty']:
+            for rank, count in record[f'{side}_rank_histogram'].items():
+                samples.setdefault(f'ra_matching_{side}_rank_matches', []).append(
+                    f'{{{run},rank="{_label(rank)}"}} {count}')
+        for stage, status in record['pipeline_stages'].items():
+            samples.setdefault('ra_matching_pipeline_stage_hit', []).append(
+                f'{{{run},stage="{_label(stage)}"}} {1 if status == "hit" else 0}')
+        if record['solver_status'] not in NO_OPTIMALITY_STATUSES:
+            samples.setdefault('ra_matching_solver_optimal', []).append(
+                f"{{{run}}} {1 if record['solver_status'] in ('Optimal', 'Empty') else 0}")
+        samples.setdefault('ra_matching_solution_cache_hit', []).append(
+            f"{{{run}}} {1 if record['solver_status'] == 'Cached' else 0}")
+        samples.setdefault('ra_matching_last_run_timestamp_seconds', []).append(
+            f"{{{run}}} {datetime.fromisoformat(record['timestamp']).timestamp():.0f}")
+
+    lines = []
+    for name, values in samples.items():
+        lines.append(f"# TYPE {name} gauge")
+        lines += [f"{name}{value}" for value in values]
+    return '\n'.join(lines) + '\n'
+
+
+def write_prometheus_textfile(records, path):
+    """Atomically replace a node-exporter textfile with the given records."""
+    directory = os.path.dirname(path) or '.'
+    os.makedirs(directory, exist_ok=True)
+    handle, temp_path = tempfile.mkstemp(dir=directory, prefix='.' + os.path.basename(path) + '.', suffix='.tmp')
+    with os.fdopen(handle, 'w', encoding='utf-8') as temp_file:
+        temp_file.write(format_prometheus(records))
+    # node_exporter usually runs as another user, so the file must not stay owner-only
+    replace_with_mode(temp_path, path, 0o644)
+
+# -------------------------- END METRICS FUNCTIONS -------------------------
@@ -0,0 +1,223 @@
+"""Preprocessing pipeline as a graph of cached stages with declared inputs."""
+
+import hashlib
+import threading
+
+import pandas as pd
+
+from utils import (
+    PairTable,
+    process_preferences,
+    process_locks_exclusions,
+    assign_mandatory_matches
+)
+
+# -------------------------- START STAGE GRAPH CLASS -------------------------
+
+def input_fingerprint(value):
+    """
+    Hash an input value (DataFrame, dict, tuple, None, ...) for change detection.
+
+    Parameters:
+    value: The input value
+
+    Returns:
+    str: Hex digest that changes whenever the value's contents change
+    """
+    hasher = hashlib.sha256()
+    if isinstance(value, pd.DataFrame):
+        hasher.update(repr(list(value.columns)).encode('utf-8'))
+        hasher.update(pd.util.hash_pandas_object(value, index=False).to_numpy().tobytes())
+    elif isinstance(value, dict):
+        hasher.update(repr(sorted(value.items())).encode('utf-8'))
+    else:
+        hasher.update(repr(value).encode('utf-8'))
+    return hasher.hexdigest()
+
+
+class StageGraph:
+    """
+    Stages with declared inputs, each caching its last output.
+
+    A stage's key is the hash of its inputs' keys, where an input is either a
+    named external input (set with set_input) or another stage. A stage is only
+    recomputed when its key changes, so changing one input re-runs just the
+    stages that depend on it.
+    """
+
+    def __init__(self):
+        self.stages = {}
+        self.input_keys = {}
+        self.input_values = {}
+        self.outputs = {}
+        self.stats = {}
+        self.last_status = {}
+        self.lock = threading.RLock()
+
+    def add_stage(self, name, func, inputs):
+        """Declare a stage computed as func(*values of inputs)."""
+        self.stages[name] = (func, list(inputs))
+        self.stats[name] = {'hits': 0, 'recomputed': 0}
+
+    def set_input(self, name, value):
+        """Set an external input; dependent stages are invalidated only if it changed."""
+        with self.lock:
+            self.input_keys[name] = input_fingerprint(value)
+            self.input_values[name] = value
+
+    def invalidate(self, name=None):
+        """Drop the cached output of one stage (or of every stage)."""
+        with self.lock:
+            if name is None:
+                self.outputs.clear()
+            else:
+                self.outputs.pop(name, None)
+
+    def _key(self, name, evaluated):
+        """Key of an input or stage, computing the stage if needed."""
+        if name in self.stages:
+            return self._evaluate(name, evaluated)[0]
+        if name not in self.input_keys:
+            raise KeyError(f"Input '{name}' has not been set.")
+        return self.input_keys[name]
+
+    def _value(self, name):
+        if name in self.stages:
+            return self.outputs[name][1]
+        return self.input_values[name]
+
+    def _evaluate(self, name, evaluated):
+        # Each stage is checked once per run, however many stages depend on it
+        if name in evaluated:
+            return self.outputs[name]
+        evaluated.add(name)
+        func, inputs = self.stages[name]
+        key = hashlib.sha256(repr([(input_name, self._key(input_name, evaluated)) for input_name in inputs])
+                             .encode('utf-8')).hexdigest()
+        cached = self.outputs.get(name)
+        if cached is not None and cached[0] == key:
+            self.stats[name]['hits'] += 1
+            self.last_status[name] = 'hit'
+            return cached
+        output = func(*[self._value(input_name) for input_name in inputs])
+        self.outputs[name] = (key, output)
+        self.stats[name]['recomputed'] += 1
+        self.last_status[name] = 'recomputed'
+        return self.outputs[name]
+
+    def run(self, *names):
+        """Return the outputs of the named stages, recomputing only invalidated stages."""
+        with self.lock:
+            evaluated = set()
+            return [self._evaluate(name, evaluated)[1] for name in names]
+
+    def cached(self, name):
+        """Last output of a stage without re-running it (None if it never ran)."""
+        with self.lock:
+            output = self.outputs.get(name)
+            return None if output is None else output[1]
+
+    def snapshot(self):
+        """Inputs and cached outputs, for saving a session (the stage functions are not included)."""
+        with self.lock:
+            return {'input_keys': dict(self.input_keys), 'input_values': dict(self.input_values),
+                    'outputs': dict(self.outputs)}
+
+    def restore(self, snapshot):
+        """Restore inputs and cached outputs saved by snapshot."""
+        with self.lock:
+            self.input_keys = dict(snapshot['input_keys'])
+            self.input_values = dict(snapshot['input_values'])
+            self.outputs = {name: output for name, output in snapshot['outputs'].items() if name in self.stages}
+
+    def report(self):
+        """
+        Per-stage cache statistics.
+
+        Returns:
+        pd.DataFrame: Columns 'stage', 'inputs', 'last', 'hits' and 'recomputed'
+        """
+        with self.lock:
+            return pd.DataFrame([{'stage': name, 'inputs': ', '.join(inputs),
+                                  'last': self.last_status.get(name, '-'),
+                                  'hits': self.stats[name]['hits'],
+                                  'recomputed': self.stats[name]['recomputed']}
+                                 for name, (_, inputs) in self.stages.items()])
+
+# -------------------------- END STAGE GRAPH CLASS -------------------------
+
+# -------------------------- START MATCHING PIPELINE FUNCTIONS -------------------------
+
+def apply_slot_changes(faculty_slots: dict, slot_changes: dict):
+    """
+    Apply slot changes to the slots read from the faculty file.
+
+    Parameters:
+    faculty_slots (dict): Slots per faculty project
+    slot_changes (dict): Change in slots per faculty project (unknown projects are ignored)
+
+    Returns:
+    dict: The changed slots (never below zero)
+    """
+    if not slot_changes:
+        return faculty_slots
+    faculty_slots = dict(faculty_slots)
+    for faculty_project, delta in slot_changes.items():
+        if faculty_project in faculty_slots:
+            faculty_slots[faculty_project] = max(faculty_slots[faculty_project] + delta, 0)
+    return faculty_slots
+
+
+def _preferences(df_student, df_faculty, pair_config):
+    # pair_config is only an input so that changing it invalidates this stage
+    return process_preferences(df_student, df_faculty)
+
+
+def _effective_slots(preferences, slot_changes):
+    input_data, faculty_slots = preferences
+    return input_data, apply_slot_changes(faculty_slots, slot_changes)
+
+
+def _locks_exclusions(df_locking):
+    if df_locking is None:
+        return None, None
+    return process_locks_exclusions(df_locking)
+
+
+def _mandatory(slots, locks_exclusions):
+    input_data, faculty_slots = slots
+    return assign_mandatory_matches(input_data, faculty_slots, locks_exclusions[0])
+
+
+def _candidates(mandatory, locks_exclusions):
+    return PairTable.from_frame(mandatory[0], locks_exclusions[1])
+
+
+def matching_pipeline():
+    """
+    Build the preprocessing stages of a solve.
+
+    Inputs: 'students' and 'faculty' (raw frames), 'pair_config' (values of
+    PAIR_TABLE_PARAMS), 'slot_changes' and 'locking' (lock store frame or None).
+    Stages:
+        preferences: pair table and slots (students, faculty, pair_config)
+        slots: slots after slot changes (preferences, slot_changes)
+        locks: locks and exclusions (locking)
+        mandatory: remaining pairs, mandatory matches, remaining slots (slots, locks)
+        candidates: PairTable of the remaining pairs without exclusions (mandatory, locks),
+            read by the greedy preview
+    The remaining configuration (similarity_weight) and the previous matching
+    only enter the objective, so they are left to the solve.
+
+    Returns:
+    StageGraph: The pipeline
+    """
+    graph = StageGraph()
+    graph.add_stage('preferences', _preferences, ['students', 'faculty', 'pair_config'])
+    graph.add_stage('slots', _effective_slots, ['preferences', 'slot_changes'])
+    graph.add_stage('locks', _locks_exclusions, ['locking'])
+    graph.add_stage('mandatory', _mandatory, ['slots', 'locks'])
+    graph.add_stage('candidates', _candidates, ['mandatory', 'locks'])
+    return graph
+
+# -------------------------- END MATCHING PIPELINE FUNCTIONS -------------------------
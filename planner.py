@@ -0,0 +1,198 @@
+"""Solve planner: pick the fastest exact engine for a matching problem."""
+
+import numpy as np
+import pandas as pd
+
+from utils import PairTable, perform_ilp_matching
+from pruning import pruned_matching, DEFAULT_TOP_K
+from aggregate import aggregated_matching, objective_coefficients, student_classes
+
+# Engines the planner chooses from; all of them give the optimal matching
+EXACT_ENGINES = ['ilp', 'relax', 'pruned', 'aggregate']
+
+# Below this many candidate pairs model building and process start-up dominate,
+# so the plain ILP is as fast as anything else
+SMALL_PROBLEM_CANDIDATES = 1000
+
+# Pruning pays off once students average this many times DEFAULT_TOP_K candidates
+PRUNING_MIN_RATIO = 2
+
+# Aggregation pays off once there are this many students per class of interchangeable students
+AGGREGATION_MIN_RATIO = 2
+
+# -------------------------- START ESTIMATE FUNCTIONS -------------------------
+
+def connected_components(student_codes, project_codes, n_students, n_projects):
+    """
+    Label the connected components of the student/project candidate graph.
+
+    Parameters:
+    student_codes (np.ndarray): Student code of each candidate pair
+    project_codes (np.ndarray): Project code of each candidate pair
+    n_students (int): Number of students
+    n_projects (int): Number of projects
+
+    Returns:
+    np.ndarray: Component label of each student (the smallest student code in it)
+    """
+    student_labels = np.arange(n_students)
+    while True:
+        # Spread the smallest label through projects and back to students
+        project_labels = np.full(n_projects, n_students)
+        np.minimum.at(project_labels, project_codes, student_labels[student_codes])
+        new_labels = student_labels.copy()
+        np.minimum.at(new_labels, student_codes, project_labels[project_codes])
+        if np.array_equal(new_labels, student_labels):
+            return student_labels
+        # Jump to the label's own label to halve the number of passes
+        student_labels = new_labels[new_labels]
+
+
+def estimate_problem(input_data: pd.DataFrame, faculty_slots: dict, locks: list = None,
+                     exclusions: list = None, previous: pd.DataFrame = None):
+    """
+    Measure the features of a matching problem that decide how to solve it.
+
+    Parameters:
+    input_data (pd.DataFrame): Pair table after mandatory matches
+    faculty_slots (dict): Remaining slots per faculty project
+    locks (list): Locked (project, student) tuples (already assigned)
+    exclusions (list): Excluded (project, student) tuples
+    previous (pd.DataFrame): Previous matching used for the similarity term
+
+    Returns:
+    dict: Sizes ('students', 'projects', 'pairs', 'candidate_pairs',
+        'candidates_per_student', 'max_candidates'), structure ('components',
+        'largest_component', 'student_classes') and active features ('similarity',
+        'locks', 'exclusions')
+    """
+    pairs = PairTable.from_frame(input_data, exclusions, previous)
+    students = len(pairs.students)
+    estimate = {
+        'students': students,
+        'projects': len(pairs.projects),
+        'pairs': len(input_data),
+        'candidate_pairs': len(pairs),
+        'candidates_per_student': round(len(pairs) / students, 1) if students else 0.0,
+        'max_candidates': int(np.bincount(pairs.student).max()) if len(pairs) else 0,
+        'components': 0,
+        'largest_component': 0,
+        'student_classes': 0,
+        'similarity': previous is not None and not previous.empty,
+        'locks': len(locks or []),
+        'exclusions': len(exclusions or []),
+    }
+    if len(pairs):
+        labels = connected_components(pairs.student, pairs.project, students, len(pairs.projects))
+        sizes = np.bincount(labels[pairs.student])
+        estimate['components'] = int(np.count_nonzero(np.bincount(labels)))
+        estimate['largest_component'] = int(sizes.max())
+        class_of = student_classes(pairs, objective_coefficients(pairs, previous))[0]
+        estimate['student_classes'] = int(class_of.max()) + 1
+    return estimate
+
+# -------------------------- END ESTIMATE FUNCTIONS -------------------------
+
+# -------------------------- START PLAN FUNCTIONS -------------------------
+
+class SolvePlan:
+    """The engine chosen for a solve, with the estimate and reasons behind it."""
+
+    def __init__(self, engine, estimate, reasons, top_k=DEFAULT_TOP_K):
+        self.engine = engine
+        self.estimate = estimate
+        self.reasons = reasons
+        self.top_k = top_k
+
+    def summary(self):
+        """One-line description of the decision."""
+        engine = f"pruned (top {self.top_k})" if self.engine == 'pruned' else self.engine
+        return (f"{engine} for {self.estimate['candidate_pairs']} candidate pairs "
+                f"({self.estimate['students']} students, {self.estimate['projects']} projects, "
+                f"{self.estimate['components']} components).")
+
+    def describe(self):
+        """Multi-line explanation: the estimate, the active features and the reasons."""
+        estimate = self.estimate
+        features = []
+        if estimate['similarity']:
+            features.append("similarity term (previous matching; its pairs are never pruned)")
+        if estimate['locks']:
+            features.append(f"{estimate['locks']} locks (assigned as mandatory matches before solving)")
+        if estimate['exclusions']:
+            features.append(f"{estimate['exclusions']} exclusions (removed from the candidates)")
+        lines = [f"Plan: {self.summary()}",
+                 f"  pairs: {estimate['pairs']}, candidates: {estimate['candidate_pairs']} "
+                 f"({estimate['candidates_per_student']} per student, at most {estimate['max_candidates']})",
+                 f"  components: {estimate['components']} (largest has {estimate['largest_component']} candidates), "
+                 f"{estimate['student_classes']} classes of interchangeable students",
+                 f"  features: {', '.join(features) if features else 'none'}"]
+        lines += [f"  - {reason}" for reason in self.reasons]
+        return lines
+
+
+def plan_solve(estimate, top_k=DEFAULT_TOP_K):
+    """
+    Choose the fastest exact engine for a problem estimate.
+
+    All exact engines support the similarity term, locks and exclusions, and the
+    matching constraints are totally unimodular, so the choice only depends on size:
+    the plain ILP for small problems, aggregation when many students are
+    interchangeable, top-K pruning when students have many more candidates than K,
+    and the LP relaxation otherwise.
+
+    Parameters:
+    estimate (dict): Result of estimate_problem
+    top_k (int): Candidates kept per student if pruning is chosen
+
+    Returns:
+    SolvePlan: The chosen engine and the reasons for it
+    """
+    candidates = estimate['candidate_pairs']
+    reasons = ["stable is not considered: it does not maximise the total probability"]
+    if candidates < SMALL_PROBLEM_CANDIDATES:
+        reasons.append(f"{candidates} candidates < {SMALL_PROBLEM_CANDIDATES}: model set-up dominates, "
+                       f"so the ILP is as fast as any other engine")
+        return SolvePlan('ilp', estimate, reasons, top_k)
+    reasons.append(f"{candidates} candidates >= {SMALL_PROBLEM_CANDIDATES}: the LP relaxation avoids "
+                   f"branch-and-bound (the constraints are totally unimodular)")
+    classes = estimate['student_classes']
+    if estimate['students'] >= AGGREGATION_MIN_RATIO * classes:
+        reasons.append(f"{estimate['students']} students fall into {classes} classes of interchangeable "
+                       f"students (>= {AGGREGATION_MIN_RATIO} per class): one count variable per class "
+                       f"and project replaces a variable per student")
+        return SolvePlan('aggregate', estimate, reasons, top_k)
+    if estimate['candidates_per_student'] >= PRUNING_MIN_RATIO * top_k:
+        reasons.append(f"{estimate['candidates_per_student']} candidates per student >= "
+                       f"{PRUNING_MIN_RATIO} x top-K ({top_k}): pruning shrinks the LP, "
+                       f"and its dual certificate keeps the result optimal")
+        return SolvePlan('pruned', estimate, reasons, top_k)
+    reasons.append(f"{estimate['candidates_per_student']} candidates per student < "
+                   f"{PRUNING_MIN_RATIO} x top-K ({top_k}): pruning would remove too little")
+    return SolvePlan('relax', estimate, reasons, top_k)
+
+
+def solve_planned(plan, input_data: pd.DataFrame, faculty_slots: dict, exclusions: list = None,
+                  previous: pd.DataFrame = None, stats: dict = None):
+    """
+    Solve with the engine of a plan.
+
+    Parameters:
+    plan (SolvePlan): Plan from plan_solve
+    input_data (pd.DataFrame): Pair table after mandatory matches
+    faculty_slots (dict): Remaining slots per faculty project
+    exclusions (list): Excluded (project, student) tuples
+    previous (pd.DataFrame): Previous matching used for the similarity term
+    stats (dict): Optional dictionary filled with the solver statistics
+
+    Returns:
+    pd.DataFrame: The matches
+    """
+    if plan.engine == 'pruned':
+        return pruned_matching(input_data, faculty_slots, exclusions, previous, k=plan.top_k, stats=stats)
+    if plan.engine == 'aggregate':
+        return aggregated_matching(input_data, faculty_slots, exclusions, previous, relax=True, stats=stats)
+    return perform_ilp_matching(input_data, faculty_slots, exclusions, previous,
+                                relax=plan.engine == 'relax', stats=stats)
+
+# -------------------------- END PLAN FUNCTIONS -------------------------
@@ -0,0 +1,161 @@
+"""Live solver progress parsed from the CBC log while a solve runs."""
+
+import os
+import re
+import time
+from datetime import datetime, timezone
+
+from metrics import METRICS_SCHEMA_VERSION
+
+# Fields of a progress record in the metrics log (told apart from run records by 'event')
+PROGRESS_FIELDS = ['schema_version', 'timestamp', 'run', 'engine', 'event',
+                   'elapsed_seconds', 'incumbent', 'best_bound', 'gap', 'nodes']
+
+# Waiting on a solve prints progress lines only once it has run this long (seconds)
+PROGRESS_DISPLAY_SECONDS = 2.0
+
+# CBC reports "no solution yet" as a huge objective value
+_NO_SOLUTION = 1e40
+
+_NUMBER = r'(-?[\d.]+(?:e[-+]?\d+)?)'
+_CONTINUOUS = re.compile(rf'Continuous objective value is {_NUMBER}')
+_INTEGER_SOLUTION = re.compile(rf'Integer solution of {_NUMBER} found .* and (\d+) nodes \(([\d.]+) seconds\)')
+_NODES = re.compile(rf'After (\d+) nodes, \d+ on tree, {_NUMBER} best solution, best possible {_NUMBER} '
+                    rf'\(([\d.]+) seconds\)')
+_COMPLETED = re.compile(rf'Search completed - best objective {_NUMBER}, took \d+ iterations and (\d+) nodes '
+                        rf'\(([\d.]+) seconds\)')
+_LP_OPTIMAL = re.compile(rf'Optimal - objective value {_NUMBER}')
+
+# -------------------------- START PROGRESS CLASS -------------------------
+
+class SolverProgress:
+    """
+    Follows a CBC log file and keeps the latest incumbent, bound, gap and node count.
+
+    The solver writes its log to a file (PULP_CBC_CMD logPath), so following it
+    costs the solver nothing; poll() reads only the bytes added since the last call.
+    CBC minimises internally, so its branch-and-bound values of a maximisation
+    are negated back.
+    """
+
+    def __init__(self, log_path, maximize=True):
+        self.log_path = log_path
+        self.sign = -1 if maximize else 1
+        self.offset = 0
+        self.partial = ''
+        self.started = time.time()
+        self.elapsed = 0.0
+        self.incumbent = None
+        self.best_bound = None
+        self.nodes = 0
+        self.finished = False
+
+    def poll(self):
+        """
+        Read new log lines.
+
+        Returns:
+        list: Snapshots (see snapshot) for every line that changed the progress
+        """
+        try:
+            size = os.path.getsize(self.log_path)
+            if size < self.offset:
+                # A re-solve (e.g. the fallback from the LP) rewrote the log
+                self.offset, self.partial = 0, ''
+            with open(self.log_path, 'r', errors='replace') as log_file:
+                log_file.seek(self.offset)
+                text = log_file.read()
+                self.offset = log_file.tell()
+        except OSError:
+            return []
+        lines = (self.partial + text).split('\n')
+        self.partial = lines.pop()
+        events = []
+        for line in lines:
+            if self.parse_line(line):
+                events.append(self.snapshot())
+        return events
+
+    def parse_line(self, line):
+        """Update the progress from one log line; returns True if anything changed."""
+        match = _CONTINUOUS.search(line)
+        if match:
+            # Printed in the problem's own sense: the root LP bound
+            self.best_bound = float(match.group(1))
+            self.elapsed = time.time() - self.started
+            return True
+        match = _INTEGER_SOLUTION.search(line)
+        if match:
+            self._update_incumbent(float(match.group(1)))
+            self.nodes = max(self.nodes, int(match.group(2)))
+            self.elapsed = float(match.group(3))
+            return True
+        match = _NODES.search(line)
+        if match:
+            self.nodes = int(match.group(1))
+            self._update_incumbent(float(match.group(2)))
+            self.best_bound = self.sign * float(match.group(3))
+            self.elapsed = float(match.group(4))
+            return True
+        match = _COMPLETED.search(line)
+        if match:
+            self._update_incumbent(float(match.group(1)))
+            self.best_bound = self.incumbent
+            self.nodes = int(match.group(2))
+            self.elapsed = float(match.group(3))
+            self.finished = True
+            return True
+        match = _LP_OPTIMAL.search(line)
+        if match:
+            # LP solves log the objective in the problem's own sense
+            self.incumbent = self.best_bound = float(match.group(1))
+            self.elapsed = time.time() - self.started
+            self.finished = True
+            return True
+        return False
+
+    def _update_incumbent(self, value):
+        if abs(value) < _NO_SOLUTION:
+            self.incumbent = self.sign * value
+
+    def gap(self):
+        """Relative gap between the incumbent and the best bound (None without both)."""
+        if self.incumbent is None or self.best_bound is None:
+            return None
+        return abs(self.best_bound - self.incumbent) / max(abs(self.incumbent), 1e-9)
+
+    def snapshot(self):
+        """Current progress as a dictionary."""
+        return {'elapsed_seconds': round(self.elapsed, 3), 'incumbent': self.incumbent,
+                'best_bound': self.best_bound, 'gap': self.gap(), 'nodes': self.nodes}
+
+    def summary(self):
+        """One-line progress description for the status line."""
+        parts = [f"{max(self.elapsed, time.time() - self.started):.1f}s"]
+        parts.append(f"incumbent {self.incumbent:.4f}" if self.incumbent is not None else "no incumbent yet")
+        if self.best_bound is not None:
+            parts.append(f"bound {self.best_bound:.4f}")
+        if self.gap() is not None:
+            parts.append(f"gap {100 * self.gap():.2f}%")
+        parts.append(f"{self.nodes} nodes")
+        return ', '.join(parts)
+
+
+def progress_record(run, engine, snapshot):
+    """
+    Build a progress record for the metrics log.
+
+    Parameters:
+    run (str): Run label
+    engine (str): Engine being solved
+    snapshot (dict): SolverProgress.snapshot()
+
+    Returns:
+    dict: Record with exactly the fields in PROGRESS_FIELDS (event 'progress')
+    """
+    record = dict(snapshot, schema_version=METRICS_SCHEMA_VERSION,
+                  timestamp=datetime.now(timezone.utc).isoformat(timespec='seconds'),
+                  run=run, engine=engine, event='progress')
+    return {field: record[field] for field in PROGRESS_FIELDS}
+
+# -------------------------- END PROGRESS CLASS -------------------------
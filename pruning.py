@@ -0,0 +1,177 @@
+"""Top-K candidate pruning with an LP duality certificate of optimality."""
+
+import time
+
+import numpy as np
+import pandas as pd
+import pulp
+
+import utils
+from utils import (
+    MATCH_COLUMNS,
+    INTEGRALITY_TOLERANCE,
+    PairTable,
+    perform_ilp_matching,
+    problem_constraints,
+    solution_values,
+    run_config,
+    _group_positions
+)
+
+# Default number of candidates kept per student
+DEFAULT_TOP_K = 10
+
+# Largest positive reduced cost still accepted as dual feasible
+REDUCED_COST_TOLERANCE = 1e-7
+
+# -------------------------- START PRUNING FUNCTIONS -------------------------
+
+def top_k_mask(student_codes, coefficients, k, keep=None):
+    """
+    Select each student's k candidates with the largest objective coefficient.
+
+    Parameters:
+    student_codes (np.ndarray): Student code of each candidate
+    coefficients (np.ndarray): Objective coefficient of each candidate
+    k (int): Candidates kept per student
+    keep (np.ndarray): Optional mask of candidates that are always kept
+
+    Returns:
+    np.ndarray: Boolean mask of the kept candidates
+    """
+    # Order candidates by student, best coefficient first (ties by position)
+    order = np.lexsort((np.arange(len(coefficients)), -coefficients, student_codes))
+    sorted_codes = student_codes[order]
+    group_start = np.searchsorted(sorted_codes, sorted_codes, side='left')
+    position = np.arange(len(order)) - group_start
+
+    mask = np.zeros(len(coefficients), dtype=bool)
+    mask[order[position < k]] = True
+    if keep is not None:
+        mask |= keep
+    return mask
+
+
+def _solve_restricted_lp(pairs, coefficients, kept, faculty_slots):
+    """
+    Solve the LP relaxation over the kept candidates.
+
+    Returns the primal values of the kept candidates and the duals of the
+    student and project constraints (zero where a constraint is absent).
+    """
+    problem = pulp.LpProblem("Pruned_Matching", pulp.LpMaximize)
+    positions = np.flatnonzero(kept)
+    # The student constraints already bound every variable by 1
+    x = [utils.new_variable(problem, f"match_{i}", 'Continuous') for i in positions]
+    for var in x:
+        var.upBound = None
+    problem += pulp.LpAffineExpression(zip(x, coefficients[positions].tolist()))
+
+    student_constraints = {}
+    for code, group in enumerate(_group_positions(pairs.student[positions], len(pairs.students))):
+        if len(group):
+            name = f"Student_Assignment_{code}"
+            problem += (pulp.LpAffineExpression([(x[i], 1) for i in group]) <= 1, name)
+            student_constraints[code] = name
+
+    project_constraints = {}
+    for code, group in enumerate(_group_positions(pairs.project[positions], len(pairs.projects))):
+        faculty_project = pairs.projects[code]
+        if len(group) and faculty_project in faculty_slots:
+            name = f"Faculty_Openings_{code}"
+            problem += (pulp.LpAffineExpression([(x[i], 1) for i in group]) <= faculty_slots[faculty_project],
+                        name)
+            project_constraints[code] = name
+
+    problem.solve(pulp.PULP_CBC_CMD(msg=False, mip=False))
+    status = pulp.LpStatus[problem.status]
+
+    constraints = {constraint.name: constraint for constraint in problem_constraints(problem)}
+    student_duals = np.zeros(len(pairs.students))
+    for code, name in student_constraints.items():
+        student_duals[code] = constraints[name].pi or 0.0
+    project_duals = np.zeros(len(pairs.projects))
+    for code, name in project_constraints.items():
+        project_duals[code] = constraints[name].pi or 0.0
+    # Projects without a slot limit have no constraint, hence a zero dual
+    return status, solution_values(x), student_duals, project_duals
+
+
+def pruned_matching(input_data: pd.DataFrame, faculty_slots: dict, exclusions: list = None,
+                    previous: pd.DataFrame = None, k: int = DEFAULT_TOP_K, stats: dict = None):
+    """
+    Solve the matching over each student's top-K candidates and certify the result.
+
+    The restricted LP relaxation is solved (its optimum is integral because the
+    constraints are totally unimodular). Its duals u (students) and v (projects)
+    certify optimality for the full candidate set when no pruned pair has a
+    positive reduced cost c - u_student - v_project. Otherwise K is doubled and
+    the model re-solved; once K covers every candidate this is the full model.
+    Pairs from the previous matching are always kept. Locked pairs are handled
+    by assign_mandatory_matches before this stage, as for perform_ilp_matching.
+
+    Parameters:
+        input_data (pd.DataFrame): Pair table from process_preferences (after mandatory matches)
+        faculty_slots (dict): Dictionary mapping faculty projects to number of open slots
+        exclusions (list): Optional list of excluded (project, student) tuples
+        previous (pd.DataFrame): Optional previous matching used for the similarity term
+        k (int): Initial number of candidates kept per student
+        stats (dict): Optional dictionary filled with the perform_ilp_matching statistics
+            plus 'top_k', 'prune_rounds', 'max_reduced_cost' and 'certified'
+
+    Returns:
+        pd.DataFrame: The optimal matches, with the same columns as perform_ilp_matching
+    """
+    run_config()
+    if stats is None:
+        stats = {}
+    pairs = PairTable.from_frame(input_data, exclusions, previous)
+    stats.update({'candidate_pairs': len(input_data), 'pruned_pairs': len(input_data) - len(pairs),
+                  'variables': 0, 'constraints': 0, 'method': 'lp', 'solver_status': 'Not Solved',
+                  'solver_objective': None, 'gap': None, 'solve_seconds': 0.0,
+                  'top_k': k, 'prune_rounds': 0, 'max_reduced_cost': None, 'certified': False})
+    if len(pairs) == 0:
+        stats.update({'solver_status': 'Empty', 'solver_objective': 0.0, 'gap': 0.0, 'certified': True})
+        return pd.DataFrame(columns=MATCH_COLUMNS)
+
+    if previous is not None:
+        coefficients = (1 - utils.SIMILARITY_WEIGHT) * pairs.probability + utils.SIMILARITY_WEIGHT * pairs.previous
+    else:
+        coefficients = pairs.probability
+    longest = int(np.bincount(pairs.student).max())
+
+    k = max(int(k), 1)
+    while True:
+        kept = top_k_mask(pairs.student, coefficients, k, keep=pairs.previous)
+        solve_start = time.perf_counter()
+        status, values, student_duals, project_duals = _solve_restricted_lp(pairs, coefficients, kept,
+                                                                            faculty_slots)
+        stats['solve_seconds'] += time.perf_counter() - solve_start
+        stats.update({'top_k': k, 'prune_rounds': stats['prune_rounds'] + 1, 'solver_status': status,
+                      'variables': int(kept.sum()),
+                      'constraints': len(np.unique(pairs.student[kept])) + len(
+                          [p for p in np.unique(pairs.project[kept]) if pairs.projects[p] in faculty_slots])})
+        if status != "Optimal" or (np.abs(values - np.round(values)) > INTEGRALITY_TOLERANCE).any():
+            # No usable vertex solution: solve the full model instead
+            print("Note: Pruned LP did not give an integral optimum; solving the full model.")
+            full_stats = {}
+            matches = perform_ilp_matching(input_data, faculty_slots, exclusions, previous, stats=full_stats)
+            stats.update(full_stats)
+            stats['certified'] = full_stats.get('solver_status') == 'Optimal'
+            return matches
+
+        pruned = np.flatnonzero(~kept)
+        reduced = coefficients[pruned] - student_duals[pairs.student[pruned]] - project_duals[pairs.project[pruned]]
+        stats['max_reduced_cost'] = float(reduced.max()) if len(reduced) else 0.0
+        if len(reduced) == 0 or reduced.max() <= REDUCED_COST_TOLERANCE:
+            break
+        # Certificate failed: widen K (at K = longest nothing is pruned)
+        k = min(k * 2, longest)
+
+    kept_positions = np.flatnonzero(kept)
+    matched = kept_positions[np.abs(values - 1.0) <= INTEGRALITY_TOLERANCE]
+    stats.update({'certified': True, 'gap': 0.0,
+                  'solver_objective': float(coefficients[matched].sum())})
+    return input_data.take(pairs.rows[matched])[MATCH_COLUMNS].reset_index(drop=True)
+
+# -------------------------- END PRUNING FUNCTIONS -------------------------
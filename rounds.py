@@ -0,0 +1,151 @@
+"""Multi-round matching: each later round solves only the residual sub-problem."""
+
+import time
+
+import pandas as pd
+
+from utils import (
+    MATCH_COLUMNS,
+    assign_mandatory_matches,
+    perform_ilp_matching
+)
+
+# -------------------------- START ROUND FUNCTIONS -------------------------
+
+def residual_problem(input_data: pd.DataFrame, faculty_slots: dict, matches: pd.DataFrame):
+    """
+    Remove matched students and used slots from a pair table.
+
+    Projects are kept even when they have no slots left, so a later round can
+    reopen them with extra slots.
+
+    Parameters:
+    input_data (pd.DataFrame): Pair table the matches were made from
+    faculty_slots (dict): Dictionary mapping faculty projects to number of open slots
+    matches (pd.DataFrame): Matches made from input_data
+
+    Returns:
+    tuple: (residual input_data, residual faculty_slots)
+    """
+    if matches is None or matches.empty:
+        return input_data, dict(faculty_slots)
+    used = matches['faculty_project'].value_counts()
+    slots = {project: max(count - int(used.get(project, 0)), 0) for project, count in faculty_slots.items()}
+    remaining = input_data[~input_data['student_name'].isin(matches['student_name'].unique())]
+    return remaining.reset_index(drop=True), slots
+
+
+class MatchingRound:
+    """Cached state of one round: its residual pair table, slots and matches."""
+
+    def __init__(self, name, input_data, faculty_slots, matches, seconds=0.0):
+        self.name = name
+        self.input_data = input_data
+        self.faculty_slots = faculty_slots
+        self.matches = matches
+        self.seconds = seconds
+
+    def summary(self):
+        """One-line summary used by show_rounds."""
+        return {
+            'round': self.name,
+            'students': self.input_data['student_name'].nunique(),
+            'open_slots': sum(self.faculty_slots.values()),
+            'pairs': len(self.input_data),
+            'matched': len(self.matches),
+            'seconds': round(self.seconds, 3),
+        }
+
+
+class RoundPipeline:
+    """
+    Sequence of matching rounds over one cohort.
+
+    Each round stores its own residual pair table, so the next round is derived
+    from the (smaller) previous round instead of re-running preprocessing.
+    """
+
+    def __init__(self, input_data: pd.DataFrame, faculty_slots: dict):
+        self.input_data = input_data
+        self.faculty_slots = faculty_slots
+        self.rounds = []
+        self.extra_slots = {}
+        self.base_changed = False
+
+    def add_round(self, name, matches, seconds=0.0):
+        """Record matches made outside the pipeline (e.g. run_matching) as the next round."""
+        input_data, faculty_slots = self.residual()
+        self.rounds.append(MatchingRound(name, input_data, faculty_slots, matches.reset_index(drop=True), seconds))
+        self.base_changed = False
+        return self.rounds[-1]
+
+    def update_base(self, input_data: pd.DataFrame, faculty_slots: dict):
+        """Replace the full pair table (late additions); the next residual is rebuilt from it."""
+        self.input_data = input_data
+        self.faculty_slots = faculty_slots
+        self.base_changed = True
+
+    def residual(self):
+        """Pair table and slots for the next round."""
+        if not self.rounds:
+            return self.input_data, dict(self.faculty_slots)
+        if self.base_changed:
+            faculty_slots = dict(self.faculty_slots)
+            for project, extra in self.extra_slots.items():
+                if project in faculty_slots:
+                    faculty_slots[project] += extra
+            return residual_problem(self.input_data, faculty_slots, self.all_matches())
+        last = self.rounds[-1]
+        return residual_problem(last.input_data, last.faculty_slots, last.matches)
+
+    def run_round(self, name=None, extra_slots=None, locks=None, exclusions=None, previous=None):
+        """
+        Solve the residual sub-problem left by the previous rounds.
+
+        Parameters:
+        name (str): Round name (default 'round N')
+        extra_slots (list): Optional (faculty project, extra slots) tuples opened for this round
+        locks (list): Optional list of locked (project, student) tuples
+        exclusions (list): Optional list of excluded (project, student) tuples
+        previous (pd.DataFrame): Optional previous matching used for the similarity term
+
+        Returns:
+        MatchingRound: The solved round
+        """
+        start = time.perf_counter()
+        input_data, faculty_slots = self.residual()
+        for project, extra in extra_slots or []:
+            if project not in faculty_slots:
+                raise ValueError(f"Unknown faculty project '{project}'.")
+            faculty_slots[project] += extra
+            self.extra_slots[project] = self.extra_slots.get(project, 0) + extra
+
+        # Only projects with open slots take part in this round
+        open_projects = [project for project, count in faculty_slots.items() if count > 0]
+        candidates = input_data[input_data['faculty_project'].isin(open_projects)]
+
+        if candidates.empty:
+            matches = pd.DataFrame(columns=MATCH_COLUMNS)
+        else:
+            candidates, mandatory_matches, updated_slots = assign_mandatory_matches(candidates, faculty_slots, locks)
+            ilp_matches = perform_ilp_matching(candidates, updated_slots, exclusions, previous)
+            frames = [frame for frame in [mandatory_matches, ilp_matches] if not frame.empty]
+            matches = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=MATCH_COLUMNS)
+
+        name = name or f"round {len(self.rounds) + 1}"
+        self.rounds.append(MatchingRound(name, input_data, faculty_slots, matches, time.perf_counter() - start))
+        self.base_changed = False
+        return self.rounds[-1]
+
+    def all_matches(self):
+        """Matches of every round so far."""
+        frames = [matching_round.matches for matching_round in self.rounds if not matching_round.matches.empty]
+        if not frames:
+            return pd.DataFrame(columns=MATCH_COLUMNS)
+        return pd.concat(frames, ignore_index=True)
+
+    def summary(self):
+        """DataFrame with one summary row per round."""
+        return pd.DataFrame([matching_round.summary() for matching_round in self.rounds])
+
+# -------------------------- END ROUND FUNCTIONS -------------------------
@@ -0,0 +1,153 @@
+"""Copy-on-write what-if sandboxes over a shared pair table."""
+
+import pandas as pd
+
+# Name of the real (on-disk) session in sandbox commands
+MAIN = 'main'
+
+# -------------------------- START SANDBOX CLASS -------------------------
+
+class Sandbox:
+    """
+    Overlay of what-if edits on top of the session state.
+
+    A sandbox never copies the pair table. It only records deltas: locks and
+    exclusions added or removed (as (faculty, project, student) triples), slot
+    changes per faculty project, and configuration values. Forking copies the
+    parent's (small) deltas.
+    """
+
+    def __init__(self, name, parent=MAIN):
+        self.name = name
+        self.parent = parent
+        self.added_locks = []
+        self.removed_locks = []
+        self.added_exclusions = []
+        self.removed_exclusions = []
+        self.slot_changes = {}
+        self.config = {}
+        self.matches = None
+
+    def fork(self, name):
+        """Create a child sandbox that starts from this sandbox's deltas."""
+        child = Sandbox(name, parent=self.name)
+        child.added_locks = list(self.added_locks)
+        child.removed_locks = list(self.removed_locks)
+        child.added_exclusions = list(self.added_exclusions)
+        child.removed_exclusions = list(self.removed_exclusions)
+        child.slot_changes = dict(self.slot_changes)
+        child.config = dict(self.config)
+        return child
+
+    def edit_pair(self, kind, faculty, project, student, remove=False):
+        """Record adding or removing a lock ('lock') or exclusion ('exclude')."""
+        pair = (faculty, project, student)
+        added = self.added_locks if kind == 'lock' else self.added_exclusions
+        removed = self.removed_locks if kind == 'lock' else self.removed_exclusions
+        if remove:
+            if pair in added:
+                added.remove(pair)
+            elif pair not in removed:
+                removed.append(pair)
+        else:
+            if pair in removed:
+                removed.remove(pair)
+            elif pair not in added:
+                added.append(pair)
+        self.matches = None
+
+    def change_slots(self, faculty_project, delta):
+        """Record a change in the number of open slots of a faculty project."""
+        self.slot_changes[faculty_project] = self.slot_changes.get(faculty_project, 0) + delta
+        self.matches = None
+
+    def set_config(self, key, value):
+        """Record a configuration value used only in this sandbox."""
+        self.config[key] = value
+        self.matches = None
+
+    def rebase(self, committed):
+        """Drop the deltas of a committed ancestor, which are now part of the session."""
+        for attribute in ['added_locks', 'removed_locks', 'added_exclusions', 'removed_exclusions']:
+            done = getattr(committed, attribute)
+            setattr(self, attribute, [pair for pair in getattr(self, attribute) if pair not in done])
+        for faculty_project, delta in committed.slot_changes.items():
+            remaining = self.slot_changes.get(faculty_project, 0) - delta
+            if remaining:
+                self.slot_changes[faculty_project] = remaining
+            else:
+                self.slot_changes.pop(faculty_project, None)
+        self.config = {key: value for key, value in self.config.items() if committed.config.get(key) != value}
+        if self.parent == committed.name:
+            self.parent = committed.parent
+
+    def apply(self, locks, exclusions, faculty_slots):
+        """
+        Apply the deltas to the session's locks, exclusions and slots.
+
+        Parameters:
+        locks (list): Session locked (project, student) tuples (or None)
+        exclusions (list): Session excluded (project, student) tuples (or None)
+        faculty_slots (dict): Session slots per faculty project
+
+        Returns:
+        tuple: (locks, exclusions, faculty_slots) as seen by this sandbox
+        """
+        def overlay(pairs, added, removed):
+            removed = {(f"{faculty} - {project}", student) for faculty, project, student in removed}
+            pairs = [pair for pair in pairs or [] if pair not in removed]
+            pairs += [(f"{faculty} - {project}", student) for faculty, project, student in added
+                      if (f"{faculty} - {project}", student) not in pairs]
+            return pairs
+
+        slots = dict(faculty_slots)
+        for faculty_project, delta in self.slot_changes.items():
+            if faculty_project not in slots:
+                raise ValueError(f"Unknown faculty project '{faculty_project}'.")
+            slots[faculty_project] = max(slots[faculty_project] + delta, 0)
+        return (overlay(locks, self.added_locks, self.removed_locks),
+                overlay(exclusions, self.added_exclusions, self.removed_exclusions),
+                slots)
+
+    def describe(self):
+        """Human-readable list of the deltas."""
+        lines = []
+        for label, pairs in [('+ lock', self.added_locks), ('- lock', self.removed_locks),
+                             ('+ exclude', self.added_exclusions), ('- exclude', self.removed_exclusions)]:
+            lines += [f"{label}: {faculty} - {project} / {student}" for faculty, project, student in pairs]
+        lines += [f"slots: {project} {delta:+d}" for project, delta in self.slot_changes.items()]
+        lines += [f"config: {key} = {value}" for key, value in self.config.items()]
+        return lines
+
+# -------------------------- END SANDBOX CLASS -------------------------
+
+# -------------------------- START DIFF FUNCTIONS -------------------------
+
+def diff_matches(before: pd.DataFrame, after: pd.DataFrame):
+    """
+    List the students whose assignment differs between two matchings.
+
+    Parameters:
+    before (pd.DataFrame): First matching
+    after (pd.DataFrame): Second matching
+
+    Returns:
+    pd.DataFrame: Columns 'student_name', 'before', 'after', 'probability_before' and
+        'probability_after' ('' / NaN where the student is unmatched), sorted by student
+    """
+    columns = ['faculty_project', 'probability_of_match']
+    empty = pd.DataFrame(columns=['student_name'] + columns)
+    before = (before if before is not None and not before.empty else empty).set_index('student_name')[columns]
+    after = (after if after is not None and not after.empty else empty).set_index('student_name')[columns]
+    joined = before.join(after, how='outer', lsuffix='_before', rsuffix='_after')
+    changed = joined['faculty_project_before'].fillna('') != joined['faculty_project_after'].fillna('')
+    joined = joined[changed].sort_index()
+    return pd.DataFrame({
+        'student_name': joined.index,
+        'before': joined['faculty_project_before'].fillna('').to_numpy(),
+        'after': joined['faculty_project_after'].fillna('').to_numpy(),
+        'probability_before': joined['probability_of_match_before'].to_numpy(),
+        'probability_after': joined['probability_of_match_after'].to_numpy(),
+    })
+
+# -------------------------- END DIFF FUNCTIONS -------------------------
@@ -0,0 +1,292 @@
+"""Local matching service: one in-memory cohort shared by several coordinators over HTTP."""
+
+import argparse
+import json
+import threading
+import time
+from concurrent.futures import Future
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+import pandas as pd
+
+from config import CONFIG_PARAMS, PAIR_TABLE_PARAMS, load_config, set_config_overrides
+from utils import (
+    process_preferences,
+    process_locks_exclusions,
+    assign_mandatory_matches,
+    perform_ilp_matching,
+    name_resolution_report,
+    name_resolution_warning,
+    matching_objective
+)
+
+# Allowed range of each configuration parameter
+CONFIG_RANGES = {
+    'faculty_weight': (0, 1),
+    'student_no_rank_penalty': (0, 1),
+    'faculty_no_rank_penalty': (0, 1),
+    'low_rank_penalty': (0, 1),
+    'similarity_weight': (0, 0.5),
+}
+
+# -------------------------- START SERVICE CLASS -------------------------
+
+class MatchingService:
+    """
+    In-memory matching state for one cohort.
+
+    The CSVs are read once. The pair table is kept between solves and only
+    rebuilt when a configuration value that affects probabilities changes.
+    Locks, exclusions and configuration changes live in memory; they are not
+    written back to the locking file or config.yaml. Concurrent solve requests
+    for the same state share one solver run.
+    """
+
+    def __init__(self, student_file, faculty_file, locking_file=None, previous_file=None):
+        self.df_student = pd.read_csv(student_file)
+        self.df_faculty = pd.read_csv(faculty_file)
+        self.locks, self.exclusions = [], []
+        if locking_file is not None:
+            self.locks, self.exclusions = process_locks_exclusions(pd.read_csv(locking_file))
+        self.previous = pd.read_csv(previous_file) if previous_file is not None else None
+
+        self.config = {key: value for key, value in load_config().items() if key in CONFIG_PARAMS}
+        self.matches = None
+        self.version = 0
+        self.solve_count = 0
+        self.last_solve = None
+
+        self.lock = threading.Lock()
+        self.solver_lock = threading.Lock()
+        self.inflight = None
+        self.inflight_key = None
+        self.pair_table = None
+        self.pair_table_config = None
+
+    # ---- state changes ----
+
+    def set_config(self, changes):
+        """Validate and apply configuration changes; returns the new configuration."""
+        for key, value in changes.items():
+            if key not in CONFIG_RANGES:
+                raise ValueError(f"Unknown configuration parameter '{key}'.")
+            low, high = CONFIG_RANGES[key]
+            if not isinstance(value, (int, float)) or not low <= value <= high:
+                raise ValueError(f"{key} must be a number between {low} and {high}.")
+        with self.lock:
+            self.config.update(changes)
+            self.version += 1
+            return dict(self.config)
+
+    def edit_pair(self, kind, faculty, project, student, remove=False):
+        """Add or remove a lock ('lock') or exclusion ('exclude')."""
+        pair = (f"{faculty} - {project}", student)
+        with self.lock:
+            pairs = self.locks if kind == 'lock' else self.exclusions
+            if remove:
+                if pair not in pairs:
+                    raise ValueError(f"No {kind} for {pair}.")
+                pairs.remove(pair)
+            elif pair not in pairs:
+                pairs.append(pair)
+            self.version += 1
+
+    # ---- solving ----
+
+    def solve(self, rematch=False):
+        """
+        Solve the current state, sharing the run with identical concurrent requests.
+
+        Returns:
+        dict: Summary of the solve, with 'shared' set when this request joined a run
+              started by another request, and 'stale' set when a solve of a newer
+              state had already finished (the result is then not stored)
+        """
+        key = (self.version, rematch)
+        with self.lock:
+            shared = self.inflight is not None and self.inflight_key == key
+            if shared:
+                future = self.inflight
+            else:
+                future = Future()
+                self.inflight, self.inflight_key = future, key
+                # As in the shell, the previous file stands in for the matches until the first solve
+                previous = (self.matches if self.matches is not None else self.previous) if rematch else None
+                state = (self.version, dict(self.config), list(self.locks), list(self.exclusions), previous)
+        if not shared:
+            try:
+                future.set_result(self.run_solve(*state))
+            except Exception as e:
+                future.set_exception(e)
+            finally:
+                with self.lock:
+                    if self.inflight is future:
+                        self.inflight = None
+        return dict(future.result(), shared=shared)
+
+    def run_solve(self, version, config, locks, exclusions, previous):
+        """Run one solve for a snapshot of the state and store the result."""
+        with self.solver_lock:
+            start = time.perf_counter()
+            set_config_overrides(config)
+            try:
+                pair_config = {key: config[key] for key in PAIR_TABLE_PARAMS}
+                if self.pair_table is None or self.pair_table_config != pair_config:
+                    self.pair_table = process_preferences(self.df_student, self.df_faculty)
+                    self.pair_table_config = pair_config
+                input_data, faculty_slots = self.pair_table
+
+                remaining, mandatory, updated_slots = assign_mandatory_matches(input_data, faculty_slots, locks)
+                ilp_matches = perform_ilp_matching(remaining, updated_slots, exclusions, previous)
+                matches = pd.concat([mandatory, ilp_matches], ignore_index=True)
+                objective = matching_objective(matches, previous)
+            finally:
+                set_config_overrides({})
+
+            self.solve_count += 1
+            summary = {'solve_id': self.solve_count, 'version': version, 'matched': len(matches),
+                       'objective': objective, 'seconds': time.perf_counter() - start}
+            with self.lock:
+                # Solves may finish out of order; never replace the result of a newer state
+                summary['stale'] = self.last_solve is not None and version < self.last_solve['version']
+                if not summary['stale']:
+                    self.matches = matches
+                    self.last_solve = summary
+            return summary
+
+    # ---- queries ----
+
+    def show(self, sort='probability_of_match', limit=None, faculty=None, student=None):
+        """Return the current matches as a list of records."""
+        with self.lock:
+            matches = self.matches
+        if matches is None:
+            return []
+        if sort not in matches.columns:
+            raise ValueError(f"Unknown sort column '{sort}'.")
+        if faculty:
+            matches = matches[matches['faculty_name'].astype(str).str.contains(faculty, case=False, regex=False)]
+        if student:
+            matches = matches[matches['student_name'].astype(str).str.contains(student, case=False, regex=False)]
+        matches = matches.sort_values(sort, ascending=False, kind='mergesort')
+        if limit is not None:
+            matches = matches.head(limit)
+        return json.loads(matches.to_json(orient='records'))
+
+# -------------------------- END SERVICE CLASS -------------------------
+
+# -------------------------- START HTTP FUNCTIONS -------------------------
+
+def make_handler(service):
+    """Build a request handler class bound to a MatchingService."""
+
+    class MatchingRequestHandler(BaseHTTPRequestHandler):
+        """JSON endpoints for the matching service."""
+
+        def log_message(self, format, *args):
+            # Keep the coordinator's terminal quiet
+            pass
+
+        def send_json(self, status, payload):
+            body = json.dumps(payload).encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def read_json(self):
+            length = int(self.headers.get('Content-Length') or 0)
+            if length == 0:
+                return {}
+            payload = json.loads(self.rfile.read(length))
+            if not isinstance(payload, dict):
+                raise ValueError("Request body must be a JSON object.")
+            return payload
+
+        def read_flag(self, payload, key):
+            value = payload.get(key, False)
+            if not isinstance(value, bool):
+                raise ValueError(f"'{key}' must be true or false.")
+            return value
+
+        def do_GET(self):
+            url = urlparse(self.path)
+            query = {key: values[-1] for key, values in parse_qs(url.query).items()}
+            try:
+                if url.path == '/health':
+                    self.send_json(200, {'status': 'ok', 'version': service.version})
+                elif url.path == '/config':
+                    self.send_json(200, dict(service.config))
+                elif url.path == '/matches':
+                    limit = int(query['limit']) if 'limit' in query else None
+                    matches = service.show(query.get('sort', 'probability_of_match'), limit,
+                                           query.get('faculty'), query.get('student'))
+                    self.send_json(200, {'version': service.version, 'last_solve': service.last_solve,
+                                         'matches': matches})
+                elif url.path == '/locks':
+                    self.send_json(200, {'locks': service.locks, 'exclusions': service.exclusions})
+                else:
+                    self.send_json(404, {'error': f"Unknown endpoint '{url.path}'."})
+            except ValueError as e:
+                self.send_json(400, {'error': str(e)})
+
+        def do_POST(self):
+            url = urlparse(self.path)
+            try:
+                payload = self.read_json()
+                if url.path == '/solve':
+                    self.send_json(200, service.solve(self.read_flag(payload, 'rematch')))
+                elif url.path == '/config':
+                    self.send_json(200, service.set_config(payload))
+                elif url.path in ('/lock', '/exclude'):
+                    missing = [key for key in ['faculty', 'project', 'student'] if key not in payload]
+                    if missing:
+                        raise ValueError(f"Missing fields: {', '.join(missing)}")
+                    service.edit_pair(url.path[1:], payload['faculty'], payload['project'], payload['student'],
+                                      self.read_flag(payload, 'remove'))
+                    self.send_json(200, {'version': service.version, 'locks': service.locks,
+                                         'exclusions': service.exclusions})
+                else:
+                    self.send_json(404, {'error': f"Unknown endpoint '{url.path}'."})
+            except ValueError as e:
+                self.send_json(400, {'error': str(e)})
+            except Exception as e:
+                self.send_json(500, {'error': f"{type(e).__name__}: {e}"})
+
+    return MatchingRequestHandler
+
+
+def make_server(service, host='127.0.0.1', port=8000):
+    """Create (but do not start) an HTTP server for the service."""
+    return ThreadingHTTPServer((host, port), make_handler(service))
+
+
+def main(argv=None):
+    """Command line entry point: python main.py serve <student> <faculty> [<locking>] [<previous>]"""
+    parser = argparse.ArgumentParser(prog='python main.py serve', description='Serve one cohort over HTTP')
+    parser.add_argument('student_file')
+    parser.add_argument('faculty_file')
+    parser.add_argument('locking_file', nargs='?')
+    parser.add_argument('previous_file', nargs='?')
+    parser.add_argument('--host', default='127.0.0.1', help='Interface to listen on (default loopback only)')
+    parser.add_argument('--port', type=int, default=8000)
+    args = parser.parse_args(argv)
+
+    service = MatchingService(args.student_file, args.faculty_file, args.locking_file, args.previous_file)
+    server = make_server(service, args.host, args.port)
+    print(f"Loaded {len(service.df_student)} students and {len(service.df_faculty)} faculty.")
+    warning = name_resolution_warning(name_resolution_report(service.df_student, service.df_faculty).to_dict('records'))
+    if warning is not None:
+        print(warning)
+    print(f"Serving on http://{server.server_address[0]}:{server.server_address[1]} (Ctrl-C to stop)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\nStopping...")
+    finally:
+        server.server_close()
+    return 0
+
+# -------------------------- END HTTP FUNCTIONS -------------------------
@@ -0,0 +1,102 @@
+"""Save and restore shell sessions as versioned binary snapshots."""
+
+import hashlib
+import os
+import pickle
+import tempfile
+from datetime import datetime, timezone
+
+# Bump when the snapshot layout changes; snapshots in another format are rejected
+SESSION_FORMAT = 1
+
+# Input files whose contents are hashed to detect stale snapshots
+INPUT_FILES = ['student_file', 'faculty_file', 'locking_file', 'previous_file']
+
+# -------------------------- START SESSION FUNCTIONS -------------------------
+
+def file_hash(path):
+    """
+    Hash the contents of an input file.
+
+    Parameters:
+    path (str): File path (or None)
+
+    Returns:
+    str: Hex digest, 'missing' if the file does not exist, or None without a path
+    """
+    if path is None:
+        return None
+    if not os.path.exists(path):
+        return 'missing'
+    hasher = hashlib.sha256()
+    with open(path, 'rb') as handle:
+        for block in iter(lambda: handle.read(1 << 20), b''):
+            hasher.update(block)
+    return hasher.hexdigest()
+
+
+def input_hashes(files):
+    """Hash every input file named in a {key: path} dictionary."""
+    return {key: file_hash(files.get(key)) for key in INPUT_FILES}
+
+
+def save_session(state, path):
+    """
+    Atomically write a session snapshot.
+
+    The input file hashes and a timestamp are added to the state before writing.
+
+    Parameters:
+    state (dict): Session state; must contain 'files' ({key: path} of the inputs)
+    path (str): Snapshot file
+    """
+    state = dict(state, hashes=input_hashes(state['files']),
+                 saved_at=datetime.now(timezone.utc).isoformat(timespec='seconds'))
+    directory = os.path.dirname(path) or '.'
+    os.makedirs(directory, exist_ok=True)
+    handle, temp_path = tempfile.mkstemp(dir=directory, prefix='.' + os.path.basename(path) + '.', suffix='.tmp')
+    with os.fdopen(handle, 'wb') as temp_file:
+        pickle.dump((SESSION_FORMAT, state), temp_file, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(temp_path, path)
+
+
+def load_session(path):
+    """
+    Read a session snapshot.
+
+    Snapshots are pickles, and unpickling can run arbitrary code, so only load
+    snapshots you wrote yourself or that come from a trusted source.
+
+    Parameters:
+    path (str): Snapshot file
+
+    Returns:
+    dict: The saved session state
+
+    Raises:
+    ValueError: If the file is not a session snapshot of the current format
+    """
+    with open(path, 'rb') as handle:
+        try:
+            stored_format, state = pickle.load(handle)
+        except Exception as e:
+            raise ValueError(f"'{path}' is not a session snapshot ({e}).")
+    if stored_format != SESSION_FORMAT:
+        raise ValueError(f"'{path}' has snapshot format {stored_format}; this version reads format {SESSION_FORMAT}.")
+    return state
+
+
+def stale_inputs(state):
+    """
+    List the input files that changed since a snapshot was saved.
+
+    Parameters:
+    state (dict): Session state from load_session
+
+    Returns:
+    list: Keys from INPUT_FILES whose file contents differ from the snapshot
+    """
+    current = input_hashes(state['files'])
+    return [key for key in INPUT_FILES if current[key] != state['hashes'][key]]
+
+# -------------------------- END SESSION FUNCTIONS -------------------------
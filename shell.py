@@ -1,7 +1,11 @@
 """Shell implementation."""
 
 import cmd
+import os
 import sys
+import time
+import tempfile
+import numpy as np
 import pandas as pd
 import shlex
 import argparse
@@ -9,21 +13,76 @@ from utils import (
     process_preferences,
     assign_mandatory_matches,
     perform_ilp_matching,
-    process_locks_exclusions
+    process_locks_exclusions,
+    name_resolution_report,
+    name_resolution_warning,
+    matching_objective
+)
+from sweep import (
+    DEFAULT_MAX_SCENARIOS,
+    capacity_sweep,
+    parse_slot_change
+)
+from worker import SolveJob
+from rounds import RoundPipeline
+from sandbox import Sandbox, diff_matches, MAIN
+from cache import SolutionCache, solve_fingerprint
+from metrics import (
+    solve_with_stats,
+    build_run_metrics,
+    append_jsonl,
+    write_prometheus_textfile
+)
+from export import export_matches
+from pruning import pruned_matching, DEFAULT_TOP_K
+from planner import estimate_problem, plan_solve
+from aggregate import aggregated_matching
+from greedy import greedy_matching, preview_gap
+from lookup import CandidateIndex, MatchLookup
+from pipeline import matching_pipeline, apply_slot_changes
+from session import save_session, load_session, stale_inputs
+from progress import SolverProgress, progress_record, PROGRESS_DISPLAY_SECONDS
+from stable import (
+    stable_matching,
+    compare_engines
 )
 from config import (
     get_config_value,
     set_config_value,
+    get_config_overrides,
+    set_config_overrides,
+    load_config,
+    CONFIG_PARAMS,
+    PAIR_TABLE_PARAMS
 )
 
+# Rows formatted and written at a time by stream_table
+STREAM_BLOCK_ROWS = 1000
+
 
 class MatchingShell(cmd.Cmd):
     """Interactive shell for RA/TA matching with live configuration."""
 
     prompt = '(match)> '
 
-    def __init__(self, student_file, faculty_file, locking_file=None, previous_file=None):
-        """Initialize the shell with faculty and student data files."""
+    # Commands that change the inputs of a solve; queued while a solve is running
+    EDIT_COMMANDS = {
+        'lock', 'exclude', 'remove_lock', 'remove_exclusion',
+        'change_faculty_weight', 'change_low_rank_penalty', 'change_student_no_rank_penalty',
+        'change_faculty_no_rank_penalty', 'change_similarity_weight',
+    }
+
+    # Configuration key and upper bound changed by each change_* command
+    CONFIG_COMMANDS = {
+        'change_faculty_weight': ('faculty_weight', 1),
+        'change_low_rank_penalty': ('low_rank_penalty', 1),
+        'change_student_no_rank_penalty': ('student_no_rank_penalty', 1),
+        'change_faculty_no_rank_penalty': ('faculty_no_rank_penalty', 1),
+        'change_similarity_weight': ('similarity_weight', 0.5),
+    }
+
+    def __init__(self, student_file, faculty_file, locking_file=None, previous_file=None, session_file=None):
+        """Initialize the shell with faculty and student data files, or resume a saved session."""
         super().__init__()
         self.faculty_file = faculty_file
         self.student_file = student_file
@@ -32,7 +91,33 @@ class MatchingShell(cmd.Cmd):
         self.previous_file = previous_file
         self.combined_matches = None
         self.sort = "probability_of_match"
-        self.load_initial_data()
+        self.sort_orders = {}
+        self.solve_job = None
+        self.queued_edits = []
+        self.needs_rerun = False
+        self.waiting = False
+        self.round_pipeline = None
+        self.sandboxes = {}
+        self.active_sandbox = None
+        self.sandbox_tables = {}
+        self.slot_changes = {}
+        self.solution_cache = SolutionCache()
+        self.metrics_jsonl = None
+        self.metrics_prometheus = None
+        self.last_metrics = None
+        # Latest metrics record per run label, for the Prometheus textfile
+        self.metrics_by_run = {}
+        self.last_plan = None
+        self.preview_matches = None
+        self.match_lookup = None
+        self.candidate_index = None
+        self.script_sandbox = None
+        self.pipeline = matching_pipeline()
+        if session_file is None or not self.resume_session(session_file):
+            if self.student_file is None:
+                print(f"Error: Cannot resume from '{session_file}' and no input files were given.")
+                sys.exit(1)
+            self.load_initial_data()
 
     def load_initial_data(self):
         """Load initial data and perform initial matching."""
@@ -78,44 +163,1046 @@ class MatchingShell(cmd.Cmd):
             self.df_previous = None
 
         if (self.df_previous is not None):
-            self.combined_matches = self.df_previous
+            self.set_matches(self.df_previous)
 
         # self.process_data()
         print(
                 f"Loaded {len(self.df_student)} students and "
                 f"{len(self.df_faculty)} faculty."
             )
+        self.warn_name_issues()
+
+    def warn_name_issues(self):
+        """Print the rank cells of the loaded responses that did not match exactly, once per load."""
+        warning = name_resolution_warning(name_resolution_report(self.df_student, self.df_faculty).to_dict('records'))
+        if warning is not None:
+            print(warning)
+
+    def session_state(self):
+        """Everything needed to resume the session without re-reading or re-solving."""
+        return {
+            'files': {'student_file': self.student_file, 'faculty_file': self.faculty_file,
+                      'locking_file': self.locking_file, 'previous_file': self.previous_file},
+            'df_student': self.df_student,
+            'df_faculty': self.df_faculty,
+            'df_locking': getattr(self, 'df_locking', None),
+            'df_previous': self.df_previous,
+            'config': {key: value for key, value in load_config().items() if key in CONFIG_PARAMS},
+            'slot_changes': dict(self.slot_changes),
+            'pipeline': self.pipeline.snapshot(),
+            'combined_matches': self.combined_matches,
+            'mandatory_matches': getattr(self, 'mandatory_matches', None),
+            'original_faculty_slots': self.original_faculty_slots,
+            'sort': self.sort,
+            'sort_orders': dict(self.sort_orders),
+            'needs_rerun': self.needs_rerun,
+        }
+
+    def resume_session(self, path, force=False):
+        """
+        Restore a saved session.
+
+        Parameters:
+        path (str): Snapshot written by save_session
+        force (bool): Restore even if the input files changed since the snapshot
+
+        Returns:
+        bool: True if the session was restored
+        """
+        try:
+            state = load_session(path)
+        except (OSError, ValueError) as e:
+            print(f"Could not load session: {e}")
+            return False
+        files = state['files']
+        stale = stale_inputs(state)
+        if stale and not force:
+            print(f"Session snapshot '{path}' is stale: {', '.join(stale)} changed since it was saved "
+                  f"at {state['saved_at']}.")
+            if self.student_file is None:
+                # Started from the snapshot alone: load its input files afresh instead
+                self.student_file, self.faculty_file = files['student_file'], files['faculty_file']
+                self.locking_file, self.previous_file = files['locking_file'], files['previous_file']
+            return False
+
+        self.student_file, self.faculty_file = files['student_file'], files['faculty_file']
+        self.locking_file, self.previous_file = files['locking_file'], files['previous_file']
+
+        self.df_student = state['df_student']
+        self.df_faculty = state['df_faculty']
+        if state['df_locking'] is not None:
+            self.df_locking = state['df_locking']
+        self.df_previous = state['df_previous']
+        self.slot_changes = dict(state['slot_changes'])
+        self.pipeline.restore(state['pipeline'])
+        self.original_faculty_slots = state['original_faculty_slots']
+        if state['mandatory_matches'] is not None:
+            self.mandatory_matches = state['mandatory_matches']
+        self.combined_matches = state['combined_matches']
+        self.match_lookup = None
+        self.sort = state['sort']
+        self.sort_orders = dict(state['sort_orders'])
+        self.needs_rerun = state['needs_rerun'] or bool(stale)
+
+        config = {key: value for key, value in load_config().items() if key in CONFIG_PARAMS}
+        changed = [key for key in CONFIG_PARAMS if config.get(key) != state['config'].get(key)]
+        if changed:
+            # The stage graph re-runs whatever the new values invalidate on the next solve
+            print(f"Note: configuration changed since the snapshot ({', '.join(changed)}); "
+                  "re-run 'run_matching' to update the matches.")
+            self.needs_rerun = True
+        matches = 0 if self.combined_matches is None else len(self.combined_matches)
+        print(f"Resumed session saved at {state['saved_at']}: {len(self.df_student)} students, "
+              f"{len(self.df_faculty)} faculty, {matches} matches.")
+        return True
+
+    def process_data(self, rematch, engine='auto', proposing='student', top_k=DEFAULT_TOP_K, preview=False):
+        """Re-run processing with current weights and wait for the result."""
+        self.start_solve(rematch, engine, proposing, top_k, preview)
+        self.wait_for_solve()
 
-    def process_data(self, rematch):
-        """Re-run processing with current weights."""
-        input_data, faculty_slots = process_preferences(self.df_student, self.df_faculty)
-        if self.locking_file is not None:
-            locks, exclusions = process_locks_exclusions(self.df_locking)
+    def run_pipeline(self, df_student, df_faculty, df_locking, *stages):
+        """Run preprocessing stages through the stage graph; only stages whose inputs changed re-run."""
+        with self.pipeline.lock:
+            self.pipeline.set_input('students', df_student)
+            self.pipeline.set_input('faculty', df_faculty)
+            self.pipeline.set_input('pair_config', tuple(get_config_value(param) for param in PAIR_TABLE_PARAMS))
+            self.pipeline.set_input('slot_changes', dict(self.slot_changes))
+            self.pipeline.set_input('locking', df_locking)
+            return self.pipeline.run(*stages)
+
+    def preprocess(self, df_student, df_faculty, df_locking):
+        """Build the pair table, slots, locks and exclusions from the input frames."""
+        (input_data, faculty_slots), (locks, exclusions) = self.run_pipeline(df_student, df_faculty, df_locking,
+                                                                             'slots', 'locks')
+        return input_data, faculty_slots, locks, exclusions
+
+    def apply_slot_changes(self, faculty_slots):
+        """Apply slot changes committed from sandboxes to the slots read from the faculty file."""
+        return apply_slot_changes(faculty_slots, self.slot_changes)
+
+    def start_solve(self, rematch, engine='auto', proposing='student', top_k=DEFAULT_TOP_K, preview=False):
+        """Start a solve in the background; the current matches stay viewable until it finishes."""
+        previous = self.combined_matches if rematch else None
+        df_locking = self.df_locking if self.locking_file is not None else None
+        description = 'rematching' if rematch else 'matching'
+        if engine not in ('ilp', 'auto'):
+            description += f' ({engine})'
+        self.solve_job = SolveJob(description, self.solve, self.df_student, self.df_faculty,
+                                  df_locking, previous, engine, proposing, top_k, preview)
+        self.preview_matches = None
+        self.solve_job.on_done = self.notify_solve_done
+        self.solve_job.start()
+
+    def solve(self, job, df_student, df_faculty, df_locking, previous, engine='auto', proposing='student',
+              top_k=DEFAULT_TOP_K, preview=False):
+        """Background solve target: preprocessing in the job thread, the ILP in a solver process."""
+        start = time.perf_counter()
+        stage_seconds = {}
+        job.set_stage('processing preferences')
+        (input_data, faculty_slots), (locks, exclusions), mandatory = self.run_pipeline(
+            df_student, df_faculty, df_locking, 'slots', 'locks', 'mandatory')
+        pipeline_stages = dict(self.pipeline.last_status)
+        stage_seconds['preprocess'] = time.perf_counter() - start
+
+        # Identical inputs and configuration give the same result
+        config = {key: value for key, value in load_config().items() if key in CONFIG_PARAMS}
+        key = solve_fingerprint(input_data, faculty_slots, locks, exclusions, previous, config,
+                                engine=engine, proposing=proposing if engine == 'stable' else None)
+        cached = self.solution_cache.get(key)
+        if cached is not None:
+            job.notes.append("Result loaded from the solution cache.")
+            self.record_metrics(engine, input_data, faculty_slots, cached[2], cached[1], stage_seconds,
+                                {'solver_status': 'Cached'}, previous, time.perf_counter() - start,
+                                dict(pipeline_stages, solve='hit'))
+            return cached
+
+        pair_table = input_data
+        input_data, mandatory_matches, updated_slots = mandatory
+
+        if engine == 'auto':
+            stage_start = time.perf_counter()
+            job.set_stage('planning')
+            plan = plan_solve(estimate_problem(input_data, updated_slots, locks, exclusions, previous), top_k)
+            self.last_plan = plan
+            engine, top_k = plan.engine, plan.top_k
+            job.notes.append(f"Plan: {plan.summary()}")
+            stage_seconds['plan'] = time.perf_counter() - stage_start
+
+        preview_matches = None
+        if preview and engine not in ('stable', 'greedy'):
+            job.set_stage('greedy preview')
+            preview_matches = self.show_preview(job, df_student, df_faculty, df_locking, input_data,
+                                                mandatory_matches, updated_slots, exclusions, previous)
+
+        stage_start = time.perf_counter()
+        solver_stats = None
+        if engine == 'stable':
+            job.set_stage(f'{proposing}-proposing deferred acceptance')
+            matches = stable_matching(input_data, updated_slots, exclusions, proposing)
+        elif engine == 'greedy':
+            job.set_stage('greedy matching')
+            solver_stats = {}
+            matches = greedy_matching(input_data, updated_slots, exclusions, previous, solver_stats)
+        elif engine == 'relax':
+            job.set_stage('solving LP relaxation')
+            matches, solver_stats = self.run_with_progress(job, engine, input_data, updated_slots, exclusions,
+                                                           previous, relax=True)
+        elif engine == 'pruned':
+            job.set_stage(f'solving top-{top_k} pruned LP')
+            matches, solver_stats = job.run_in_process(solve_with_stats, input_data, updated_slots, exclusions,
+                                                       previous, solver=pruned_matching, k=top_k)
+            if not solver_stats.get('certified'):
+                job.notes.append("Warning: the pruned solve could not be certified optimal.")
+        elif engine == 'aggregate':
+            job.set_stage('solving aggregated model')
+            matches, solver_stats = self.run_with_progress(job, engine, input_data, updated_slots, exclusions,
+                                                           previous, solver=aggregated_matching, relax=True)
         else:
-            locks = None
-            exclusions = None
-        self.original_faculty_slots = faculty_slots.copy()
-        
-        input_data, self.mandatory_matches, updated_slots = assign_mandatory_matches(input_data, faculty_slots, locks)
-        if (rematch):
-            ilp_matches = perform_ilp_matching(input_data, updated_slots, exclusions, self.combined_matches)
+            job.set_stage('solving ILP')
+            matches, solver_stats = self.run_with_progress(job, engine, input_data, updated_slots, exclusions,
+                                                           previous)
+        stage_seconds['solve'] = time.perf_counter() - stage_start
+
+        result = (faculty_slots, mandatory_matches, pd.concat([mandatory_matches, matches], ignore_index=True))
+        if preview_matches is not None:
+            gap = preview_gap(preview_matches, result[2], previous)
+            job.notes.append(f"Greedy preview objective {gap['preview_objective']:.4f} was "
+                             f"{100 * gap['gap']:.2f}% below the exact {gap['exact_objective']:.4f}; "
+                             f"{gap['changed_students']} student(s) placed differently.")
+        self.solution_cache.put(key, result)
+        self.record_metrics(engine, pair_table, faculty_slots, result[2], mandatory_matches, stage_seconds,
+                            solver_stats, previous, time.perf_counter() - start,
+                            dict(pipeline_stages, solve='recomputed'))
+        return result
+
+    def show_preview(self, job, df_student, df_faculty, df_locking, input_data, mandatory_matches,
+                     faculty_slots, exclusions, previous):
+        """Compute the greedy preview of a solve and offer it until the exact result arrives."""
+        pairs, = self.run_pipeline(df_student, df_faculty, df_locking, 'candidates')
+        preview_stats = {}
+        matches = greedy_matching(input_data, faculty_slots, exclusions, previous, preview_stats, pairs=pairs)
+        preview_matches = pd.concat([mandatory_matches, matches], ignore_index=True)
+        if job is self.solve_job:
+            self.preview_matches = preview_matches
+        print(f"\n[Preview: greedy matching with {len(preview_matches)} matches, objective "
+              f"{matching_objective(preview_matches, previous):.4f}, in {1000 * preview_stats['solve_seconds']:.0f} ms. "
+              "'show_matches' shows it until the exact solve finishes.]")
+        return preview_matches
+
+    def run_with_progress(self, job, engine, input_data, faculty_slots, exclusions, previous, **kwargs):
+        """
+        Run solve_with_stats in the solver process while following the CBC log.
+
+        Progress (incumbent, bound, gap, nodes) is shown by 'status', printed while
+        waiting on a long solve and appended to the metrics log as 'progress' events.
+        """
+        handle, log_path = tempfile.mkstemp(prefix='cbc-', suffix='.log')
+        os.close(handle)
+        progress = job.progress = SolverProgress(log_path)
+        run = 'rematching' if previous is not None else 'matching'
+
+        def report():
+            events = progress.poll()
+            if not events:
+                return
+            if self.metrics_jsonl is not None:
+                for snapshot in events:
+                    append_jsonl(progress_record(run, engine, snapshot), self.metrics_jsonl)
+            if self.waiting and job.elapsed() >= PROGRESS_DISPLAY_SECONDS:
+                print(f"  {job.stage}: {progress.summary()}")
+
+        job.watch(report)
+        try:
+            return job.run_in_process(solve_with_stats, input_data, faculty_slots, exclusions, previous,
+                                      log_path=log_path, **kwargs)
+        finally:
+            try:
+                os.remove(log_path)
+            except OSError:
+                pass
+
+    def record_metrics(self, engine, input_data, faculty_slots, matches, mandatory_matches, stage_seconds,
+                       solver_stats, previous, total_seconds, pipeline_stages=None, run=None):
+        """
+        Build the metrics record of a solve and write it to the configured outputs.
+
+        The Prometheus textfile holds the latest record of every run label, so a
+        sandbox solve does not hide the gauges of the main matching.
+        """
+        if run is None:
+            run = 'rematching' if previous is not None else 'matching'
+        self.last_metrics = build_run_metrics(run, engine, input_data, faculty_slots, matches, mandatory_matches,
+                                              stage_seconds, solver_stats, previous, total_seconds,
+                                              pipeline_stages)
+        self.metrics_by_run[run] = self.last_metrics
+        try:
+            if self.metrics_jsonl is not None:
+                append_jsonl(self.last_metrics, self.metrics_jsonl)
+            if self.metrics_prometheus is not None:
+                write_prometheus_textfile(list(self.metrics_by_run.values()), self.metrics_prometheus)
+        except Exception as e:
+            print(f"Failed to write metrics: {e}")
+
+    def solve_running(self):
+        """True while a background solve has not finished."""
+        return self.solve_job is not None and not self.solve_job.done()
+
+    def notify_solve_done(self, job):
+        """Tell the user a background solve finished (called from the job thread)."""
+        if job is self.solve_job and not self.waiting:
+            print(f"\n[Background {job.description} {job.stage} after {job.elapsed():.1f}s. "
+                  "Press Enter to load the result.]")
+
+    def wait_for_solve(self, timeout=None):
+        """Block until the background solve finishes, then adopt its result."""
+        job = self.solve_job
+        if job is None:
+            print("No solve running.")
+            return
+        self.waiting = True
+        try:
+            while not job.wait(0.5):
+                if timeout is not None and job.elapsed() >= timeout:
+                    print(f"Solve still running after {job.elapsed():.1f}s ({job.stage}).")
+                    return
+        except KeyboardInterrupt:
+            print("\nStopped waiting; the solve continues in the background.")
+            return
+        finally:
+            self.waiting = False
+        self.collect_solve()
+
+    def collect_solve(self):
+        """Atomically adopt the result of a finished background solve and apply queued edits."""
+        job = self.solve_job
+        if job is None or not job.done():
+            return
+        self.solve_job = None
+        self.preview_matches = None
+        if job.cancelled:
+            print(f"\nSolve cancelled after {job.elapsed():.1f}s; keeping the previous matches.")
+        elif job.error is not None:
+            print(f"\nSolve failed: {job.error}")
         else:
-            ilp_matches = perform_ilp_matching(input_data, updated_slots, exclusions)
-        self.combined_matches = pd.concat([self.mandatory_matches, ilp_matches], ignore_index=True)
+            self.original_faculty_slots, self.mandatory_matches, matches = job.result
+            self.set_matches(matches)
+            self.needs_rerun = False
+            # A new first round invalidates any later rounds
+            self.round_pipeline = None
+            print(f"\nGenerated {len(self.combined_matches)} matches in {job.elapsed():.1f}s.")
+            for note in job.notes:
+                print(note)
+            print("Use 'show_matches' to view the results.")
+
+        queued, self.queued_edits = self.queued_edits, []
+        for line in queued:
+            print(f"Applying queued edit: {line}")
+            self.onecmd(line)
+
+    def precmd(self, line):
+        """Pick up a finished background solve before running the next command."""
+        self.collect_solve()
+        return line
+
+    def postcmd(self, stop, line):
+        """Show the active sandbox in the prompt."""
+        self.prompt = f'(match:{self.active_sandbox})> ' if self.active_sandbox else '(match)> '
+        return stop
+
+    def onecmd(self, line):
+        """Queue edits while a solve is running and mark the matches as out of date."""
+        command, arg, _ = self.parseline(line)
+        if command in self.EDIT_COMMANDS and self.script_sandbox is not None:
+            # Script edits stay in memory until the script ends
+            self.sandbox_edit(self.script_sandbox, command, arg)
+            return False
+        if command in self.EDIT_COMMANDS and self.active_sandbox is not None:
+            # Edits in a sandbox only change its overlay, never the files
+            self.sandbox_edit(self.sandboxes[self.active_sandbox], command, arg)
+            return False
+        if command in self.EDIT_COMMANDS:
+            if self.solve_running():
+                self.queued_edits.append(line)
+                print(f"Solve in progress; queued '{line}' until it finishes.")
+                return False
+            if self.combined_matches is not None:
+                self.needs_rerun = True
+        return super().onecmd(line)
+
+    def set_matches(self, matches):
+        """Replace the current matches and drop the cached sort orders."""
+        self.combined_matches = matches.reset_index(drop=True)
+        self.sort_orders = {}
+        self.match_lookup = None
+        self.lookup()
+
+    def lookup(self):
+        """
+        Hash indexes over the current matches and the cached pair table.
+
+        Built when the matches change; the per-student index of the pair table is
+        kept until the pair table itself changes.
+        """
+        if self.match_lookup is None and self.combined_matches is not None:
+            slots, locks = self.pipeline.cached('slots'), self.pipeline.cached('locks')
+            if slots is None:
+                self.match_lookup = MatchLookup(self.combined_matches)
+            else:
+                if self.candidate_index is None or self.candidate_index.pair_table is not slots[0]:
+                    self.candidate_index = CandidateIndex(slots[0])
+                self.match_lookup = MatchLookup(self.combined_matches, self.candidate_index, slots[1],
+                                                locks[1] if locks is not None else None)
+        return self.match_lookup
+
+    def sorted_positions(self, key):
+        """Return row positions of the current matches ordered by key (cached per key)."""
+        if key not in self.sort_orders:
+            ordered = self.combined_matches[key].sort_values(ascending=False, kind='mergesort')
+            self.sort_orders[key] = ordered.index.to_numpy()
+        return self.sort_orders[key]
 
     def do_run_matching(self, arg):
-        """Execute matching with the current configuration."""
-        print("\nRunning matching algorithm...")
-        self.process_data(rematch=False)
-        print(f"Generated {len(self.combined_matches)} matches.")
-        print("Use 'show_matches' to view the results.")
+        """Execute matching with the current configuration in the background.
+        Usage: run_matching [--wait] [--preview] [--engine auto|ilp|relax|pruned|aggregate|stable|greedy]
+                            [--top-k K] [--proposing student|faculty]
+        """
+        self.run_solve_command(arg, rematch=False)
 
     def do_run_rematching(self, arg):
-        """Execute rematching with current configuration and previous run"""
-        print("\nRunning rematching algorithm...")
-        self.process_data(rematch=True)
-        print(f"Generated {len(self.combined_matches)} matches.")
-        print("Use 'show_matches' to view the results.")
+        """Execute rematching with current configuration and previous run in the background.
+        Usage: run_rematching [--wait] [--preview] [--engine auto|ilp|relax|pruned|aggregate|greedy] [--top-k K]
+        """
+        self.run_solve_command(arg, rematch=True)
+
+    def run_solve_command(self, arg, rematch):
+        """Parse run_matching/run_rematching arguments and start the solve."""
+        parser = argparse.ArgumentParser(description='Run the matching algorithm')
+        parser.add_argument('--wait', action='store_true', help='Block until the solve finishes')
+        parser.add_argument('--engine', choices=['auto', 'ilp', 'relax', 'pruned', 'aggregate', 'stable', 'greedy'],
+                            default='auto',
+                            help='auto: fastest exact engine for the problem (see explain_plan), '
+                                 'ilp: optimal total probability, relax: same optimum via the LP relaxation, '
+                                 'pruned: same optimum over each student\'s top-K candidates, '
+                                 'aggregate: same optimum with interchangeable students solved as classes, '
+                                 'stable: deferred acceptance, greedy: fast approximate matching')
+        parser.add_argument('--top-k', type=int, default=DEFAULT_TOP_K,
+                            help='Candidates kept per student by the pruned engine (widened if needed)')
+        parser.add_argument('--proposing', choices=['student', 'faculty'], default='student',
+                            help='Proposing side for the stable engine')
+        parser.add_argument('--preview', action='store_true',
+                            help='Show a greedy preview right away while the exact solve runs')
+        try:
+            args = parser.parse_args(shlex.split(arg))
+        except SystemExit:
+            # Catch the system exit called by argparse on invalid input or help
+            return
+
+        if rematch and args.engine == 'stable':
+            # Deferred acceptance has no objective to add the similarity term to
+            print("Error: the stable engine ignores the previous matching; use it with run_matching.")
+            return
+        if self.solve_running():
+            print("A solve is already running. Use 'status', 'wait' or 'cancel'.")
+            return
+        print(f"\nRunning {'rematching' if rematch else 'matching'} algorithm...")
+        if args.top_k < 1:
+            print("Error: --top-k must be at least 1.")
+            return
+        self.start_solve(rematch, args.engine, args.proposing, args.top_k, args.preview)
+        if args.wait:
+            self.wait_for_solve()
+        else:
+            print("Solving in the background. Use 'status', 'wait' or 'cancel'; "
+                  "the previous matches stay available meanwhile.")
+
+    def do_compare_engines(self, arg):
+        """Compare the ILP with student- and faculty-proposing stable matchings.
+        Reports matches, objective gap to the ILP, blocking pairs, rank distributions and runtime.
+        Usage: compare_engines
+        """
+        df_locking = self.df_locking if self.locking_file is not None else None
+        try:
+            (_, exclusions), (input_data, mandatory_matches, updated_slots) = self.run_pipeline(
+                self.df_student, self.df_faculty, df_locking, 'locks', 'mandatory')
+
+            results = {}
+            start = time.perf_counter()
+            results['ilp'] = (perform_ilp_matching(input_data, updated_slots, exclusions), time.perf_counter() - start)
+            for proposing in ['student', 'faculty']:
+                start = time.perf_counter()
+                matches = stable_matching(input_data, updated_slots, exclusions, proposing)
+                results[f'stable-{proposing}'] = (matches, time.perf_counter() - start)
+        except Exception as e:
+            print(f"An error occurred: {str(e)}")
+            return
+
+        report = compare_engines(results, input_data, updated_slots, exclusions)
+        print(f"\nEngine comparison ({len(mandatory_matches)} locked/mandatory matches excluded):")
+        print(report.to_string(index=False))
+
+    def do_explain_plan(self, arg):
+        """Show which engine 'run_matching' would use and why, without solving.
+        Usage: explain_plan [--rematch] [--top-k K]
+        """
+        parser = argparse.ArgumentParser(description='Explain the solve plan')
+        parser.add_argument('--rematch', action='store_true', help='Plan a rematching with the current matches')
+        parser.add_argument('--top-k', type=int, default=DEFAULT_TOP_K,
+                            help='Candidates kept per student if pruning is chosen')
+        try:
+            args = parser.parse_args(shlex.split(arg))
+        except SystemExit:
+            # Catch the system exit called by argparse on invalid input or help
+            return
+
+        previous = self.combined_matches if args.rematch else None
+        df_locking = self.df_locking if self.locking_file is not None else None
+        try:
+            (locks, exclusions), (input_data, mandatory_matches, updated_slots) = self.run_pipeline(
+                self.df_student, self.df_faculty, df_locking, 'locks', 'mandatory')
+            plan = plan_solve(estimate_problem(input_data, updated_slots, locks, exclusions, previous), args.top_k)
+        except Exception as e:
+            print(f"An error occurred: {str(e)}")
+            return
+
+        for line in plan.describe():
+            print(line)
+        if self.last_plan is not None:
+            print(f"Last solve: {self.last_plan.summary()}")
+
+    def do_pipeline(self, arg):
+        """Show which preprocessing stages were reused or recomputed.
+        Each stage caches its output and re-runs only when one of its inputs changes.
+        Usage: pipeline [--reset]
+        """
+        parser = argparse.ArgumentParser(description='Preprocessing stage cache')
+        parser.add_argument('--reset', action='store_true', help='Drop every cached stage output')
+        try:
+            args = parser.parse_args(shlex.split(arg))
+        except SystemExit:
+            # Catch the system exit called by argparse on invalid input or help
+            return
+
+        if args.reset:
+            self.pipeline.invalidate()
+            print("Cleared the cached pipeline stages.")
+            return
+        print(self.pipeline.report().to_string(index=False))
+        if self.last_metrics is not None and 'solve' in self.last_metrics['pipeline_stages']:
+            print(f"Last solve: {self.last_metrics['pipeline_stages']['solve']} (solution cache)")
+
+    def do_status(self, arg):
+        """Show the progress of the background solve.
+        Usage: status
+        """
+        if self.solve_running():
+            print(f"Solve ({self.solve_job.description}) running for "
+                  f"{self.solve_job.elapsed():.1f}s: {self.solve_job.stage}")
+            progress = self.solve_job.progress
+            if progress is not None and (progress.incumbent is not None or progress.best_bound is not None):
+                print(f"Solver progress: {progress.summary()}")
+            if self.preview_matches is not None:
+                print(f"Greedy preview: {len(self.preview_matches)} matches (shown by 'show_matches')")
+        else:
+            print("No solve running.")
+        if self.queued_edits:
+            print(f"{len(self.queued_edits)} edit(s) queued until the solve finishes:")
+            for line in self.queued_edits:
+                print(f"  {line}")
+        if self.combined_matches is not None:
+            note = " (out of date, re-run 'run_matching')" if self.needs_rerun else ""
+            print(f"Current matches: {len(self.combined_matches)}{note}")
+
+    def do_wait(self, arg):
+        """Wait for the background solve to finish.
+        Usage: wait [seconds]
+        """
+        try:
+            timeout = float(arg) if arg else None
+        except ValueError:
+            print("Usage: wait [seconds]")
+            return
+        if not self.solve_running():
+            self.collect_solve()
+            print("No solve running.")
+            return
+        self.wait_for_solve(timeout)
+
+    def do_cancel(self, arg):
+        """Cancel the background solve and keep the previous matches.
+        Usage: cancel
+        """
+        if not self.solve_running():
+            print("No solve running.")
+            return
+        self.solve_job.cancel()
+        self.wait_for_solve()
+
+    def do_next_round(self, arg):
+        """Match the students and slots left over by the previous rounds.
+        Usage: next_round [--name NAME] [-c "Faculty Name - Project=N" ...] [--reload]
+        """
+        # Create parser for the command arguments
+        parser = argparse.ArgumentParser(description='Run the next matching round')
+        parser.add_argument('--name', type=str, help='Name of the round')
+        parser.add_argument('-c', '--change', type=str, action='append', default=[],
+                            help='Extra slots opened for this round "Faculty Name - Project=N"')
+        parser.add_argument('--reload', action='store_true',
+                            help='Re-read the student and faculty files to pick up late additions')
+
+        try:
+            args = parser.parse_args(shlex.split(arg))
+            if self.combined_matches is None:
+                print("No matches calculated yet. Run 'run_matching' for the first round.")
+                return
+            if self.solve_running():
+                print("A solve is already running. Use 'status', 'wait' or 'cancel'.")
+                return
+            extra_slots = [parse_slot_change(change) for change in args.change]
+
+            df_locking = self.df_locking if self.locking_file is not None else None
+            if self.round_pipeline is None or args.reload:
+                if args.reload:
+                    self.df_student = pd.read_csv(self.student_file)
+                    self.df_faculty = pd.read_csv(self.faculty_file)
+                    self.sandbox_tables = {}
+                    self.warn_name_issues()
+                input_data, faculty_slots, locks, exclusions = self.preprocess(self.df_student, self.df_faculty,
+                                                                               df_locking)
+                if self.round_pipeline is None:
+                    # The current matches become the first round
+                    self.round_pipeline = RoundPipeline(input_data, faculty_slots)
+                    self.round_pipeline.add_round('round 1', self.combined_matches)
+                else:
+                    self.round_pipeline.update_base(input_data, faculty_slots)
+            else:
+                locks, exclusions = process_locks_exclusions(df_locking) if df_locking is not None else (None, None)
+
+            matching_round = self.round_pipeline.run_round(args.name, extra_slots, locks, exclusions)
+            self.set_matches(self.round_pipeline.all_matches())
+            summary = matching_round.summary()
+            print(f"\n{summary['round']}: matched {summary['matched']} of {summary['students']} remaining students "
+                  f"to {summary['open_slots']} open slots ({summary['pairs']} candidate pairs) "
+                  f"in {summary['seconds']:.2f}s.")
+            print(f"Total matches: {len(self.combined_matches)}. Use 'show_rounds' for every round.")
+
+        except argparse.ArgumentError as e:
+            print(f"Error parsing arguments: {str(e)}")
+        except SystemExit:
+            # Catch the system exit called by argparse when help is requested
+            pass
+        except Exception as e:
+            print(f"An error occurred: {str(e)}")
+
+    def do_show_rounds(self, arg):
+        """Show a summary of every matching round.
+        Usage: show_rounds
+        """
+        if self.round_pipeline is None:
+            print("No rounds yet. Run 'run_matching' and then 'next_round'.")
+            return
+        print(self.round_pipeline.summary().to_string(index=False))
+
+    def sandbox_edit(self, sandbox, command, arg):
+        """Record a lock, exclusion or configuration edit in a sandbox."""
+        if command in self.CONFIG_COMMANDS:
+            key, upper = self.CONFIG_COMMANDS[command]
+            try:
+                value = float(arg)
+                if not 0 <= value <= upper:
+                    raise ValueError(f"Value must be between 0 and {upper}.")
+            except ValueError as e:
+                print(f"Invalid value: {e}")
+                return
+            sandbox.set_config(key, value)
+            print(f"[{sandbox.name}] {key} = {value}")
+            return
+
+        parser = argparse.ArgumentParser(description=f'{command} in sandbox {sandbox.name}')
+        parser.add_argument('-f', '--faculty', type=str, help='Faculty name', required=True)
+        parser.add_argument('-p', '--project', type=str, help='Project name', required=True)
+        parser.add_argument('-s', '--student', type=str, help='Student full name', required=True)
+        parser.add_argument('-file', type=str, help='Ignored in a sandbox')
+        try:
+            args = parser.parse_args(shlex.split(arg))
+        except SystemExit:
+            # Catch the system exit called by argparse on invalid input or help
+            return
+        kind = 'lock' if command in ('lock', 'remove_lock') else 'exclude'
+        sandbox.edit_pair(kind, args.faculty, args.project, args.student, remove=command.startswith('remove_'))
+        print(f"[{sandbox.name}] {command}: Faculty: '{args.faculty}', Project: '{args.project}', "
+              f"Student: '{args.student}'")
+
+    def sandbox_parent_matches(self, sandbox):
+        """Matches of a sandbox's parent (the session's matches for top-level sandboxes)."""
+        if sandbox.parent in self.sandboxes:
+            return self.sandboxes[sandbox.parent].matches
+        return self.combined_matches
+
+    def solve_sandbox(self, sandbox):
+        """Solve a sandbox against the shared pair table, warm-started from its parent's matches."""
+        start = time.perf_counter()
+        overrides = get_config_overrides()
+        set_config_overrides({**overrides, **sandbox.config})
+        try:
+            # Sandboxes share one pair table per probability configuration
+            key = tuple(get_config_value(param) for param in PAIR_TABLE_PARAMS)
+            if key not in self.sandbox_tables:
+                self.sandbox_tables[key] = process_preferences(self.df_student, self.df_faculty)
+            input_data, faculty_slots = self.sandbox_tables[key]
+
+            if self.locking_file is not None:
+                locks, exclusions = process_locks_exclusions(self.df_locking)
+            else:
+                locks, exclusions = None, None
+            locks, exclusions, slots = sandbox.apply(locks, exclusions, self.apply_slot_changes(faculty_slots))
+
+            remaining, mandatory_matches, updated_slots = assign_mandatory_matches(input_data, slots, locks)
+            stage_seconds = {'preprocess': time.perf_counter() - start}
+            solver_stats = {}
+            matches = perform_ilp_matching(remaining, updated_slots, exclusions,
+                                           warm_start=self.sandbox_parent_matches(sandbox), stats=solver_stats)
+            stage_seconds['solve'] = time.perf_counter() - start - stage_seconds['preprocess']
+            sandbox.matches = pd.concat([mandatory_matches, matches], ignore_index=True)
+            run = 'script' if sandbox is self.script_sandbox else f"sandbox:{sandbox.name}"
+            self.record_metrics('ilp', input_data, slots, sandbox.matches, mandatory_matches, stage_seconds,
+                                solver_stats, None, time.perf_counter() - start, run=run)
+        finally:
+            set_config_overrides(overrides)
+        return sandbox.matches
+
+    def check_committable(self, sandbox):
+        """Raise ValueError if a sandbox's edits could not be written to the files."""
+        if (sandbox.added_locks or sandbox.removed_locks or sandbox.added_exclusions or
+                sandbox.removed_exclusions) and self.locking_file is None:
+            raise ValueError("No locking file to commit locks and exclusions to. "
+                             "Start the shell with a locking file.")
+
+    def commit_sandbox(self, sandbox):
+        """Write a sandbox's edits to the locking file, config file and session slots."""
+        self.check_committable(sandbox)
+        if (sandbox.added_locks or sandbox.removed_locks or sandbox.added_exclusions or
+                sandbox.removed_exclusions):
+            try:
+                df_locking = pd.read_csv(self.locking_file)
+            except FileNotFoundError:
+                df_locking = pd.DataFrame(columns=["Faculty Name", "Project", "Student Name", "Locked", "Excluded"])
+            for column, removed in [('Locked', sandbox.removed_locks), ('Excluded', sandbox.removed_exclusions)]:
+                for faculty, project, student in removed:
+                    df_locking = df_locking[~((df_locking['Faculty Name'] == faculty) &
+                                              (df_locking['Project'] == project) &
+                                              (df_locking['Student Name'] == student) &
+                                              (df_locking[column] == True))]
+            new_rows = [{"Faculty Name": faculty, "Project": project, "Student Name": student,
+                         "Locked": True, "Excluded": False} for faculty, project, student in sandbox.added_locks]
+            new_rows += [{"Faculty Name": faculty, "Project": project, "Student Name": student,
+                          "Locked": False, "Excluded": True} for faculty, project, student in sandbox.added_exclusions]
+            if new_rows:
+                df_locking = pd.concat([df_locking, pd.DataFrame(new_rows)], ignore_index=True)
+            df_locking.to_csv(self.locking_file, index=False)
+            self.df_locking = df_locking
+
+        for key, value in sandbox.config.items():
+            set_config_value(key, value)
+        for faculty_project, delta in sandbox.slot_changes.items():
+            self.slot_changes[faculty_project] = self.slot_changes.get(faculty_project, 0) + delta
+
+        if sandbox.matches is not None:
+            self.set_matches(sandbox.matches)
+            self.needs_rerun = False
+        elif self.combined_matches is not None:
+            self.needs_rerun = True
+
+    def sandbox_ancestors(self, name):
+        """Names of a sandbox's ancestors, nearest first."""
+        ancestors = []
+        while name in self.sandboxes and self.sandboxes[name].parent != MAIN:
+            name = self.sandboxes[name].parent
+            ancestors.append(name)
+        return ancestors
+
+    def do_sandbox(self, arg):
+        """Try locks, exclusions, slot and config changes without touching the files.
+        Usage: sandbox new NAME [--from PARENT]   create a sandbox (from main or another sandbox) and switch to it
+               sandbox switch NAME|main           edits go to the active sandbox; 'main' edits the files
+               sandbox slots -c "Faculty Name - Project=N" [-c ...]   change open slots (N may be negative)
+               sandbox solve [NAME]               solve, warm-started from the parent's matches
+               sandbox diff NAME [OTHER]          assignment changes from OTHER (default: parent) to NAME
+               sandbox show [NAME] | list
+               sandbox commit NAME                write the sandbox's edits to the files and adopt its matches
+                                                  (a sandbox forked from an open sandbox waits for its parent)
+               sandbox drop NAME
+        """
+        parser = argparse.ArgumentParser(description='What-if sandboxes')
+        parser.add_argument('action', choices=['new', 'switch', 'slots', 'solve', 'diff', 'show', 'list',
+                                               'commit', 'drop'])
+        parser.add_argument('names', nargs='*', help='Sandbox names')
+        parser.add_argument('--from', dest='parent', type=str, default=MAIN, help='Parent sandbox for new')
+        parser.add_argument('-c', '--change', type=str, action='append', default=[],
+                            help='Slot change "Faculty Name - Project=N"')
+
+        try:
+            args = parser.parse_args(shlex.split(arg))
+            current = self.active_sandbox or MAIN
+            name = args.names[0] if args.names else current
+
+            if args.action == 'list':
+                if not self.sandboxes:
+                    print("No sandboxes. Create one with 'sandbox new NAME'.")
+                for sandbox in self.sandboxes.values():
+                    marker = '*' if sandbox.name == self.active_sandbox else ' '
+                    state = f"{len(sandbox.matches)} matches" if sandbox.matches is not None else "not solved"
+                    print(f"{marker} {sandbox.name} (from {sandbox.parent}): {len(sandbox.describe())} edits, {state}")
+                return
+
+            if args.action == 'new':
+                if not args.names or args.names[0] == MAIN or args.names[0] in self.sandboxes:
+                    print("Give a new, unused sandbox name.")
+                    return
+                if args.parent == MAIN:
+                    self.sandboxes[name] = Sandbox(name)
+                elif args.parent in self.sandboxes:
+                    self.sandboxes[name] = self.sandboxes[args.parent].fork(name)
+                else:
+                    print(f"Unknown sandbox '{args.parent}'.")
+                    return
+                self.active_sandbox = name
+                print(f"Created sandbox '{name}' from {args.parent}; edits now go to '{name}'.")
+                return
+
+            if args.action == 'switch':
+                if name != MAIN and name not in self.sandboxes:
+                    print(f"Unknown sandbox '{name}'.")
+                    return
+                self.active_sandbox = None if name == MAIN else name
+                print(f"Switched to {name}.")
+                return
+
+            if name == MAIN or name not in self.sandboxes:
+                print(f"Unknown sandbox '{name}'. Use 'sandbox list'.")
+                return
+            sandbox = self.sandboxes[name]
+
+            if args.action == 'show':
+                print(f"Sandbox '{name}' (from {sandbox.parent}):")
+                for line in sandbox.describe() or ["no edits"]:
+                    print(f"  {line}")
+
+            elif args.action == 'slots':
+                if not args.change:
+                    print("Give at least one -c \"Faculty Name - Project=N\".")
+                    return
+                for faculty_project, delta in [parse_slot_change(change, allow_negative=True) for change in args.change]:
+                    sandbox.change_slots(faculty_project, delta)
+                    print(f"[{name}] slots: {faculty_project} {delta:+d}")
+
+            elif args.action == 'solve':
+                if self.solve_running():
+                    print("A solve is already running. Use 'status', 'wait' or 'cancel'.")
+                    return
+                start = time.perf_counter()
+                matches = self.solve_sandbox(sandbox)
+                print(f"[{name}] {len(matches)} matches in {time.perf_counter() - start:.2f}s. "
+                      f"Use 'sandbox diff {name}' to compare with {sandbox.parent}.")
+
+            elif args.action == 'diff':
+                other = args.names[1] if len(args.names) > 1 else sandbox.parent
+                for sandbox_name in [other, name]:
+                    if sandbox_name != MAIN and sandbox_name not in self.sandboxes:
+                        print(f"Unknown sandbox '{sandbox_name}'.")
+                        return
+                    if sandbox_name != MAIN and self.sandboxes[sandbox_name].matches is None:
+                        if self.solve_running():
+                            print(f"Sandbox '{sandbox_name}' is not solved and a solve is running.")
+                            return
+                        self.solve_sandbox(self.sandboxes[sandbox_name])
+                before = self.combined_matches if other == MAIN else self.sandboxes[other].matches
+                if before is None:
+                    print("No matches calculated yet for main. Run 'run_matching' first.")
+                    return
+                changes = diff_matches(before, sandbox.matches)
+                if changes.empty:
+                    print(f"No assignment changes from {other} to {name}.")
+                    return
+                print(f"\nAssignment changes from {other} to {name} ({len(changes)} students):")
+                print(changes.to_string(index=False))
+
+            elif args.action == 'commit':
+                if sandbox.parent in self.sandboxes:
+                    # The child holds a copy of the parent's edits; committing it alone would
+                    # leave the parent counting them a second time on top of the session
+                    print(f"Sandbox '{name}' was forked from '{sandbox.parent}', which is still open. "
+                          f"Commit or drop '{sandbox.parent}' first.")
+                    return
+                self.commit_sandbox(sandbox)
+                # Sandboxes built on the committed one keep only their own edits
+                for other in self.sandboxes.values():
+                    if name in self.sandbox_ancestors(other.name):
+                        other.rebase(sandbox)
+                del self.sandboxes[name]
+                if self.active_sandbox == name:
+                    self.active_sandbox = None
+                print(f"Committed sandbox '{name}' to the files" +
+                      (" and adopted its matches." if sandbox.matches is not None else
+                       "; run 'run_matching' to update the matches."))
+
+            elif args.action == 'drop':
+                for other in self.sandboxes.values():
+                    if other.parent == name:
+                        other.parent = sandbox.parent
+                del self.sandboxes[name]
+                if self.active_sandbox == name:
+                    self.active_sandbox = None
+                print(f"Dropped sandbox '{name}'.")
+
+        except argparse.ArgumentError as e:
+            print(f"Error parsing arguments: {str(e)}")
+        except SystemExit:
+            # Catch the system exit called by argparse when help is requested
+            pass
+        except Exception as e:
+            print(f"An error occurred: {str(e)}")
+
+    def do_source(self, arg):
+        """Run a file of shell commands in batch mode.
+        Lock, exclusion and change_* edits are kept in memory and written to the files once, when
+        the script ends. The matching is solved with the ILP at each 'run' line (run_matching also
+        counts; options other than --wait are refused) and once more at the end if there were edits
+        after the last checkpoint. If the script stops, the matches from before it are restored.
+        Usage: source FILE [--no-solve]
+        """
+        self.run_script(arg)
+
+    def run_script(self, arg):
+        """
+        Run a command script (the work of 'source').
+
+        Kept apart from do_source because a true return value from a do_* method
+        ends the interactive shell.
+
+        Parameters:
+        arg (str): Arguments of 'source'
+
+        Returns:
+        bool: True if the script ran to the end and its edits were written
+        """
+        parser = argparse.ArgumentParser(description='Run a command script')
+        parser.add_argument('file', type=str, help='File with one shell command per line (# starts a comment)')
+        parser.add_argument('--no-solve', action='store_true', help='Do not solve at the end of the script')
+        try:
+            args = parser.parse_args(shlex.split(arg))
+        except SystemExit:
+            # Catch the system exit called by argparse on invalid input or help
+            return False
+
+        if self.script_sandbox is not None:
+            print("Scripts cannot source other scripts.")
+            return False
+        if self.active_sandbox is not None:
+            print("Switch to main ('sandbox switch main') before running a script.")
+            return False
+        if self.solve_running():
+            print("A solve is already running. Use 'wait' or 'cancel' first.")
+            return False
+        try:
+            with open(args.file, 'r', encoding='utf-8') as script_file:
+                lines = [line.strip() for line in script_file]
+        except OSError as e:
+            print(f"Error reading script: {e}")
+            return False
+
+        # The script's edits are an unnamed overlay, committed like a sandbox
+        self.script_sandbox = Sandbox('script')
+        checkpoints = 0
+        matches_before = self.combined_matches
+        try:
+            for line in lines:
+                if not line or line.startswith('#'):
+                    continue
+                print(f"> {line}")
+                command, command_arg, _ = self.parseline(line)
+                if command in ('run', 'run_matching'):
+                    if any(option != '--wait' for option in shlex.split(command_arg or '')):
+                        raise ValueError(f"'{line}': checkpoints always solve with the ILP; "
+                                         "run_matching options other than --wait are not supported in scripts.")
+                    checkpoints += 1
+                    self.script_checkpoint(checkpoints)
+                elif command in ('exit', 'source', 'run_rematching', 'sandbox', 'wait', 'cancel'):
+                    print(f"'{command}' is not available in scripts; skipped.")
+                else:
+                    self.onecmd(line)
+            edits = self.script_sandbox.describe()
+            if self.script_sandbox.matches is None and (edits or checkpoints == 0) and not args.no_solve:
+                checkpoints += 1
+                self.script_checkpoint(checkpoints)
+            self.commit_sandbox(self.script_sandbox)
+            print(f"Script finished: {len(edits)} edit(s) written, {checkpoints} solve(s).")
+            return True
+        except Exception as e:
+            print(f"Script stopped: {str(e)}")
+            if checkpoints and self.combined_matches is not matches_before:
+                # The script's edits were dropped, so its solutions no longer apply
+                if matches_before is None:
+                    self.combined_matches = None
+                    self.match_lookup = None
+                else:
+                    self.set_matches(matches_before)
+                self.needs_rerun = True
+                print("Restored the matches from before the script; re-run 'run_matching' to update them.")
+            return False
+        finally:
+            self.script_sandbox = None
+
+    def script_checkpoint(self, number):
+        """Solve the session plus the script's pending edits and show the result."""
+        # Fail before solving rather than adopt matches whose edits cannot be written
+        self.check_committable(self.script_sandbox)
+        matches = self.solve_sandbox(self.script_sandbox)
+        self.set_matches(matches)
+        self.needs_rerun = False
+        print(f"[run {number}] {len(matches)} matches, objective {matching_objective(matches):.4f}")
+
+    def do_save_session(self, arg):
+        """Save the session (inputs, preprocessed stages, matches, sort state) for a fast resume.
+        Usage: save_session FILE
+        """
+        if not arg:
+            print("Usage: save_session FILE")
+            return
+        if self.solve_running():
+            print("A solve is running. Use 'wait' or 'cancel' before saving the session.")
+            return
+        try:
+            save_session(self.session_state(), arg)
+            print(f"Session saved to {arg}.")
+        except Exception as e:
+            print(f"Failed to save session: {e}")
+
+    def do_load_session(self, arg):
+        """Restore a session saved with save_session.
+        Refuses snapshots whose input files have changed since, unless --force is given.
+        Snapshots are pickles, which can run code when loaded: only load trusted files.
+        Usage: load_session FILE [--force]
+        """
+        parser = argparse.ArgumentParser(description='Restore a saved session')
+        parser.add_argument('file', type=str, help='Snapshot written by save_session')
+        parser.add_argument('--force', action='store_true', help='Restore even if the input files changed')
+        try:
+            args = parser.parse_args(shlex.split(arg))
+        except SystemExit:
+            # Catch the system exit called by argparse on invalid input or help
+            return
+
+        if self.solve_running():
+            print("A solve is running. Use 'wait' or 'cancel' before loading a session.")
+            return
+        if not self.resume_session(args.file, args.force):
+            return
+        # Derived state of the previous session no longer applies
+        self.round_pipeline = None
+        self.sandboxes = {}
+        self.active_sandbox = None
+        self.sandbox_tables = {}
 
     def do_change_faculty_weight(self, arg):
         """Adjust faculty/student preference weighting
@@ -183,29 +1270,195 @@ class MatchingShell(cmd.Cmd):
         print(f"Run 'run_matching' to re-run the algorithm with new penalties.")
 
     def do_show_matches(self, arg):
-        """Display current matches.
-        Usage: show_matches [--top N]
+        """Display current matches one page at a time.
+        Usage: show_matches [--top N] [--page P] [--page-size N] [--all] [--columns col1,col2]
+                            [--faculty NAME] [--student NAME] [--max-student-rank N] [--max-faculty-rank N]
         """
-        if self.combined_matches is None or self.combined_matches.empty:
+        showing_preview = self.preview_matches is not None and self.solve_running()
+        if not showing_preview and (self.combined_matches is None or self.combined_matches.empty):
             print("No matches calculated yet.")
             return
-        
-        # Sort
-        self.combined_matches.sort_values(self.sort, ascending=False, inplace=True)
-        print(f"Sorted by {self.sort}")
-        # Parse optional args
-        top_n = None
-        if '--top' in arg:
-            try:
-                top_n = int(arg.split()[1])
-                print(f"\nTop {top_n} matches:")
-                print(self.combined_matches.head(top_n).to_string(index=False))
-            except:
-                print("Invalid format. Usage: show_matches [--top N]")
+
+        # Create parser for the command arguments
+        parser = argparse.ArgumentParser(description='Display current matches')
+        parser.add_argument('--top', type=int, help='Only show the first N matches')
+        parser.add_argument('--page', type=int, default=1, help='Page number to show')
+        parser.add_argument('--page-size', type=int, default=50, help='Number of matches per page')
+        parser.add_argument('--all', action='store_true', help='Show every match')
+        parser.add_argument('--columns', type=str, help='Comma separated list of columns to show')
+        parser.add_argument('--faculty', type=str, help='Only faculty names or projects containing this text')
+        parser.add_argument('--student', type=str, help='Only student names containing this text')
+        parser.add_argument('--max-student-rank', type=int, help='Only matches the student ranked 1 to N')
+        parser.add_argument('--max-faculty-rank', type=int, help='Only matches the faculty ranked 1 to N')
+
+        try:
+            args = parser.parse_args(shlex.split(arg))
+        except SystemExit:
+            # Catch the system exit called by argparse on invalid input or help
+            print("Invalid format. Use 'help show_matches' for usage.")
+            return
+
+        if showing_preview:
+            print("PREVIEW: greedy approximation; the exact solve is still running.")
+            matches = self.preview_matches
+            positions = matches[self.sort].sort_values(ascending=False, kind='mergesort').index.to_numpy()
         else:
+            matches = self.combined_matches
+            # Filter on the cached ordering instead of re-sorting the matches
+            positions = self.sorted_positions(self.sort)
+        columns = list(matches.columns)
+        if args.columns:
+            columns = [column.strip() for column in args.columns.split(',') if column.strip()]
+            unknown = [column for column in columns if column not in matches.columns]
+            if unknown:
+                print(f"Unknown columns: {', '.join(unknown)}")
+                return
+
+        mask = pd.Series(True, index=matches.index)
+        if args.faculty:
+            mask &= (matches['faculty_name'].astype(str).str.contains(args.faculty, case=False, regex=False) |
+                     matches['faculty_project'].astype(str).str.contains(args.faculty, case=False, regex=False))
+        if args.student:
+            mask &= matches['student_name'].astype(str).str.contains(args.student, case=False, regex=False)
+        if args.max_student_rank is not None:
+            mask &= matches['student_rank'].between(1, args.max_student_rank)
+        if args.max_faculty_rank is not None:
+            mask &= matches['faculty_rank'].between(1, args.max_faculty_rank)
+        positions = positions[mask.to_numpy()[positions]]
+
+        print(f"Sorted by {self.sort}")
+        if args.top is not None:
+            print(f"\nTop {args.top} matches:")
+            positions = positions[:max(args.top, 0)]
+        elif args.all:
             print("\nCurrent matches:")
-            print(self.combined_matches.to_string(index=False))
+        else:
+            page_size = max(args.page_size, 1)
+            page_count = max((len(positions) + page_size - 1) // page_size, 1)
+            page = min(max(args.page, 1), page_count)
+            print(f"\nCurrent matches (page {page} of {page_count}, {len(positions)} matches):")
+            positions = positions[(page - 1) * page_size:page * page_size]
+
+        if len(positions) == 0:
+            print("No matches found for the given filters.")
+            return
+        self.stream_table(matches, positions, columns)
+
+    def stream_table(self, frame, positions, columns):
+        """
+        Write the selected rows of frame as an aligned table, one block of rows at a time.
+
+        Column widths come from the header and the first block; a wider value in a
+        later block widens its column from there on, so no more than
+        STREAM_BLOCK_ROWS rows are ever formatted ahead of the output.
+        """
+        def format_value(value):
+            if isinstance(value, float):
+                return f"{value:.4f}"
+            return str(value)
+
+        widths = None
+        for start in range(0, len(positions), STREAM_BLOCK_ROWS):
+            block = frame.take(positions[start:start + STREAM_BLOCK_ROWS])[columns]
+            rows = block.itertuples(index=False, name=None)
+            cells = [[format_value(value) for value in row] for row in rows]
+            if widths is None:
+                widths = [max([len(column)] + [len(row[i]) for row in cells]) for i, column in enumerate(columns)]
+                self.stdout.write(" ".join(column.rjust(width) for column, width in zip(columns, widths)) + "\n")
+            for row in cells:
+                widths = [max(width, len(value)) for value, width in zip(row, widths)]
+                self.stdout.write(" ".join(value.rjust(width) for value, width in zip(row, widths)) + "\n")
+        if widths is None:
+            self.stdout.write(" ".join(columns) + "\n")
+
+    def resolve_lookup_name(self, value, resolve, kind):
+        """Resolve a typed name with a MatchLookup resolver, printing why if it fails."""
+        name, status, candidates = resolve(value)
+        if status == 'ambiguous':
+            print(f"Ambiguous {kind} '{value}': {', '.join(candidates)}")
+        elif name is None:
+            print(f"No {kind} named '{value}'.")
+        elif status != 'exact':
+            print(f"('{value}' resolved to '{name}')")
+        return name
+
+    def lookup_argument(self, arg, usage, top=False):
+        """Parse the NAME [--top N] argument of whois, roster and candidates."""
+        parser = argparse.ArgumentParser(description=usage)
+        parser.add_argument('name', nargs='+', help='Name (quotes are optional)')
+        if top:
+            parser.add_argument('--top', type=int, default=10, help='Number of candidate pairs to show')
+        try:
+            args = parser.parse_args(shlex.split(arg))
+        except (SystemExit, ValueError):
+            print(f"Usage: {usage}")
+            return None
+        if self.lookup() is None:
+            print("No matches calculated yet.")
+            return None
+        args.name = ' '.join(args.name)
+        return args
+
+    def do_whois(self, arg):
+        """Show where a student was matched, or their best unfilled alternatives if unmatched.
+        Usage: whois STUDENT
+        """
+        args = self.lookup_argument(arg, "whois STUDENT")
+        if args is None:
+            return
+        lookup = self.lookup()
+        student = self.resolve_lookup_name(args.name, lookup.resolve_student, 'student')
+        if student is None:
+            return
+        match = lookup.match_of(student)
+        if match is not None:
+            print(f"{student} is matched to {match['faculty_project']}: probability "
+                  f"{match['probability_of_match']:.4f}, student rank {match['student_rank']}, "
+                  f"faculty rank {match['faculty_rank']}.")
+            return
+        print(f"{student} is unmatched.")
+        alternatives = lookup.alternatives(student)
+        if alternatives.empty:
+            print("No candidate project has a slot left.")
+            return
+        print("Best alternatives with open slots:")
+        self.stream_table(alternatives, np.arange(len(alternatives)), list(alternatives.columns[:-1]))
 
+    def do_roster(self, arg):
+        """Show the students matched to a faculty member's projects, or to one project.
+        Usage: roster FACULTY|PROJECT
+        """
+        args = self.lookup_argument(arg, "roster FACULTY|PROJECT")
+        if args is None:
+            return
+        lookup = self.lookup()
+        name = self.resolve_lookup_name(args.name, lookup.resolve_group, 'faculty or project')
+        if name is None:
+            return
+        for project, open_slots, matches in lookup.roster(name):
+            slots = "" if open_slots is None else f", {open_slots} slot(s) open"
+            print(f"\n{project} ({len(matches)} matched{slots}):")
+            if not matches.empty:
+                self.stream_table(matches, np.arange(len(matches)),
+                                  ['student_name', 'probability_of_match', 'student_rank', 'faculty_rank'])
+
+    def do_candidates(self, arg):
+        """Show a student's candidate projects, best probability first, with their status
+        (matched, open, full or excluded).
+        Usage: candidates STUDENT [--top N]
+        """
+        args = self.lookup_argument(arg, "candidates STUDENT [--top N]", top=True)
+        if args is None:
+            return
+        lookup = self.lookup()
+        student = self.resolve_lookup_name(args.name, lookup.resolve_student, 'student')
+        if student is None:
+            return
+        pairs = lookup.candidate_pairs(student).head(max(args.top, 0))
+        if pairs.empty:
+            print(f"No candidate pairs for {student} (run 'run_matching' to build the pair table).")
+            return
+        self.stream_table(pairs, np.arange(len(pairs)), list(pairs.columns))
 
     def do_change_sort(self, arg):
         """
@@ -251,6 +1504,71 @@ class MatchingShell(cmd.Cmd):
         print(f"Student no rank penalty: {get_config_value('student_no_rank_penalty')}")
         print(f"Faculty no rank penalty: {get_config_value('faculty_no_rank_penalty')}")
         print(f"Similarity weight: {get_config_value('similarity_weight')}")
+        stats = self.solution_cache.stats()
+        print(f"Solution cache: {stats['hits']} hits, {stats['misses']} misses, "
+              f"{stats['entries']}/{stats['max_entries']} entries"
+              + (f" (saved in {stats['directory']})" if stats['directory'] else ""))
+
+    def do_metrics(self, arg):
+        """Show the last run's metrics or choose where metrics records are written.
+        Usage: metrics [--jsonl PATH] [--prometheus PATH] [--off]
+        """
+        parser = argparse.ArgumentParser(description='Structured run metrics')
+        parser.add_argument('--jsonl', type=str, help='Append one JSON record per solve to this file')
+        parser.add_argument('--prometheus', type=str, help='Node-exporter textfile rewritten after each solve')
+        parser.add_argument('--off', action='store_true', help='Stop writing metrics')
+        try:
+            args = parser.parse_args(shlex.split(arg))
+        except SystemExit:
+            # Catch the system exit called by argparse on invalid input or help
+            return
+
+        if args.off:
+            self.metrics_jsonl = self.metrics_prometheus = None
+            print("Metrics output turned off.")
+        if args.jsonl:
+            self.metrics_jsonl = args.jsonl
+            print(f"Metrics records are appended to {args.jsonl}.")
+        if args.prometheus:
+            self.metrics_prometheus = args.prometheus
+            print(f"Prometheus metrics are written to {args.prometheus}.")
+        if not (args.off or args.jsonl or args.prometheus):
+            if self.last_metrics is None:
+                print("No solve has finished yet.")
+                return
+            for field, value in self.last_metrics.items():
+                print(f"{field}: {value}")
+
+    def do_cache(self, arg):
+        """Show or manage the solution cache.
+        Usage: cache [stats | clear | size N | dir PATH | nodir]
+        """
+        parts = shlex.split(arg)
+        action = parts[0] if parts else 'stats'
+        try:
+            if action == 'stats':
+                stats = self.solution_cache.stats()
+                for name, value in stats.items():
+                    print(f"{name}: {value}")
+            elif action == 'clear':
+                self.solution_cache.clear()
+                print("Solution cache cleared.")
+            elif action == 'size' and len(parts) == 2:
+                size = int(parts[1])
+                if size < 1:
+                    raise ValueError("Size must be at least 1.")
+                self.solution_cache.resize(size)
+                print(f"Solution cache holds up to {size} results.")
+            elif action == 'dir' and len(parts) == 2:
+                self.solution_cache.set_directory(parts[1])
+                print(f"Solution cache results are saved in {parts[1]}.")
+            elif action == 'nodir':
+                self.solution_cache.set_directory(None)
+                print("Solution cache results are kept in memory only.")
+            else:
+                print("Usage: cache [stats | clear | size N | dir PATH | nodir]")
+        except Exception as e:
+            print(f"An error occurred: {str(e)}")
 
     def do_change_similarity_weight(self, arg):
         """Adjust similarity weight
@@ -272,6 +1590,19 @@ class MatchingShell(cmd.Cmd):
         print(f"Run 'run_matching' to re-run the algorithm with new weights.")
 
 
+    def do_name_report(self, arg):
+        """List rank entries that did not exactly match a project title or student name.
+        Usage: name_report
+        """
+        report = name_resolution_report(self.df_student, self.df_faculty)
+        if report.empty:
+            print("All rank entries match a project title or student name exactly.")
+            return
+        print("\nRank entries that did not match exactly:")
+        print(report.to_string(index=False))
+        print(f"\n{(report['status'].isin(['unresolved', 'ambiguous'])).sum()} unresolved or ambiguous "
+              "entries are treated as unranked.")
+
     def do_show_locks_exclusions(self, arg):
         """Display current locking file.
         Usage: show_locks_exclusions
@@ -500,7 +1831,84 @@ class MatchingShell(cmd.Cmd):
             pass
         except Exception as e:
             print(f"An error occurred: {str(e)}")
-    
+
+
+    def do_capacity_sweep(self, arg):
+        """Rank combinations of extra project slots by matching quality.
+        Usage: capacity_sweep -c "Faculty Name - Project=N" [-c ...] --budget N [--workers N] [--top N] [--rematch] [--max-scenarios N]
+        """
+        if not arg:
+            print("Usage: capacity_sweep -c \"Faculty Name - Project=N\" [-c ...] --budget N [--workers N] [--top N] [--rematch] [--max-scenarios N]")
+            return
+
+        # Create parser for the command arguments
+        parser = argparse.ArgumentParser(description='Evaluate extra slot scenarios')
+        parser.add_argument('-c', '--change', type=str, action='append', required=True,
+                            help='Candidate slot change "Faculty Name - Project=N"')
+        parser.add_argument('--budget', type=int, required=True, help='Maximum extra slots per scenario')
+        parser.add_argument('--workers', type=int, help='Number of worker processes')
+        parser.add_argument('--top', type=int, help='Only show the best N scenarios')
+        parser.add_argument('--rematch', action='store_true', help='Include similarity to the current matches')
+        parser.add_argument('--max-scenarios', type=int, default=DEFAULT_MAX_SCENARIOS,
+                            help=f'Refuse sweeps with more scenarios than this (default {DEFAULT_MAX_SCENARIOS})')
+
+        try:
+            # Split the argument string while preserving quoted strings
+            args = parser.parse_args(shlex.split(arg))
+            slot_changes = [parse_slot_change(change) for change in args.change]
+
+            df_locking = self.df_locking if self.locking_file is not None else None
+            input_data, faculty_slots, locks, exclusions = self.preprocess(self.df_student, self.df_faculty, df_locking)
+            previous = self.combined_matches if args.rematch else None
+
+            print("\nRunning capacity sweep...")
+            results = capacity_sweep(input_data, faculty_slots, slot_changes, args.budget,
+                                     locks, exclusions, previous, args.workers, args.max_scenarios)
+            if args.top:
+                results = results.head(args.top)
+            print(results.to_string(index=False))
+
+        except argparse.ArgumentError as e:
+            print(f"Error parsing arguments: {str(e)}")
+        except SystemExit:
+            # Catch the system exit called by argparse when help is requested
+            pass
+        except Exception as e:
+            print(f"An error occurred: {str(e)}")
+
+    def do_export(self, arg):
+        """Export current matches in several formats in one pass.
+        Usage: export -d DIRECTORY [-f csv,jsonl,parquet] [--by-faculty] [--compress gzip] [--name matches]
+        """
+        if not arg:
+            print("Usage: export -d DIRECTORY [-f csv,jsonl,parquet] [--by-faculty] [--compress gzip] [--name matches]")
+            return
+        if self.combined_matches is None:
+            print("No matches calculated yet.")
+            return
+
+        # Create parser for the command arguments
+        parser = argparse.ArgumentParser(description='Export current matches')
+        parser.add_argument('-d', '--directory', type=str, required=True, help='Output directory')
+        parser.add_argument('-f', '--formats', type=str, default='csv', help='Comma separated formats')
+        parser.add_argument('--by-faculty', action='store_true', help='Also write one file per faculty member')
+        parser.add_argument('--compress', choices=['gzip'], help='Compress the output files')
+        parser.add_argument('--name', type=str, default='matches', help='Base name of the combined files')
+
+        try:
+            # Split the argument string while preserving quoted strings
+            args = parser.parse_args(shlex.split(arg))
+            formats = [file_format.strip() for file_format in args.formats.split(',') if file_format.strip()]
+            paths = export_matches(self.combined_matches, args.directory, formats, args.by_faculty,
+                                   args.compress, args.name)
+            print(f"Exported {len(self.combined_matches)} matches to {len(paths)} files in {args.directory}.")
+        except argparse.ArgumentError as e:
+            print(f"Error parsing arguments: {str(e)}")
+        except SystemExit:
+            # Catch the system exit called by argparse when help is requested
+            pass
+        except Exception as e:
+            print(f"Failed to export: {e}")
 
     def do_return_csv(self, arg):
         """Export current matches to CSV.
@@ -518,6 +1926,10 @@ class MatchingShell(cmd.Cmd):
 
     def do_exit(self, arg):
         """Exit the shell."""
+        if self.solve_running():
+            # Stop the solver process so it does not outlive the shell
+            self.solve_job.cancel()
+            self.solve_job.wait()
         print("Exiting...")
         return True
                 
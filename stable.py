@@ -0,0 +1,234 @@
+"""Deferred-acceptance (stable) matching and engine comparison reports."""
+
+import heapq
+from collections import deque
+
+import numpy as np
+import pandas as pd
+
+from utils import MATCH_COLUMNS, matching_objective
+
+# Sort key used for an unranked (but acceptable) partner: after every ranked one
+UNRANKED = float('inf')
+
+# -------------------------- START PREFERENCE FUNCTIONS -------------------------
+
+def build_preference_lists(input_data: pd.DataFrame, exclusions: list = None):
+    """
+    Derive strict preference lists for both sides from the pair table.
+
+    A pair is acceptable when at least one side ranked the other (positive
+    probability) and it is not excluded. Each side orders its acceptable
+    partners by its own rank, then unranked partners by probability, with
+    names breaking ties.
+
+    Parameters:
+    input_data (pd.DataFrame): Pair table from process_preferences (after mandatory matches)
+    exclusions (list): Optional list of excluded (project, student) tuples
+
+    Returns:
+    tuple: (student_prefs, project_prefs, rows)
+        - student_prefs: Dictionary mapping students to projects, most preferred first
+        - project_prefs: Dictionary mapping projects to {student: position} (lower is better)
+        - rows: Dictionary mapping (project, student) to its row position in input_data
+    """
+    acceptable = input_data['probability_of_match'].to_numpy() > 0
+    if exclusions:
+        pair_index = pd.MultiIndex.from_arrays([input_data['faculty_project'], input_data['student_name']])
+        acceptable &= ~pair_index.isin(list(exclusions))
+    candidates = input_data.iloc[np.flatnonzero(acceptable)].copy()
+    candidates['row'] = np.flatnonzero(acceptable)
+    candidates['student_key'] = candidates['student_rank'].where(candidates['student_rank'] > 0, UNRANKED)
+    candidates['faculty_key'] = candidates['faculty_rank'].where(candidates['faculty_rank'] > 0, UNRANKED)
+    candidates['negative_probability'] = -candidates['probability_of_match']
+
+    student_prefs = {}
+    by_student = candidates.sort_values(['student_name', 'student_key', 'negative_probability', 'faculty_project'],
+                                        kind='mergesort')
+    for student, projects in zip(by_student['student_name'], by_student['faculty_project']):
+        student_prefs.setdefault(student, []).append(projects)
+
+    project_prefs = {}
+    by_project = candidates.sort_values(['faculty_project', 'faculty_key', 'negative_probability', 'student_name'],
+                                        kind='mergesort')
+    for project, student in zip(by_project['faculty_project'], by_project['student_name']):
+        ranking = project_prefs.setdefault(project, {})
+        ranking[student] = len(ranking)
+
+    rows = dict(zip(zip(candidates['faculty_project'], candidates['student_name']), candidates['row']))
+    return student_prefs, project_prefs, rows
+
+# -------------------------- END PREFERENCE FUNCTIONS -------------------------
+
+# -------------------------- START DEFERRED ACCEPTANCE FUNCTIONS -------------------------
+
+def _student_proposing(student_prefs, project_prefs, faculty_slots):
+    """Student-proposing deferred acceptance; returns {student: project}."""
+    next_choice = {student: 0 for student in student_prefs}
+    # Each project holds a max-heap (by negated position) of its tentative students
+    held = {project: [] for project in project_prefs}
+    free = deque(student_prefs)
+
+    while free:
+        student = free.popleft()
+        choices = student_prefs[student]
+        while next_choice[student] < len(choices):
+            project = choices[next_choice[student]]
+            next_choice[student] += 1
+            capacity = faculty_slots.get(project, 0)
+            if capacity <= 0:
+                continue
+            heapq.heappush(held[project], (-project_prefs[project][student], student))
+            if len(held[project]) > capacity:
+                _, rejected = heapq.heappop(held[project])
+                if rejected != student:
+                    free.append(rejected)
+                    break
+                continue
+            break
+
+    return {student: project for project, students in held.items() for _, student in students}
+
+
+def _faculty_proposing(student_prefs, project_prefs, faculty_slots):
+    """Project-proposing deferred acceptance; returns {student: project}."""
+    student_rank = {student: {project: i for i, project in enumerate(projects)}
+                    for student, projects in student_prefs.items()}
+    project_lists = {project: sorted(ranking, key=ranking.get) for project, ranking in project_prefs.items()}
+    next_choice = {project: 0 for project in project_lists}
+    filled = {project: 0 for project in project_lists}
+    assignment = {}
+    queue = deque(project_lists)
+
+    while queue:
+        project = queue.popleft()
+        capacity = faculty_slots.get(project, 0)
+        students = project_lists[project]
+        while filled[project] < capacity and next_choice[project] < len(students):
+            student = students[next_choice[project]]
+            next_choice[project] += 1
+            current = assignment.get(student)
+            if current is None or student_rank[student][project] < student_rank[student][current]:
+                assignment[student] = project
+                filled[project] += 1
+                if current is not None:
+                    filled[current] -= 1
+                    queue.append(current)
+
+    return assignment
+
+
+def stable_matching(input_data: pd.DataFrame, faculty_slots: dict, exclusions: list = None,
+                    proposing: str = 'student'):
+    """
+    Computes a stable many-to-one matching with deferred acceptance.
+
+    Runs in time proportional to the total length of the preference lists.
+    Locks are respected by running assign_mandatory_matches first, as for the ILP.
+
+    Parameters:
+        input_data (pd.DataFrame): Pair table from process_preferences (after mandatory matches)
+        faculty_slots (dict): Dictionary mapping faculty projects to number of open slots
+        exclusions (list): Optional list of excluded (project, student) tuples
+        proposing (str): 'student' for the student-optimal or 'faculty' for the
+            faculty-optimal stable matching
+
+    Returns:
+        pd.DataFrame: The stable matches, with the same columns as perform_ilp_matching
+    """
+    if proposing not in ('student', 'faculty'):
+        raise ValueError("proposing must be 'student' or 'faculty'.")
+    student_prefs, project_prefs, rows = build_preference_lists(input_data, exclusions)
+    if proposing == 'student':
+        assignment = _student_proposing(student_prefs, project_prefs, faculty_slots)
+    else:
+        assignment = _faculty_proposing(student_prefs, project_prefs, faculty_slots)
+
+    positions = sorted(rows[(project, student)] for student, project in assignment.items())
+    return input_data.take(positions)[MATCH_COLUMNS].reset_index(drop=True)
+
+# -------------------------- END DEFERRED ACCEPTANCE FUNCTIONS -------------------------
+
+# -------------------------- START REPORT FUNCTIONS -------------------------
+
+def count_blocking_pairs(matches: pd.DataFrame, input_data: pd.DataFrame, faculty_slots: dict,
+                         exclusions: list = None):
+    """
+    Count the acceptable pairs that would both rather be matched to each other.
+
+    Parameters:
+    matches (pd.DataFrame): Matching over the pairs of input_data
+    input_data (pd.DataFrame): Pair table the matching was computed from
+    faculty_slots (dict): Dictionary mapping faculty projects to number of open slots
+    exclusions (list): Optional list of excluded (project, student) tuples
+
+    Returns:
+    int: Number of blocking pairs
+    """
+    student_prefs, project_prefs, _ = build_preference_lists(input_data, exclusions)
+    assignment = dict(zip(matches['student_name'], matches['faculty_project'])) if not matches.empty else {}
+    # Position of each project's least preferred current student
+    worst = {}
+    filled = {}
+    for student, project in assignment.items():
+        filled[project] = filled.get(project, 0) + 1
+        position = project_prefs.get(project, {}).get(student, len(project_prefs.get(project, {})))
+        worst[project] = max(worst.get(project, -1), position)
+
+    blocking = 0
+    for student, projects in student_prefs.items():
+        current = assignment.get(student)
+        for project in projects:
+            if project == current:
+                break
+            has_room = filled.get(project, 0) < faculty_slots.get(project, 0)
+            if has_room or project_prefs[project][student] < worst.get(project, -1):
+                blocking += 1
+    return blocking
+
+
+def _rank_distribution(ranks):
+    """Format rank counts as '1:10 2:3 -1:1' (unranked last)."""
+    counts = ranks.value_counts()
+    order = sorted(counts.index, key=lambda rank: (rank <= 0, rank))
+    return ' '.join(f"{rank}:{counts[rank]}" for rank in order)
+
+
+def compare_engines(results: dict, input_data: pd.DataFrame, faculty_slots: dict,
+                    exclusions: list = None, previous: pd.DataFrame = None, baseline: str = 'ilp'):
+    """
+    Compare matchings from different engines on the same sub-problem.
+
+    Parameters:
+        results (dict): Maps engine name to (matches, runtime_seconds)
+        input_data (pd.DataFrame): Pair table the matchings were computed from
+        faculty_slots (dict): Dictionary mapping faculty projects to number of open slots
+        exclusions (list): Optional list of excluded (project, student) tuples
+        previous (pd.DataFrame): Optional previous matching used for the objective
+        baseline (str): Engine the objective gap is measured against
+
+    Returns:
+        pd.DataFrame: One row per engine with columns 'engine', 'matched', 'objective',
+            'objective_gap', 'blocking_pairs', 'student_ranks', 'faculty_ranks' and
+            'runtime_seconds'
+    """
+    rows = []
+    for engine, (matches, runtime) in results.items():
+        empty = matches is None or matches.empty
+        rows.append({
+            'engine': engine,
+            'matched': 0 if empty else len(matches),
+            'objective': matching_objective(matches, previous),
+            'blocking_pairs': count_blocking_pairs(matches if not empty else pd.DataFrame(),
+                                                   input_data, faculty_slots, exclusions),
+            'student_ranks': '' if empty else _rank_distribution(matches['student_rank']),
+            'faculty_ranks': '' if empty else _rank_distribution(matches['faculty_rank']),
+            'runtime_seconds': runtime
+        })
+    report = pd.DataFrame(rows)
+    if baseline in results:
+        baseline_objective = report.loc[report['engine'] == baseline, 'objective'].iloc[0]
+        report.insert(3, 'objective_gap', baseline_objective - report['objective'])
+    return report
+
+# -------------------------- END REPORT FUNCTIONS -------------------------
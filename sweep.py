@@ -0,0 +1,180 @@
+"""Slot-capacity what-if sweeps for funding decisions."""
+
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+from utils import (
+    assign_mandatory_matches,
+    perform_ilp_matching,
+    matching_objective
+)
+
+# Default limit on the number of scenarios one sweep may solve
+DEFAULT_MAX_SCENARIOS = 256
+
+# -------------------------- START SCENARIO FUNCTIONS -------------------------
+
+# State shared by every scenario evaluated in one worker process. It is filled
+# once per worker by the pool initializer so the pair table is only pickled
+# once per process rather than once per scenario.
+_SWEEP_STATE = {}
+
+
+def parse_slot_change(spec, allow_negative=False):
+    """
+    Parse a slot change given as "Faculty Name - Project=N".
+
+    Parameters:
+    spec (str): Faculty project identifier and number of extra slots
+    allow_negative (bool): Accept changes that remove slots (N < 0)
+
+    Returns:
+    tuple: (faculty_project, extra_slots)
+    """
+    if '=' not in spec:
+        raise ValueError(f"Slot change '{spec}' must look like \"Faculty Name - Project=N\".")
+    faculty_project, extra = spec.rsplit('=', 1)
+    extra_slots = int(extra)
+    if extra_slots == 0 or (extra_slots < 0 and not allow_negative):
+        raise ValueError(f"Slot change '{spec}' must {'change' if allow_negative else 'add'} at least one slot.")
+    return faculty_project.strip(), extra_slots
+
+
+def build_scenarios(slot_changes, budget, max_scenarios=DEFAULT_MAX_SCENARIOS):
+    """
+    Enumerate every combination of candidate slot changes within the budget.
+
+    Combinations are grown one change at a time and a branch is cut as soon as
+    no remaining change fits the budget, so only scenarios within the budget are
+    visited.
+
+    Parameters:
+    slot_changes (list): List of (faculty_project, extra_slots) candidate changes
+    budget (int): Maximum number of extra slots a scenario may add in total
+    max_scenarios (int): Raise ValueError rather than return more scenarios than this
+
+    Returns:
+    list: List of scenarios, each a tuple of (faculty_project, extra_slots) changes.
+          The empty baseline scenario is always first.
+    """
+    extras = [extra for _, extra in slot_changes]
+    # Smallest change from each position on, to cut branches that cannot grow
+    smallest = [min(extras[i:]) for i in range(len(extras))] + [float('inf')]
+    scenarios = []
+    stack = [((), 0, 0)]
+    while stack:
+        combination, total, start = stack.pop()
+        scenarios.append(combination)
+        if len(scenarios) > max_scenarios:
+            raise ValueError(f"More than {max_scenarios} scenarios fit the budget. Lower the budget, "
+                             f"give fewer changes or raise the scenario limit.")
+        if total + smallest[start] > budget:
+            continue
+        # Pushed in reverse so that combinations come out in increasing index order
+        for i in reversed(range(start, len(slot_changes))):
+            if total + extras[i] <= budget:
+                stack.append((combination + (slot_changes[i],), total + extras[i], i + 1))
+    # Smallest scenarios first (the sort is stable, so each size keeps its index order)
+    return sorted(scenarios, key=len)
+
+
+def _init_sweep_worker(input_data, faculty_slots, locks, exclusions, previous):
+    """Store the shared preprocessed inputs for this worker process."""
+    _SWEEP_STATE['input_data'] = input_data
+    _SWEEP_STATE['faculty_slots'] = faculty_slots
+    _SWEEP_STATE['locks'] = locks
+    _SWEEP_STATE['exclusions'] = exclusions
+    _SWEEP_STATE['previous'] = previous
+
+
+def _evaluate_scenario(scenario):
+    """Solve one scenario against the shared inputs and summarise the result."""
+    slots = _SWEEP_STATE['faculty_slots'].copy()
+    for faculty_project, extra_slots in scenario:
+        slots[faculty_project] = slots.get(faculty_project, 0) + extra_slots
+
+    remaining, mandatory, updated_slots = assign_mandatory_matches(
+        _SWEEP_STATE['input_data'], slots, _SWEEP_STATE['locks'])
+    ilp_matches = perform_ilp_matching(remaining, updated_slots,
+                                       _SWEEP_STATE['exclusions'], _SWEEP_STATE['previous'])
+    matches = pd.concat([mandatory, ilp_matches], ignore_index=True)
+
+    if matches.empty:
+        mean_student_rank = mean_faculty_rank = float('nan')
+    else:
+        ranked_students = matches.loc[matches['student_rank'] > 0, 'student_rank']
+        ranked_faculty = matches.loc[matches['faculty_rank'] > 0, 'faculty_rank']
+        mean_student_rank = ranked_students.mean() if not ranked_students.empty else float('nan')
+        mean_faculty_rank = ranked_faculty.mean() if not ranked_faculty.empty else float('nan')
+
+    return {
+        'changes': '; '.join(f"{project} +{extra}" for project, extra in scenario) or 'baseline',
+        'extra_slots': sum(extra for _, extra in scenario),
+        'matched': len(matches),
+        'mean_student_rank': mean_student_rank,
+        'mean_faculty_rank': mean_faculty_rank,
+        'objective': matching_objective(matches, _SWEEP_STATE['previous'])
+    }
+
+
+def capacity_sweep(input_data: pd.DataFrame, faculty_slots: dict, slot_changes: list, budget: int,
+                   locks: list = None, exclusions: list = None, previous: pd.DataFrame = None,
+                   processes: int = None, max_scenarios: int = DEFAULT_MAX_SCENARIOS):
+    """
+    Evaluate combinations of extra project slots and rank them by matching quality.
+
+    Every scenario is solved with the full pipeline (mandatory matches followed by
+    the ILP) against one shared preprocessed pair table. Scenarios are evaluated
+    in a process pool; each worker receives the shared inputs once. Only the pair
+    table and the other inputs are shared: each scenario still builds and solves
+    its own ILP model.
+
+    Parameters:
+        input_data (pd.DataFrame): Pair table from process_preferences
+        faculty_slots (dict): Dictionary mapping faculty projects to number of open slots
+        slot_changes (list): Candidate (faculty_project, extra_slots) changes
+        budget (int): Maximum number of extra slots a scenario may add in total
+        locks (list): Optional list of locked (project, student) tuples
+        exclusions (list): Optional list of excluded (project, student) tuples
+        previous (pd.DataFrame): Optional previous matching for the similarity term
+        processes (int): Number of worker processes (defaults to the CPU count);
+            1 evaluates the scenarios in the current process
+        max_scenarios (int): Refuse sweeps with more scenarios than this (ValueError),
+            since the number of combinations grows exponentially with the budget
+
+    Returns:
+        pd.DataFrame: One row per scenario, best first, with columns:
+            - 'changes': Description of the slot changes in the scenario
+            - 'extra_slots': Total number of slots added
+            - 'matched': Number of matched students
+            - 'mean_student_rank': Mean rank students gave their match (ranked matches only)
+            - 'mean_faculty_rank': Mean rank faculty gave their match (ranked matches only)
+            - 'objective': Objective value of the combined matching
+    """
+    unknown = [project for project, _ in slot_changes if project not in faculty_slots]
+    if unknown:
+        raise ValueError(f"Unknown faculty projects: {', '.join(unknown)}")
+
+    scenarios = build_scenarios(slot_changes, budget, max_scenarios)
+    shared = (input_data, faculty_slots, locks, exclusions, previous)
+
+    if processes is None:
+        processes = os.cpu_count() or 1
+    processes = max(1, min(processes, len(scenarios)))
+
+    if processes == 1:
+        _init_sweep_worker(*shared)
+        results = [_evaluate_scenario(scenario) for scenario in scenarios]
+    else:
+        with ProcessPoolExecutor(max_workers=processes, initializer=_init_sweep_worker,
+                                 initargs=shared) as pool:
+            results = list(pool.map(_evaluate_scenario, scenarios))
+
+    ranked = pd.DataFrame(results).sort_values(
+        ['objective', 'matched', 'extra_slots'], ascending=[False, False, True], kind='mergesort')
+    ranked.insert(0, 'rank', range(1, len(ranked) + 1))
+    return ranked.reset_index(drop=True)
+
+# -------------------------- END SCENARIO FUNCTIONS -------------------------
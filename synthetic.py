@@ -0,0 +1,122 @@
+"""Synthetic cohorts for benchmarking the matching pipeline."""
+
+import argparse
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+# -------------------------- START GENERATOR FUNCTIONS -------------------------
+
+def make_cohort(n_students, n_faculty, projects_per_faculty=2, slots_per_project=2, seed=0):
+    """
+    Generate student and faculty response DataFrames in the input CSV format.
+
+    Parameters:
+    n_students (int): Number of students
+    n_faculty (int): Number of faculty members
+    projects_per_faculty (int): Projects offered by each faculty member
+    slots_per_project (int): Open slots per project
+    seed (int): Random seed
+
+    Returns:
+    tuple: (student_df, faculty_df)
+    """
+    rng = np.random.default_rng(seed)
+    students = [f"Student {i}" for i in range(n_students)]
+    projects = [f"Project {f}-{p}" for f in range(n_faculty) for p in range(projects_per_faculty)]
+
+    student_rows = []
+    for student in students:
+        choices = rng.choice(len(projects), size=min(6, len(projects)), replace=False)
+        row = {'Full Name': student}
+        for rank, choice in enumerate(choices, 1):
+            row[f'Rank {rank}'] = projects[choice]
+        student_rows.append(row)
+
+    faculty_rows = []
+    for f in range(n_faculty):
+        row = {'Full Name': f"Professor {f}"}
+        for p in range(projects_per_faculty):
+            suffix = '' if p == 0 else f'.{p}'
+            row[f'Project #{p + 1}'] = projects[f * projects_per_faculty + p]
+            row[f'Number of Open Slots{suffix}'] = slots_per_project
+            ranked = rng.choice(n_students, size=min(5, n_students), replace=False)
+            for rank, choice in enumerate(ranked, 1):
+                row[f'Student Rank {rank}{suffix}'] = students[choice]
+            row[f'I have another project{suffix}'] = 'Yes' if p < projects_per_faculty - 1 else 'No'
+        faculty_rows.append(row)
+
+    return pd.DataFrame(student_rows), pd.DataFrame(faculty_rows)
+
+
+def make_pair_table(n_students, n_projects, slots_per_project=2, seed=0):
+    """
+    Generate a pair table and slot dictionary as returned by process_preferences.
+
+    Every student ranks 6 random projects and every project ranks 5 random
+    students; all other pairs are unranked on both sides.
+
+    Parameters:
+    n_students (int): Number of students
+    n_projects (int): Number of faculty projects
+    slots_per_project (int): Open slots per project
+    seed (int): Random seed
+
+    Returns:
+    tuple: (input_data, faculty_slots)
+    """
+    rng = np.random.default_rng(seed)
+    student_rank = np.full((n_students, n_projects), -1)
+    faculty_rank = np.full((n_students, n_projects), -1)
+    for s in range(n_students):
+        student_rank[s, rng.choice(n_projects, size=min(6, n_projects), replace=False)] = np.arange(1, min(6, n_projects) + 1)
+    for p in range(n_projects):
+        faculty_rank[rng.choice(n_students, size=min(5, n_students), replace=False), p] = np.arange(1, min(5, n_students) + 1)
+
+    # Same scoring as calculate_probability with weight 0.5, penalties 0.5 and 0.15
+    student_score = np.where(student_rank > 0, 1.0 - (student_rank - 1) * 0.15, 0.0)
+    faculty_score = np.where(faculty_rank > 0, 1.0 - (faculty_rank - 1) * 0.15, 0.0)
+    probability = 0.5 * student_score + 0.5 * faculty_score
+    probability = np.where((student_rank > 0) & (faculty_rank > 0), probability, 0.5 * probability)
+
+    faculty_names = [f"Professor {p // 2}" for p in range(n_projects)]
+    project_names = [f"Project {p}" for p in range(n_projects)]
+    faculty_projects = [f"{faculty} - {project}" for faculty, project in zip(faculty_names, project_names)]
+    input_data = pd.DataFrame({
+        'faculty_project': np.tile(faculty_projects, n_students),
+        'student_name': np.repeat([f"Student {s}" for s in range(n_students)], n_projects),
+        'probability_of_match': probability.ravel(),
+        'student_rank': student_rank.ravel(),
+        'faculty_rank': faculty_rank.ravel(),
+        'original_project_name': np.tile(project_names, n_students),
+        'faculty_name': np.tile(faculty_names, n_students),
+    })
+    return input_data, {project: slots_per_project for project in faculty_projects}
+
+# -------------------------- END GENERATOR FUNCTIONS -------------------------
+
+
+def main(argv=None):
+    """Report runtime and peak Python memory of perform_ilp_matching on a synthetic cohort."""
+    from utils import perform_ilp_matching
+
+    parser = argparse.ArgumentParser(description='Benchmark perform_ilp_matching on a synthetic cohort')
+    parser.add_argument('--students', type=int, default=2000)
+    parser.add_argument('--projects', type=int, default=200)
+    args = parser.parse_args(argv)
+
+    input_data, faculty_slots = make_pair_table(args.students, args.projects)
+    tracemalloc.start()
+    start = time.perf_counter()
+    matches = perform_ilp_matching(input_data, faculty_slots)
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{len(input_data)} pairs, {len(matches)} matches: "
+          f"{elapsed:.2f}s, peak memory {peak / 2 ** 20:.1f} MiB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+"""
+Benchmark regression gate for the matching pipeline.
+
+Each benchmark runs a pipeline stage on a generated medium-sized cohort a fixed
+number of times and compares the median runtime and peak traced memory with
+test/benchmark_baseline.json. A test fails when either exceeds the baseline by
+more than BENCHMARK_THRESHOLD (a ratio, default 2.0).
+
+The gate is opt-in, since timings depend on the machine the baseline was recorded on.
+
+Run with:             pytest -m benchmark   (or RUN_BENCHMARKS=1 pytest)
+Refresh the baseline: python test_benchmarks.py --update-baseline
+"""
+
+import argparse
+import json
+import os
+import platform
+import statistics
+import time
+import tracemalloc
+
+import pytest
+
+from synthetic import make_cohort
+from utils import process_preferences, perform_ilp_matching
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'test', 'benchmark_baseline.json')
+
+# Number of timed runs per benchmark; the median is compared
+REPEATS = 5
+
+# Cohort size used by every benchmark
+COHORT = {'n_students': 1500, 'n_faculty': 60, 'projects_per_faculty': 2, 'seed': 0}
+
+
+def _preferences_setup():
+    return make_cohort(**COHORT)
+
+
+def _ilp_setup():
+    student_df, faculty_df = make_cohort(**COHORT)
+    return process_preferences(student_df, faculty_df)
+
+
+# name -> (setup returning the arguments, stage function)
+BENCHMARKS = {
+    'process_preferences': (_preferences_setup, process_preferences),
+    'perform_ilp_matching': (_ilp_setup, perform_ilp_matching),
+}
+
+
+def measure(name):
+    """Run one benchmark and return its median runtime (s) and peak traced memory (MiB)."""
+    setup, stage = BENCHMARKS[name]
+    args = setup()
+
+    timings = []
+    for _ in range(REPEATS):
+        start = time.perf_counter()
+        stage(*args)
+        timings.append(time.perf_counter() - start)
+
+    # Memory is traced in a separate run so tracing does not distort the timings
+    tracemalloc.start()
+    stage(*args)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {'median_seconds': statistics.median(timings), 'peak_memory_mib': peak / 2 ** 20}
+
+
+def load_baseline():
+    """Load the stored baseline, or an empty one if none has been recorded."""
+    if not os.path.exists(BASELINE_PATH):
+        return {'benchmarks': {}}
+    with open(BASELINE_PATH, 'r') as baseline_file:
+        return json.load(baseline_file)
+
+
+def update_baseline():
+    """Re-measure every benchmark and store the results as the new baseline."""
+    baseline = {
+        'cohort': COHORT,
+        'repeats': REPEATS,
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'benchmarks': {name: measure(name) for name in BENCHMARKS},
+    }
+    with open(BASELINE_PATH, 'w') as baseline_file:
+        json.dump(baseline, baseline_file, indent=2, sort_keys=True)
+        baseline_file.write('\n')
+    return baseline
+
+
+@pytest.mark.benchmark
+@pytest.mark.parametrize('name', list(BENCHMARKS))
+def test_benchmark_within_baseline(name):
+    expected = load_baseline()['benchmarks'].get(name)
+    if expected is None:
+        pytest.skip(f"No baseline for '{name}'. Run: python test_benchmarks.py --update-baseline")
+    threshold = float(os.environ.get('BENCHMARK_THRESHOLD', 2.0))
+
+    result = measure(name)
+
+    for metric in ['median_seconds', 'peak_memory_mib']:
+        limit = expected[metric] * threshold
+        assert result[metric] <= limit, (
+            f"{name} {metric} regressed: {result[metric]:.3f} > {limit:.3f} "
+            f"({threshold}x baseline {expected[metric]:.3f})")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Benchmark regression gate')
+    parser.add_argument('--update-baseline', action='store_true', help='Re-measure and store the baseline')
+    args = parser.parse_args()
+    if args.update_baseline:
+        for name, result in update_baseline()['benchmarks'].items():
+            print(f"{name}: {result['median_seconds']:.3f}s, {result['peak_memory_mib']:.1f} MiB")
+        print(f"Baseline written to {BASELINE_PATH}")
+    else:
+        for name in BENCHMARKS:
+            result = measure(name)
+            print(f"{name}: {result['median_seconds']:.3f}s, {result['peak_memory_mib']:.1f} MiB")
@@ -1,3 +1,9 @@
+import os
+import sys
+import time
+
+import numpy as np
+import pulp
 import pytest
 import pandas as pd
 
@@ -7,8 +13,33 @@ from utils import (
     process_preferences,
     assign_mandatory_matches,
     perform_ilp_matching,
+    PairTable,
+    MATCH_COLUMNS,
+    is_totally_unimodular,
+    new_variable,
+    NameIndex,
+    name_resolution_report,
+    name_resolution_warning,
+    matching_objective,
     FACULTY_WEIGHT
 )
+from sweep import build_scenarios, capacity_sweep
+from shell import MatchingShell
+from worker import SolveJob
+from batch import load_manifest, run_batch
+from synthetic import make_pair_table
+from stable import stable_matching, compare_engines, count_blocking_pairs
+from export import export_matches
+import service
+from rounds import RoundPipeline
+from cache import SolutionCache, solve_fingerprint
+from pruning import pruned_matching, top_k_mask
+from planner import connected_components, estimate_problem, plan_solve
+from aggregate import aggregated_matching
+from greedy import greedy_matching, preview_gap
+from metrics import METRIC_FIELDS, build_run_metrics, format_prometheus, write_prometheus_textfile
+from progress import SolverProgress, progress_record, PROGRESS_FIELDS
+from config import set_config_overrides
 
 # ------------------------------
 # Tests for calculate_probability
@@ -191,3 +222,1014 @@ def test_basic_mandatory_match():
 
     # Check that slot is reduced
     assert updated_faculty_slots["Prof. Brown - Project B"] == 0
+
+
+# ------------------------------
+# Tests for capacity_sweep
+# ------------------------------
+def test_capacity_sweep_ranks_extra_slot_first():
+    # Two students want the same single-slot project; one extra slot lets both match.
+    data = [
+        {
+            "faculty_project": "Prof. White - Project X",
+            "student_name": student,
+            "probability_of_match": probability,
+            "student_rank": 1,
+            "faculty_rank": faculty_rank,
+            "original_project_name": "Project X",
+            "faculty_name": "Prof. White"
+        }
+        for student, probability, faculty_rank in [("Dana", 0.9, 2), ("Eli", 0.8, 3)]
+    ]
+    input_df = pd.DataFrame(data)
+    faculty_slots = {"Prof. White - Project X": 1}
+
+    results = capacity_sweep(input_df, faculty_slots, [("Prof. White - Project X", 1)],
+                             budget=1, processes=2)
+
+    # Baseline plus the single extra-slot scenario.
+    assert len(results) == 2
+    best = results.iloc[0]
+    assert best['extra_slots'] == 1
+    assert best['matched'] == 2
+    assert results.iloc[1]['changes'] == 'baseline'
+    assert results.iloc[1]['matched'] == 1
+    assert best['objective'] > results.iloc[1]['objective']
+
+
+def test_build_scenarios_stays_within_budget_and_limit():
+    changes = [(f"Prof. White - Project {i}", extra) for i, extra in enumerate([1, 2, 3, 1])]
+
+    scenarios = build_scenarios(changes, budget=3)
+
+    assert scenarios[0] == ()
+    assert all(sum(extra for _, extra in scenario) <= 3 for scenario in scenarios)
+    assert len(scenarios) == 8
+    # Forty one-slot changes with a budget of forty would be 2**40 scenarios
+    with pytest.raises(ValueError, match="More than 256 scenarios"):
+        build_scenarios([(f"Prof. White - Project {i}", 1) for i in range(40)], budget=40)
+
+
+# ------------------------------
+# Tests for show_matches paging
+# ------------------------------
+def test_show_matches_pages_filters_and_caches_order(capsys):
+    shell = MatchingShell("test/student_responses.csv", "test/faculty_responses.csv")
+    shell.set_matches(pd.read_csv("test/output.csv"))
+    capsys.readouterr()
+
+    shell.do_show_matches("--page 2 --page-size 4 --columns student_name,probability_of_match")
+    output = capsys.readouterr().out
+    assert "page 2 of 3, 9 matches" in output
+    table = output.strip().splitlines()[-4:]
+    assert table[0].split()[0] != "faculty_project"
+    assert "probability_of_match" in shell.sort_orders
+
+    shell.do_show_matches("--faculty 'Professor 1' --max-student-rank 1")
+    output = capsys.readouterr().out
+    rows = [line for line in output.splitlines() if "Professor 1 -" in line]
+    assert len(rows) == 4
+
+    # Replacing the matches drops the cached orderings.
+    shell.set_matches(shell.combined_matches.head(2))
+    assert shell.sort_orders == {}
+
+
+def test_stream_table_writes_rows_block_by_block(monkeypatch, capsys):
+    monkeypatch.setattr("shell.STREAM_BLOCK_ROWS", 2)
+    shell = MatchingShell("test/student_responses.csv", "test/faculty_responses.csv")
+    capsys.readouterr()
+    frame = pd.DataFrame({"name": ["a", "b", "c", "a much longer name"], "value": [0.5, 1.0, 0.25, 2.0]})
+
+    shell.stream_table(frame, np.arange(len(frame)), ["name", "value"])
+
+    lines = capsys.readouterr().out.splitlines()
+    assert lines[0].split() == ["name", "value"]
+    assert [line.split()[-1] for line in lines[1:]] == ["0.5000", "1.0000", "0.2500", "2.0000"]
+    # The first block sets the widths; the long name in the second block widens its column
+    assert len(lines[1]) == len(lines[0])
+    assert lines[4].startswith("a much longer name ")
+
+
+# ------------------------------
+# Tests for background solves
+# ------------------------------
+def test_background_solve_keeps_previous_until_replaced():
+    shell = MatchingShell("test/student_responses.csv", "test/faculty_responses.csv",
+                          "test/excluded_locked.csv", "test/output.csv")
+    previous = shell.combined_matches
+
+    shell.start_solve(rematch=False)
+    # The previous matches stay visible while the solve runs.
+    assert shell.combined_matches is previous
+    shell.wait_for_solve()
+
+    assert shell.solve_job is None
+    assert shell.combined_matches is not previous
+    assert not shell.combined_matches.empty
+    assert shell.combined_matches["student_name"].is_unique
+
+
+def test_solve_job_cancel_stops_solver_process():
+    job = SolveJob("sleep", lambda job: job.run_in_process(time.sleep, 30)).start()
+    job.cancel()
+    assert job.wait(10)
+    assert job.cancelled
+    assert job.result is None
+
+
+# ------------------------------
+# Tests for the batch runner
+# ------------------------------
+def test_run_batch_isolates_failing_cohort(tmp_path):
+    manifest = tmp_path / "manifest.csv"
+    test_dir = os.path.abspath("test")
+    pd.DataFrame([
+        {"name": "dept_a", "student_file": os.path.join(test_dir, "student_responses.csv"),
+         "faculty_file": os.path.join(test_dir, "faculty_responses.csv"), "faculty_weight": 0.3},
+        {"name": "dept_b", "student_file": "missing.csv",
+         "faculty_file": os.path.join(test_dir, "faculty_responses.csv"), "faculty_weight": None},
+    ]).to_csv(manifest, index=False)
+
+    cohorts = load_manifest(str(manifest))
+    assert cohorts[0]["faculty_weight"] == 0.3
+    assert "faculty_weight" not in cohorts[1]
+
+    summary = run_batch(cohorts, str(tmp_path / "out"), processes=2)
+
+    assert list(summary["status"]) == ["ok", "failed"]
+    assert "FileNotFoundError" in summary.iloc[1]["error"]
+    assert (tmp_path / "out" / "dept_a.csv").exists()
+    assert (tmp_path / "out" / "summary.csv").exists()
+    assert summary.iloc[0]["matched"] > 0
+    assert summary.iloc[0]["engine"] == "ilp"
+
+
+# ------------------------------
+# Tests for PairTable
+# ------------------------------
+def test_pair_table_keeps_only_useful_candidates():
+    input_df, faculty_slots = make_pair_table(20, 10, seed=1)
+    excluded = tuple(input_df.loc[input_df['probability_of_match'] > 0, ['faculty_project', 'student_name']].iloc[0])
+    zero_pair = tuple(input_df.loc[input_df['probability_of_match'] == 0, ['faculty_project', 'student_name']].iloc[0])
+    previous = pd.DataFrame([{"faculty_project": zero_pair[0], "student_name": zero_pair[1]}])
+
+    pairs = PairTable.from_frame(input_df, [excluded], previous)
+    candidates = set(zip(pairs.projects[pairs.project], pairs.students[pairs.student]))
+
+    assert excluded not in candidates
+    # Zero-probability pairs are dropped unless they were matched previously.
+    assert zero_pair in candidates
+    assert len(pairs) == (input_df['probability_of_match'] > 0).sum()
+    assert (input_df['probability_of_match'].to_numpy()[pairs.rows] == pairs.probability).all()
+
+    matches = perform_ilp_matching(input_df, faculty_slots, [excluded])
+    assert list(matches.columns) == MATCH_COLUMNS
+    assert matches['student_name'].is_unique
+    assert excluded not in set(zip(matches['faculty_project'], matches['student_name']))
+
+
+def test_ilp_matching_tolerates_solver_round_off(monkeypatch):
+    input_df, faculty_slots = make_pair_table(2, 2, seed=1)
+    input_df["probability_of_match"] = [0.9, 0.8, 0.7, 0.6]
+    # Solver values with round-off: candidates 0 and 2 are taken, 1 is zero, 3 was never set
+    solved = {"match_0": 1 - 1e-7, "match_1": 1e-9, "match_2": 1 + 1e-8, "match_3": None}
+
+    def fake_solve(problem, solver=None):
+        for var in problem.variables():
+            var.varValue = solved[var.name]
+        problem.status = pulp.LpStatusOptimal
+        return problem.status
+
+    monkeypatch.setattr(pulp.LpProblem, "solve", fake_solve)
+    matches = perform_ilp_matching(input_df, faculty_slots)
+
+    rows = PairTable.from_frame(input_df).rows
+    expected = input_df.take(rows[[0, 2]])
+    assert list(zip(matches["faculty_project"], matches["student_name"])) == \
+        list(zip(expected["faculty_project"], expected["student_name"]))
+
+
+# ------------------------------
+# Tests for deferred acceptance
+# ------------------------------
+def test_stable_matching_proposing_side_optimal():
+    # Students and faculty disagree, so each side gets its first choices when it proposes.
+    student_df = pd.DataFrame({
+        "Full Name": ["Ann", "Ben"],
+        "Rank 1": ["Project P", "Project Q"],
+        "Rank 2": ["Project Q", "Project P"]
+    })
+    faculty_df = pd.DataFrame({
+        "Full Name": ["Prof. P", "Prof. Q"],
+        "Project #1": ["Project P", "Project Q"],
+        "Number of Open Slots": [1, 1],
+        "Student Rank 1": ["Ben", "Ann"],
+        "Student Rank 2": ["Ann", "Ben"],
+        "I have another project": [None, None]
+    })
+    input_data, faculty_slots = process_preferences(student_df, faculty_df)
+
+    student_optimal = stable_matching(input_data, faculty_slots, proposing='student')
+    faculty_optimal = stable_matching(input_data, faculty_slots, proposing='faculty')
+
+    assert dict(zip(student_optimal['student_name'], student_optimal['faculty_project'])) == {
+        "Ann": "Prof. P - Project P", "Ben": "Prof. Q - Project Q"}
+    assert dict(zip(faculty_optimal['student_name'], faculty_optimal['faculty_project'])) == {
+        "Ann": "Prof. Q - Project Q", "Ben": "Prof. P - Project P"}
+
+    report = compare_engines({'ilp': (perform_ilp_matching(input_data, faculty_slots), 0.0),
+                              'stable': (student_optimal, 0.0)}, input_data, faculty_slots)
+    assert list(report['blocking_pairs']) == [0, 0]
+    assert report.iloc[0]['objective_gap'] == 0
+
+
+def test_stable_matching_respects_exclusions_and_slots():
+    input_df, faculty_slots = make_pair_table(60, 12, slots_per_project=1, seed=3)
+    excluded = tuple(input_df.loc[input_df['student_rank'] == 1, ['faculty_project', 'student_name']].iloc[0])
+
+    matches = stable_matching(input_df, faculty_slots, [excluded])
+
+    assert matches['student_name'].is_unique
+    assert matches['faculty_project'].value_counts().max() <= 1
+    assert excluded not in set(zip(matches['faculty_project'], matches['student_name']))
+    assert count_blocking_pairs(matches, input_df, faculty_slots, [excluded]) == 0
+
+
+def test_rematching_refuses_stable_engine(capsys):
+    shell = MatchingShell("test/student_responses.csv", "test/faculty_responses.csv",
+                          previous_file="test/output.csv")
+    capsys.readouterr()
+
+    shell.onecmd("run_rematching --engine stable --wait")
+
+    assert "stable engine ignores the previous matching" in capsys.readouterr().out
+    assert shell.solve_job is None
+
+
+# ------------------------------
+# Tests for rank name resolution
+# ------------------------------
+def test_name_index_resolution_order():
+    index = NameIndex(["Machine Learning", "Machine Learnings Lab", "Robotics", "Robotic Arms"])
+
+    assert index.resolve("Robotics") == ("Robotics", "exact", ["Robotics"])
+    assert index.resolve("  machine   LEARNING ")[:2] == ("Machine Learning", "normalized")
+    assert index.resolve("Robotcs")[:2] == ("Robotics", "fuzzy")
+    assert index.resolve("Astronomy")[:2] == (None, "unresolved")
+
+
+def test_process_preferences_resolves_messy_rank_cells():
+    student_df = pd.DataFrame({
+        "Full Name": ["Alice Chen", "Bob Lee"],
+        "Rank 1": ["project alpha ", "Project Betta"],
+        "Rank 2": ["Unknown Project", None]
+    })
+    faculty_df = pd.DataFrame({
+        "Full Name": ["Prof. Smith", "Prof. Jones"],
+        "Project #1": ["Project Alpha", "Project Beta"],
+        "Number of Open Slots": [1, 1],
+        "Student Rank 1": ["alice chen", "Bob  Lee"],
+        "I have another project": [None, None]
+    })
+
+    input_data, _ = process_preferences(student_df, faculty_df)
+    ranks = input_data.set_index(["student_name", "faculty_project"])[["student_rank", "faculty_rank"]]
+
+    assert tuple(ranks.loc[("Alice Chen", "Prof. Smith - Project Alpha")]) == (1, 1)
+    assert tuple(ranks.loc[("Bob Lee", "Prof. Jones - Project Beta")]) == (1, 1)
+
+    report = name_resolution_report(student_df, faculty_df)
+    assert set(report["status"]) == {"normalized", "fuzzy", "unresolved"}
+    assert report.loc[report["status"] == "unresolved", "value"].tolist() == ["Unknown Project"]
+
+
+def test_name_report_names_source_column_and_lists_fuzzy_matches(capsys):
+    student_df = pd.DataFrame({
+        "Full Name": ["Alice Chen"],
+        "Rank 1": [None],
+        "Rank 2": ["Project Betta"]
+    })
+    faculty_df = pd.DataFrame({
+        "Full Name": ["Prof. Jones"],
+        "Project #1": ["Project Beta"],
+        "Number of Open Slots": [1],
+        "Student Rank 1": ["Alice Chen"],
+        "I have another project": [None]
+    })
+
+    issues = []
+    input_data, _ = process_preferences(student_df, faculty_df, issues)
+
+    # The cell is the student's first choice, but it came from the 'Rank 2' column
+    assert input_data["student_rank"].tolist() == [1]
+    report = name_resolution_report(student_df, faculty_df)
+    assert report["column"].tolist() == ["Rank 2"]
+    assert report.to_dict("records") == issues
+    # Solving prints nothing; the warning is built once by whoever loaded the input
+    assert capsys.readouterr().out == ""
+    assert "'Project Betta' was read as 'Project Beta'" in name_resolution_warning(issues)
+    assert name_resolution_warning([]) is None
+
+
+# ------------------------------
+# Tests for export
+# ------------------------------
+def test_export_matches_formats_and_faculty_partitions(tmp_path):
+    matches = pd.read_csv("test/output.csv")
+
+    paths = export_matches(matches, str(tmp_path), ["csv", "jsonl"], by_faculty=True,
+                           compression="gzip", chunk_size=4)
+
+    combined = pd.read_csv(tmp_path / "matches.csv.gz")
+    pd.testing.assert_frame_equal(combined, matches)
+    lines = pd.read_json(tmp_path / "matches.jsonl.gz", lines=True)
+    assert list(lines["student_name"]) == list(matches["student_name"])
+
+    faculty = pd.read_csv(tmp_path / "by_faculty" / "Professor_1.csv.gz")
+    assert len(faculty) == (matches["faculty_name"] == "Professor 1").sum()
+    assert len(paths) == 2 + 2 * matches["faculty_name"].nunique()
+    # Only the final files remain; temporary files were renamed into place.
+    assert not [p for p in tmp_path.rglob("*.tmp")]
+
+
+def test_export_matches_parquet(tmp_path):
+    pytest.importorskip("pyarrow")
+    matches = pd.read_csv("test/output.csv")
+
+    export_matches(matches, str(tmp_path), ["parquet"], chunk_size=4)
+
+    pd.testing.assert_frame_equal(pd.read_parquet(tmp_path / "matches.parquet"), matches)
+
+
+def test_export_matches_parquet_without_matches(tmp_path):
+    pytest.importorskip("pyarrow")
+    matches = pd.read_csv("test/output.csv").iloc[:0]
+
+    export_matches(matches, str(tmp_path), ["parquet"])
+
+    table = pd.read_parquet(tmp_path / "matches.parquet")
+    assert list(table.columns) == list(matches.columns)
+    assert table.empty
+
+
+def test_export_matches_files_follow_umask(tmp_path, monkeypatch):
+    # The umask is read once at import, so the test sets the stored value
+    monkeypatch.setattr("export._UMASK", 0o022)
+    matches = pd.read_csv("test/output.csv")
+
+    export_matches(matches, str(tmp_path), ["csv"])
+
+    assert (tmp_path / "matches.csv").stat().st_mode & 0o777 == 0o644
+
+
+def test_export_matches_cleans_up_when_a_commit_fails(tmp_path, monkeypatch):
+    matches = pd.read_csv("test/output.csv")
+    replace = os.replace
+    calls = []
+
+    def failing_replace(source, target):
+        calls.append(target)
+        if len(calls) == 2:
+            raise OSError("disk full")
+        replace(source, target)
+
+    monkeypatch.setattr(os, "replace", failing_replace)
+    with pytest.raises(OSError):
+        export_matches(matches, str(tmp_path), ["csv", "jsonl"], by_faculty=True)
+
+    assert not [p for p in tmp_path.rglob("*.tmp")]
+
+
+# ------------------------------
+# Tests for the matching service
+# ------------------------------
+def _post(url, payload):
+    import json
+    import urllib.request
+    request = urllib.request.Request(url, json.dumps(payload).encode(), {"Content-Type": "application/json"})
+    with urllib.request.urlopen(request, timeout=60) as response:
+        return json.loads(response.read())
+
+
+def test_service_plain_solve_ignores_previous_file(tmp_path):
+    baseline = service.MatchingService("test/student_responses.csv", "test/faculty_responses.csv")
+    expected = baseline.solve()
+
+    # A previous matching that disagrees with the optimum, weighted as strongly as allowed
+    previous = baseline.matches.copy()
+    previous["student_name"] = list(previous["student_name"][1:]) + [previous["student_name"].iloc[0]]
+    previous_file = tmp_path / "previous.csv"
+    previous.to_csv(previous_file, index=False)
+    matching = service.MatchingService("test/student_responses.csv", "test/faculty_responses.csv",
+                                       previous_file=str(previous_file))
+    matching.set_config({"similarity_weight": 0.5})
+    baseline.set_config({"similarity_weight": 0.5})
+
+    plain = matching.solve()
+    assert plain["objective"] == pytest.approx(baseline.solve()["objective"])
+    assert plain["objective"] == pytest.approx(expected["objective"])
+    assert set(zip(matching.matches["faculty_project"], matching.matches["student_name"])) == \
+        set(zip(baseline.matches["faculty_project"], baseline.matches["student_name"]))
+
+    # A rematch reports the objective of the problem it solved
+    matching.matches = None
+    rematch = matching.solve(rematch=True)
+    set_config_overrides({"similarity_weight": 0.5})
+    try:
+        assert rematch["objective"] == pytest.approx(matching_objective(matching.matches, previous))
+    finally:
+        set_config_overrides({})
+
+
+def test_service_coalesces_concurrent_solves(monkeypatch):
+    import json
+    import threading
+    import urllib.error
+    import urllib.request
+
+    matching = service.MatchingService("test/student_responses.csv", "test/faculty_responses.csv")
+    run_solve = matching.run_solve
+
+    def slow_solve(*args):
+        time.sleep(0.5)
+        return run_solve(*args)
+    monkeypatch.setattr(matching, "run_solve", slow_solve)
+
+    server = service.make_server(matching, port=0)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_address[1]}"
+    try:
+        results = []
+        clients = [threading.Thread(target=lambda: results.append(_post(url + "/solve", {}))) for _ in range(3)]
+        for client in clients:
+            client.start()
+            time.sleep(0.05)
+        for client in clients:
+            client.join()
+
+        assert matching.solve_count == 1
+        assert {result["solve_id"] for result in results} == {1}
+        assert sorted(result["shared"] for result in results) == [False, True, True]
+
+        # An edit bumps the state version, so the next solve runs again.
+        # (Mutual first choices are always matched, so exclude a different pair.)
+        matches = matching.matches
+        student = matches[(matches["student_rank"] != 1) | (matches["faculty_rank"] != 1)].iloc[0]
+        project = student["faculty_project"].split(" - ", 1)[1]
+        _post(url + "/exclude", {"faculty": student["faculty_name"], "project": project,
+                                 "student": student["student_name"]})
+        assert _post(url + "/solve", {})["solve_id"] == 2
+        with urllib.request.urlopen(url + "/matches?student=" + student["student_name"].replace(" ", "+")) as response:
+            matches = json.loads(response.read())["matches"]
+        assert all(match["faculty_project"] != student["faculty_project"] for match in matches)
+
+        # Flags must be JSON booleans; the string "false" would otherwise read as true
+        with pytest.raises(urllib.error.HTTPError) as error:
+            _post(url + "/solve", {"rematch": "false"})
+        assert error.value.code == 400
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def test_service_keeps_newest_result_when_solves_finish_out_of_order():
+    matching = service.MatchingService("test/student_responses.csv", "test/faculty_responses.csv")
+    matching.set_config({"faculty_weight": 0.9})
+    newer = matching.run_solve(matching.version, dict(matching.config), [], [], None)
+    stored = matching.matches
+
+    older = matching.run_solve(matching.version - 1, dict(matching.config, faculty_weight=0.5), [], [], None)
+
+    assert not newer["stale"] and older["stale"]
+    assert matching.matches is stored
+    assert matching.last_solve["solve_id"] == newer["solve_id"]
+
+
+# ------------------------------
+# Tests for multi-round matching
+# ------------------------------
+def test_round_pipeline_solves_residual_problem():
+    input_df, faculty_slots = make_pair_table(30, 6, slots_per_project=2, seed=2)
+    pipeline = RoundPipeline(input_df, faculty_slots)
+
+    first = pipeline.run_round()
+    residual_slots = pipeline.residual()[1]
+    assert sum(residual_slots.values()) == 12 - len(first.matches)
+
+    full = [project for project, count in residual_slots.items() if count == 0]
+    second = pipeline.run_round("late", extra_slots=[(full[0], 3)])
+    # Only the unmatched students are left, and only open projects take part.
+    assert len(second.input_data) == (30 - len(first.matches)) * 6
+    assert second.faculty_slots[full[0]] == 3
+    assert set(second.matches["faculty_project"]) <= {project for project, count in second.faculty_slots.items()
+                                                      if count > 0}
+    assert (second.matches["faculty_project"] == full[0]).sum() == 3
+
+    all_matches = pipeline.all_matches()
+    assert all_matches["student_name"].is_unique
+    assert list(pipeline.summary()["round"]) == ["round 1", "late"]
+
+
+# ------------------------------
+# Tests for what-if sandboxes
+# ------------------------------
+def test_sandbox_edits_stay_in_overlay_until_commit(tmp_path, capsys):
+    locking_file = tmp_path / "locking.csv"
+    pd.DataFrame(columns=["Faculty Name", "Project", "Student Name", "Locked", "Excluded"]).to_csv(locking_file,
+                                                                                                 index=False)
+    shell = MatchingShell("test/student_responses.csv", "test/faculty_responses.csv", str(locking_file))
+    shell.process_data(rematch=False)
+    matches = shell.combined_matches
+    target = matches[(matches["student_rank"] != 1) | (matches["faculty_rank"] != 1)].iloc[0]
+    project = target["faculty_project"].split(" - ", 1)[1]
+
+    shell.onecmd("sandbox new trial")
+    shell.onecmd(f"exclude -f '{target['faculty_name']}' -p '{project}' -s '{target['student_name']}'")
+    # The edit is only recorded in the sandbox.
+    assert pd.read_csv(locking_file).empty
+    capsys.readouterr()
+
+    shell.onecmd("sandbox diff trial")
+    output = capsys.readouterr().out
+    assert target["student_name"] in output
+    trial = shell.sandboxes["trial"].matches
+    assert not ((trial["student_name"] == target["student_name"]) &
+                (trial["faculty_project"] == target["faculty_project"])).any()
+    assert shell.combined_matches is matches
+
+    shell.onecmd("sandbox commit trial")
+    assert shell.active_sandbox is None
+    assert pd.read_csv(locking_file)["Excluded"].tolist() == [True]
+    assert shell.combined_matches.equals(trial.reset_index(drop=True))
+
+
+
+def test_sandbox_commit_waits_for_open_parent(tmp_path, capsys):
+    locking_file = tmp_path / "locking.csv"
+    pd.DataFrame(columns=["Faculty Name", "Project", "Student Name", "Locked", "Excluded"]).to_csv(locking_file,
+                                                                                                 index=False)
+    shell = MatchingShell("test/student_responses.csv", "test/faculty_responses.csv", str(locking_file))
+    shell.process_data(rematch=False)
+    project = next(iter(shell.original_faculty_slots))
+    base_slots = shell.original_faculty_slots[project]
+
+    shell.onecmd("sandbox new parent")
+    shell.onecmd(f"sandbox slots -c '{project}=1'")
+    shell.onecmd("sandbox new child --from parent")
+    capsys.readouterr()
+    shell.onecmd("sandbox commit child")
+    assert "still open" in capsys.readouterr().out
+    assert shell.slot_changes == {} and "child" in shell.sandboxes
+
+    # Solving the parent counts its slot change once
+    shell.solve_sandbox(shell.sandboxes["parent"])
+    assert shell.sandboxes["parent"].apply(None, None, shell.apply_slot_changes(
+        shell.original_faculty_slots))[2][project] == base_slots + 1
+
+    # Committing the parent first rebases the child, which can then be committed
+    shell.onecmd("sandbox commit parent")
+    assert shell.slot_changes == {project: 1} and shell.sandboxes["child"].slot_changes == {}
+    shell.onecmd("sandbox commit child")
+    assert "child" not in shell.sandboxes and shell.slot_changes == {project: 1}
+
+# ------------------------------
+# Tests for the LP relaxation mode
+# ------------------------------
+def test_relax_mode_matches_ilp_objective():
+    input_df, faculty_slots = make_pair_table(60, 12, seed=3)
+    exclusions = [tuple(input_df.loc[input_df['probability_of_match'] > 0,
+                                     ['faculty_project', 'student_name']].iloc[0])]
+
+    exact = perform_ilp_matching(input_df, faculty_slots, exclusions)
+    relaxed = perform_ilp_matching(input_df, faculty_slots, exclusions, relax=True)
+
+    assert relaxed['probability_of_match'].sum() == pytest.approx(exact['probability_of_match'].sum())
+    assert relaxed['student_name'].is_unique
+    assert relaxed.groupby('faculty_project').size().le(pd.Series(faculty_slots)).all()
+
+
+def test_is_totally_unimodular_rejects_side_constraints():
+    problem = pulp.LpProblem("check", pulp.LpMaximize)
+    x = [new_variable(problem, f"match_{i}", 'Continuous') for i in range(3)]
+    problem += pulp.lpSum(x)
+    problem += (x[0] + x[1] <= 1, "Student_Assignment_A")
+    problem += (x[1] + x[2] <= 2, "Faculty_Openings_P")
+    assert is_totally_unimodular(problem)
+
+    # A side constraint outside the two families breaks the guarantee.
+    problem += (x[0] + x[2] <= 1, "Faculty_Balance")
+    assert not is_totally_unimodular(problem)
+
+
+# ------------------------------
+# Tests for top-K candidate pruning
+# ------------------------------
+def test_top_k_mask_keeps_best_candidates_per_student():
+    students = np.array([0, 0, 0, 1, 1])
+    coefficients = np.array([0.1, 0.9, 0.5, 0.2, 0.3])
+    assert top_k_mask(students, coefficients, 1).tolist() == [False, True, False, False, True]
+    keep = np.array([True, False, False, False, False])
+    assert top_k_mask(students, coefficients, 1, keep).tolist() == [True, True, False, False, True]
+
+
+def test_pruned_matching_certifies_ilp_optimum():
+    input_df, faculty_slots = make_pair_table(60, 6, seed=1)
+    stats = {}
+    pruned = pruned_matching(input_df, faculty_slots, k=1, stats=stats)
+    exact = perform_ilp_matching(input_df, faculty_slots)
+
+    # K=1 crowds everyone onto their favourite project, so the certificate must widen K
+    assert stats['certified']
+    assert stats['prune_rounds'] > 1 and stats['top_k'] > 1
+    assert stats['variables'] < stats['candidate_pairs']
+    assert pruned['probability_of_match'].sum() == pytest.approx(exact['probability_of_match'].sum())
+    assert pruned['student_name'].is_unique
+
+
+# ------------------------------
+# Tests for the engine planner
+# ------------------------------
+def test_connected_components_of_candidate_graph():
+    # Students 0-1 share project 0, student 2 reaches student 3 through project 2
+    students = np.array([0, 1, 1, 2, 3, 3])
+    projects = np.array([0, 0, 1, 2, 2, 3])
+    assert connected_components(students, projects, 4, 4).tolist() == [0, 0, 2, 2]
+
+
+def test_plan_solve_picks_engine_by_size():
+    input_df, faculty_slots = make_pair_table(40, 5, seed=0)
+    estimate = estimate_problem(input_df, faculty_slots)
+    assert estimate['students'] == 40 and estimate['components'] >= 1
+    assert plan_solve(estimate).engine == 'ilp'
+
+    mid = dict(estimate, candidate_pairs=20000, candidates_per_student=6.0)
+    assert plan_solve(mid).engine == 'relax'
+    dense = dict(mid, candidates_per_student=40.0)
+    plan = plan_solve(dense, top_k=5)
+    assert plan.engine == 'pruned' and plan.top_k == 5
+    assert plan.describe()[0].startswith("Plan: pruned (top 5)")
+
+
+# ------------------------------
+# Tests for student aggregation
+# ------------------------------
+def test_aggregated_matching_equals_ilp_with_fewer_variables():
+    base, faculty_slots = make_pair_table(30, 6, seed=2)
+    copies = []
+    for copy in range(4):
+        clone = base.copy()
+        clone['student_name'] = clone['student_name'] + f" ({copy})"
+        copies.append(clone)
+    input_df = pd.concat(copies, ignore_index=True)
+    exact = perform_ilp_matching(input_df, faculty_slots)
+    previous = exact.head(10)
+    exclusions = [tuple(exact[['faculty_project', 'student_name']].iloc[-1])]
+
+    stats = {}
+    aggregated = aggregated_matching(input_df, faculty_slots, stats=stats)
+    assert aggregated['probability_of_match'].sum() == pytest.approx(exact['probability_of_match'].sum())
+    assert aggregated['student_name'].is_unique
+    assert aggregated.groupby('faculty_project').size().le(pd.Series(faculty_slots)).all()
+    assert stats['student_classes'] == 30 and stats['variables'] * 4 == len(input_df[input_df['probability_of_match'] > 0])
+    assert aggregated.equals(aggregated_matching(input_df, faculty_slots))
+
+    # Previous matches and exclusions split classes but keep the optimum
+    with_features = aggregated_matching(input_df, faculty_slots, exclusions, previous, relax=True)
+    reference = perform_ilp_matching(input_df, faculty_slots, exclusions, previous)
+    assert matching_objective(with_features, previous) == pytest.approx(matching_objective(reference, previous))
+    assert plan_solve(dict(estimate_problem(input_df, faculty_slots), candidate_pairs=5000)).engine == 'aggregate'
+
+
+# ------------------------------
+# Tests for solver progress
+# ------------------------------
+def test_solver_progress_follows_cbc_log(tmp_path):
+    log_path = tmp_path / "cbc.log"
+    log_path.write_text("Continuous objective value is 233.5 - 0.01 seconds\n"
+                        "Cbc0012I Integer solution of -231.25 found by DiveCoefficient after 40 iterations and 0 nodes (0.05 seconds)\n"
+                        "Cbc0010I After 100 nodes, 3 on tree, -231.25 best solution, best possible -232")
+    progress = SolverProgress(str(log_path))
+    events = progress.poll()
+    # The unfinished last line waits for the next poll
+    assert len(events) == 2
+    assert progress.incumbent == 231.25 and progress.best_bound == 233.5
+    with open(log_path, 'a') as log_file:
+        log_file.write(".5 (0.30 seconds)\n")
+    assert progress.poll() == [{'elapsed_seconds': 0.3, 'incumbent': 231.25, 'best_bound': 232.5,
+                                'gap': pytest.approx(1.25 / 231.25), 'nodes': 100}]
+    assert list(progress_record("unit", "ilp", progress.snapshot())) == PROGRESS_FIELDS
+
+    # A real solve writes its log to log_path and ends with a zero gap
+    input_df, faculty_slots = make_pair_table(40, 8, seed=5)
+    stats = {}
+    perform_ilp_matching(input_df, faculty_slots, stats=stats, log_path=str(tmp_path / "solve.log"))
+    progress = SolverProgress(str(tmp_path / "solve.log"))
+    assert progress.poll()
+    assert progress.incumbent == pytest.approx(stats['solver_objective']) and progress.gap() == pytest.approx(0)
+
+
+def test_failing_watcher_does_not_skip_the_others():
+    job = SolveJob("unit", lambda job: None)
+    calls = []
+
+    def failing():
+        raise RuntimeError("log vanished")
+
+    job.watch(failing)
+    job.watch(lambda: calls.append(1))
+    job._notify_watchers()
+    job._notify_watchers()
+
+    assert calls == [1, 1]
+    assert job.notes == ["Progress reporting failed: log vanished"]
+
+
+# ------------------------------
+# Tests for greedy matching
+# ------------------------------
+def test_greedy_matching_is_feasible_and_reports_gap():
+    input_df, faculty_slots = make_pair_table(200, 20, seed=6)
+    exact = perform_ilp_matching(input_df, faculty_slots)
+    exclusions = [tuple(exact[['faculty_project', 'student_name']].iloc[0])]
+    stats = {}
+    preview = greedy_matching(input_df, faculty_slots, exclusions, stats=stats)
+
+    assert preview['student_name'].is_unique
+    assert preview.groupby('faculty_project').size().le(pd.Series(faculty_slots)).all()
+    assert exclusions[0] not in set(zip(preview['faculty_project'], preview['student_name']))
+    assert stats['solver_objective'] == pytest.approx(preview['probability_of_match'].sum())
+    # The best pair overall is always taken first
+    best = input_df.loc[input_df['probability_of_match'].idxmax()]
+    assert best['student_name'] in set(preview['student_name'])
+
+    # A prebuilt candidate table gives the same preview
+    pairs = PairTable.from_frame(input_df, exclusions)
+    assert preview.equals(greedy_matching(input_df, faculty_slots, exclusions, pairs=pairs))
+
+    gap = preview_gap(preview, perform_ilp_matching(input_df, faculty_slots, exclusions))
+    assert gap['preview_objective'] == pytest.approx(stats['solver_objective'])
+    assert 0 <= gap['gap'] < 0.5
+
+
+# ------------------------------
+# Tests for command scripts
+# ------------------------------
+def test_source_script_defers_edits_and_solves_at_checkpoints(tmp_path, capsys, monkeypatch):
+    locking_file = tmp_path / "locks.csv"
+    pd.read_csv("test/excluded_locked.csv").to_csv(locking_file, index=False)
+    script = tmp_path / "decisions.txt"
+    script.write_text(
+        "# committee decisions\n"
+        'lock -f "Professor B" -p "Sustainable Agriculture Systems" -s "Olivia Chen"\n'
+        "run\n"
+        'exclude -f "Professor A" -p "AI in Education" -s "Liam Parker"\n'
+        'remove_exclusion -f "Professor A" -p "AI in Education" -s "Liam Parker"\n'
+    )
+    shell = MatchingShell("test/student_responses.csv", "test/faculty_responses.csv", str(locking_file))
+    writes = []
+    monkeypatch.setattr(shell, "commit_sandbox", lambda sandbox, commit=shell.commit_sandbox:
+                        (writes.append(pd.read_csv(locking_file)), commit(sandbox)))
+    capsys.readouterr()
+
+    shell.onecmd(f"source {script}")
+    output = capsys.readouterr().out
+
+    # One flush at the end; the file was untouched while the script ran
+    assert len(writes) == 1 and len(writes[0]) == 3
+    locks = pd.read_csv(locking_file)
+    assert len(locks) == 4 and locks.iloc[-1]["Student Name"] == "Olivia Chen"
+    assert "[run 1]" in output and "[run 2]" in output
+    assert "Script finished: 1 edit(s) written, 2 solve(s)." in output
+    olivia = shell.combined_matches[shell.combined_matches["student_name"] == "Olivia Chen"]
+    assert olivia["faculty_project"].tolist() == ["Professor B - Sustainable Agriculture Systems"]
+    assert shell.script_sandbox is None
+
+
+
+def test_source_script_failure_keeps_previous_matches(tmp_path, capsys):
+    shell = MatchingShell("test/student_responses.csv", "test/faculty_responses.csv")
+    shell.process_data(rematch=False)
+    matches = shell.combined_matches
+    script = tmp_path / "decisions.txt"
+    script.write_text('lock -f "Professor B" -p "Sustainable Agriculture Systems" -s "Olivia Chen"\nrun\n')
+
+    # Without a locking file the lock cannot be committed, so nothing is solved or adopted
+    shell.onecmd(f"source {script}")
+    output = capsys.readouterr().out
+    assert "Script stopped: No locking file" in output and "[run 1]" not in output
+    assert shell.combined_matches is matches and shell.script_sandbox is None
+
+    # A failure after a checkpoint restores the matches from before the script
+    script.write_text("change_faculty_weight 0.2\nrun\nrun_matching --engine relax\n")
+    shell.onecmd(f"source {script}")
+    output = capsys.readouterr().out
+    assert "[run 1]" in output and "not supported in scripts" in output
+    assert shell.combined_matches.equals(matches) and shell.needs_rerun
+    assert shell.run_script(str(script)) is False
+
+
+def test_script_mode_exit_status_reports_failure(tmp_path):
+    import subprocess
+    script = tmp_path / "decisions.txt"
+    command = [sys.executable, "main.py", "test/student_responses.csv", "test/faculty_responses.csv",
+               "--script", str(script)]
+
+    script.write_text("show_config\n")
+    assert subprocess.run(command, capture_output=True).returncode == 0
+    script.write_text("run_matching --engine relax\n")
+    finished = subprocess.run(command, capture_output=True, text=True)
+    assert finished.returncode == 1 and "Script stopped" in finished.stdout
+
+
+# ------------------------------
+# Tests for the stage graph
+# ------------------------------
+def test_stage_graph_reruns_only_invalidated_stages(tmp_path):
+    locking_file = tmp_path / "locks.csv"
+    pd.read_csv("test/excluded_locked.csv").to_csv(locking_file, index=False)
+    shell = MatchingShell("test/student_responses.csv", "test/faculty_responses.csv", str(locking_file))
+    shell.process_data(rematch=False)
+
+    # A new lock re-runs the lock and mandatory stages but not pair generation
+    shell.onecmd('lock -f "Professor B" -p "Sustainable Agriculture Systems" -s "Olivia Chen"')
+    shell.process_data(rematch=False)
+    assert shell.last_metrics['pipeline_stages'] == {'preferences': 'hit', 'slots': 'hit', 'locks': 'recomputed',
+                                                     'mandatory': 'recomputed', 'solve': 'recomputed'}
+
+    # similarity_weight only enters the objective, so every stage before the solve is reused
+    set_config_overrides({'similarity_weight': 0.3})
+    try:
+        shell.process_data(rematch=True)
+    finally:
+        set_config_overrides({})
+    assert shell.last_metrics['pipeline_stages'] == {'preferences': 'hit', 'slots': 'hit', 'locks': 'hit',
+                                                     'mandatory': 'hit', 'solve': 'recomputed'}
+    report = shell.pipeline.report().set_index('stage')
+    assert report.loc['preferences', 'recomputed'] == 1 and report.loc['preferences', 'hits'] == 2
+    assert report.loc['mandatory', 'recomputed'] == 2
+
+
+# ------------------------------
+# Tests for session snapshots
+# ------------------------------
+def test_session_snapshot_resumes_and_detects_stale_inputs(tmp_path, capsys):
+    locking_file = tmp_path / "locks.csv"
+    pd.read_csv("test/excluded_locked.csv").to_csv(locking_file, index=False)
+    shell = MatchingShell("test/student_responses.csv", "test/faculty_responses.csv", str(locking_file))
+    shell.process_data(rematch=False)
+    shell.onecmd("change_sort -f")
+    snapshot = tmp_path / "session.pkl"
+    shell.onecmd(f"save_session {snapshot}")
+
+    resumed = MatchingShell(None, None, session_file=str(snapshot))
+    assert resumed.locking_file == str(locking_file)
+    assert resumed.combined_matches.equals(shell.combined_matches)
+    assert resumed.sort == "faculty_project" and not resumed.needs_rerun
+    # The preprocessed stages come back too, so the next solve reuses them
+    resumed.process_data(rematch=False)
+    assert resumed.last_metrics['pipeline_stages']['preferences'] == 'hit'
+
+    with open(locking_file, "a") as handle:
+        handle.write("Professor X,Project Y,Student Z,False,True\n")
+    capsys.readouterr()
+    assert not shell.resume_session(str(snapshot))
+    assert "stale: locking_file changed" in capsys.readouterr().out
+    assert shell.resume_session(str(snapshot), force=True) and shell.needs_rerun
+
+
+def test_resume_without_snapshot_or_input_files_exits(tmp_path, capsys):
+    with pytest.raises(SystemExit):
+        MatchingShell(None, None, session_file=str(tmp_path / "missing.pkl"))
+
+    output = capsys.readouterr().out
+    assert "Could not load session" in output
+    assert "no input files were given" in output
+
+
+# ------------------------------
+# Tests for the solution cache
+# ------------------------------
+def test_solution_cache_lru_and_disk(tmp_path):
+    input_df, faculty_slots = make_pair_table(10, 4)
+    base = solve_fingerprint(input_df, faculty_slots, config={"faculty_weight": 0.5})
+    assert base == solve_fingerprint(input_df.copy(), dict(faculty_slots), config={"faculty_weight": 0.5})
+    assert base != solve_fingerprint(input_df, faculty_slots, config={"faculty_weight": 0.6})
+    assert base != solve_fingerprint(input_df, faculty_slots, exclusions=[("x", "y")],
+                                     config={"faculty_weight": 0.5})
+
+    cache = SolutionCache(max_entries=2, directory=str(tmp_path))
+    cache.put("a", 1)
+    cache.put("b", 2)
+    assert cache.get("a") == 1
+    cache.put("c", 3)  # evicts "b", the least recently used
+    assert cache.get("b") is None
+    assert cache.stats()["hits"] == 1 and cache.stats()["misses"] == 1
+
+    reloaded = SolutionCache(max_entries=2, directory=str(tmp_path))
+    assert reloaded.get("c") == 3
+    assert sorted(os.listdir(tmp_path)) == ["a.pkl", "c.pkl"]
+
+
+def test_shell_reuses_cached_solve():
+    shell = MatchingShell("test/student_responses.csv", "test/faculty_responses.csv")
+    shell.process_data(rematch=False)
+    first = shell.combined_matches
+    shell.process_data(rematch=False)
+
+    assert shell.solution_cache.stats()["hits"] == 1
+    assert shell.combined_matches.equals(first)
+
+
+# ------------------------------
+# Tests for match lookups
+# ------------------------------
+def test_lookup_commands_answer_from_indexes(capsys):
+    shell = MatchingShell("test/student_responses.csv", "test/faculty_responses.csv")
+    shell.process_data(rematch=False)
+    lookup = shell.lookup()
+    matched = shell.combined_matches.iloc[0]
+    assert lookup.match_of(matched['student_name'])['faculty_project'] == matched['faculty_project']
+    roster = dict((project, matches) for project, _, matches in lookup.roster(matched['faculty_name']))
+    assert matched['student_name'] in set(roster[matched['faculty_project']]['student_name'])
+
+    unmatched = sorted(set(shell.df_student['Full Name']) - set(shell.combined_matches['student_name']))[0]
+    alternatives = lookup.alternatives(unmatched)
+    assert (alternatives['status'] == 'open').all()
+    assert alternatives['probability_of_match'].is_monotonic_decreasing
+    assert set(lookup.candidate_pairs(matched['student_name'])['status']) >= {'matched'}
+
+    capsys.readouterr()
+    shell.onecmd(f"whois {matched['student_name'].lower()}")
+    output = capsys.readouterr().out
+    assert f"resolved to '{matched['student_name']}'" in output and matched['faculty_project'] in output
+    shell.onecmd(f'whois "{unmatched}"')
+    assert f"{unmatched} is unmatched." in capsys.readouterr().out
+
+
+# ------------------------------
+# Tests for run metrics
+# ------------------------------
+def test_run_metrics_schema():
+    input_df, faculty_slots = make_pair_table(30, 6, seed=4)
+    remaining, mandatory, updated_slots = assign_mandatory_matches(input_df, faculty_slots, None)
+    solver_stats = {}
+    matches = perform_ilp_matching(remaining, updated_slots, stats=solver_stats)
+    combined = pd.concat([mandatory, matches], ignore_index=True)
+
+    record = build_run_metrics("unit", "ilp", input_df, faculty_slots, combined, mandatory,
+                               {"preprocess": 0.1, "solve": 0.2}, solver_stats)
+
+    # Field names and types are a stable interface for alerting.
+    assert list(record) == METRIC_FIELDS
+    assert record["schema_version"] == 1
+    for field in ["students", "projects", "total_slots", "pairs", "candidate_pairs", "pruned_pairs",
+                  "variables", "constraints", "matched", "mandatory_matched", "unmatched_students"]:
+        assert isinstance(record[field], int), field
+    assert record["solver_status"] == "Optimal"
+    assert record["gap"] == 0.0
+    assert record["candidate_pairs"] == record["pruned_pairs"] + record["variables"]
+    assert record["matched"] == len(combined)
+    assert sum(record["student_rank_histogram"].values()) == len(combined)
+    assert record["total_seconds"] == pytest.approx(0.3)
+
+    text = format_prometheus([record])
+    assert 'ra_matching_matched{run="unit",engine="ilp"} ' + str(len(combined)) in text
+    assert 'ra_matching_stage_seconds{run="unit",engine="ilp",stage="solve"} 0.2' in text
+
+
+def test_prometheus_textfile_is_readable_by_other_users(tmp_path, monkeypatch):
+    monkeypatch.setattr("export._UMASK", 0o022)
+    input_df, faculty_slots = make_pair_table(10, 4)
+    record = build_run_metrics("unit", "ilp", input_df, faculty_slots, perform_ilp_matching(input_df, faculty_slots))
+
+    write_prometheus_textfile([record], str(tmp_path / "matching.prom"))
+
+    assert (tmp_path / "matching.prom").stat().st_mode & 0o777 == 0o644
+
+
+def test_metrics_cover_cache_hits_heuristics_and_sandboxes(tmp_path):
+    input_df, faculty_slots = make_pair_table(30, 6, seed=4)
+    matches = perform_ilp_matching(input_df, faculty_slots)
+    cached = build_run_metrics("cached", "ilp", input_df, faculty_slots, matches,
+                               solver_stats={"solver_status": "Cached"})
+    greedy = build_run_metrics("greedy", "greedy", input_df, faculty_slots, matches,
+                               solver_stats={"solver_status": "Heuristic"})
+
+    # Neither run is a non-optimal exact solve, so neither may trip an optimality alert
+    text = format_prometheus([cached, greedy])
+    assert "ra_matching_solver_optimal{" not in text
+    assert 'ra_matching_solution_cache_hit{run="cached",engine="ilp"} 1' in text
+    assert 'ra_matching_solution_cache_hit{run="greedy",engine="greedy"} 0' in text
+
+    shell = MatchingShell("test/student_responses.csv", "test/faculty_responses.csv")
+    shell.onecmd(f"metrics --prometheus {tmp_path / 'matching.prom'}")
+    shell.process_data(rematch=False)
+    shell.onecmd("sandbox new trial")
+    shell.onecmd("sandbox solve")
+
+    assert shell.last_metrics["run"] == "sandbox:trial"
+    assert shell.last_metrics["solver_status"] == "Optimal"
+    text = (tmp_path / "matching.prom").read_text()
+    assert 'ra_matching_solver_optimal{run="sandbox:trial",engine="ilp"} 1' in text
+    assert 'run="matching"' in text
@@ -1,7 +1,10 @@
+import numpy as np
 import pandas as pd
 from config import get_config_value, set_config_value
 
+import re
 import sys
+import time
 import pulp
 
 # -------------------------- START CONFIG -------------------------
@@ -48,19 +51,143 @@ def calculate_probability(student_rank, faculty_rank, method='normal'):
         return (faculty_rank_score * FACULTY_WEIGHT) + (student_rank_score * (1 - FACULTY_WEIGHT))
 
 
-def process_preferences(student_prefs_df: pd.DataFrame, faculty_prefs_df: pd.DataFrame):
+def calculate_probabilities(student_rank: np.ndarray, faculty_rank: np.ndarray):
     """
-    Process the raw preference DataFrames into a comprehensive format for ILP matching.
+    Vectorized calculate_probability over arrays of ranks.
+
+    Parameters:
+    student_rank (np.ndarray): Ranks students gave the projects (<= 0 for unranked)
+    faculty_rank (np.ndarray): Ranks faculty gave the students (<= 0 for unranked)
+
+    Returns:
+    np.ndarray: Match probabilities, identical to calculate_probability element-wise
+    """
+    run_config()
+    student_ranked = student_rank > 0
+    faculty_ranked = faculty_rank > 0
+    student_rank_score = np.where(student_ranked, 1.0 - (student_rank - 1) * LOW_RANK_PENALTY, 0)
+    faculty_rank_score = np.where(faculty_ranked, 1.0 - (faculty_rank - 1) * LOW_RANK_PENALTY, 0)
+    combined = (faculty_rank_score * FACULTY_WEIGHT) + (student_rank_score * (1 - FACULTY_WEIGHT))
+
+    probability = np.where(student_ranked, combined, STUDENT_NO_RANK_PENALTY * combined)
+    probability = np.where(faculty_ranked | ~student_ranked, probability, FACULTY_NO_RANK_PENALTY * combined)
+    return np.where(student_ranked | faculty_ranked, probability, 0.0)
+
+
+def normalize_name(name):
+    """Canonical form of a name for matching: case-folded, punctuation removed, single spaces."""
+    return ' '.join(re.sub(r'[^\w\s]', ' ', str(name)).casefold().split())
+
+
+def edit_distance(a, b, max_distance):
+    """
+    Levenshtein distance between a and b, or max_distance + 1 if it is larger.
     
     Parameters:
-        student_prefs_df (pd.DataFrame): DataFrame containing student preferences
-        faculty_prefs_df (pd.DataFrame): DataFrame containing faculty preferences
-        
+    a (str): First string
+    b (str): Second string
+    max_distance (int): Largest distance of interest
+    
     Returns:
-        tuple: (input_data, faculty_slots)
-            - input_data: DataFrame with all possible faculty-student pairs and match probabilities
-            - faculty_slots: Dictionary mapping faculty to their project slots
+    int: Edit distance, capped at max_distance + 1
+    """
+    if abs(len(a) - len(b)) > max_distance:
+        return max_distance + 1
+    previous_row = list(range(len(b) + 1))
+    for i, char_a in enumerate(a, 1):
+        current_row = [i]
+        for j, char_b in enumerate(b, 1):
+            current_row.append(min(previous_row[j] + 1, current_row[j - 1] + 1,
+                                   previous_row[j - 1] + (char_a != char_b)))
+        if min(current_row) > max_distance:
+            return max_distance + 1
+        previous_row = current_row
+    return min(previous_row[-1], max_distance + 1)
+
+
+class NameIndex:
+    """
+    Hash index resolving free-text names to canonical names.
+
+    Lookups try an exact match, then the normalized form, then a fuzzy match
+    (edit distance) against the canonical names that share a blocking key
+    (the first or last three characters of a word). Results are memoized, so
+    each distinct cell value is resolved once.
     """
+
+    def __init__(self, names):
+        self.ids = {}
+        self.normalized = {}
+        self.blocks = {}
+        for name in names:
+            if name in self.ids:
+                continue
+            self.ids[name] = len(self.ids)
+            key = normalize_name(name)
+            self.normalized.setdefault(key, []).append(name)
+            for block in self._blocking_keys(key):
+                self.blocks.setdefault(block, set()).add(key)
+        self.names = list(self.ids)
+        self._resolved = {}
+
+    @staticmethod
+    def _blocking_keys(key):
+        return {part for word in key.split() for part in (('prefix', word[:3]), ('suffix', word[-3:]))}
+
+    @staticmethod
+    def max_distance(key):
+        """Largest edit distance accepted for a fuzzy match of key."""
+        return max(1, min(3, len(key) // 8))
+
+    def resolve(self, value):
+        """
+        Resolve a cell value to a canonical name.
+
+        Parameters:
+        value: Cell value as written in the responses
+
+        Returns:
+        tuple: (name, status, candidates)
+            - name: Canonical name, or None if unresolved or ambiguous
+            - status: 'exact', 'normalized', 'fuzzy', 'ambiguous' or 'unresolved'
+            - candidates: Canonical names that matched equally well
+        """
+        if value in self.ids:
+            return value, 'exact', [value]
+        if value not in self._resolved:
+            self._resolved[value] = self._resolve_slow(value)
+        return self._resolved[value]
+
+    def _resolve_slow(self, value):
+        key = normalize_name(value)
+        if key in self.normalized:
+            matches = self.normalized[key]
+            if len(matches) == 1:
+                return matches[0], 'normalized', matches
+            return None, 'ambiguous', matches
+
+        limit = self.max_distance(key)
+        candidates = set()
+        for block in self._blocking_keys(key):
+            candidates |= self.blocks.get(block, set())
+        best_distance = limit + 1
+        best = []
+        for candidate in candidates:
+            distance = edit_distance(key, candidate, limit)
+            if distance < best_distance:
+                best_distance, best = distance, [candidate]
+            elif distance == best_distance and distance <= limit:
+                best.append(candidate)
+        matches = [name for candidate in sorted(best) for name in self.normalized[candidate]]
+        if not matches:
+            return None, 'unresolved', []
+        if len(matches) > 1:
+            return None, 'ambiguous', matches
+        return matches[0], 'fuzzy', matches
+
+
+def _extract_faculty_projects(faculty_prefs_df: pd.DataFrame):
+    """Read each faculty member's projects, slots and student rankings."""
     # Create a mapping of project names to their details
     faculty_projects = {}
     faculty_slots = {}
@@ -85,7 +212,7 @@ def process_preferences(student_prefs_df: pd.DataFrame, faculty_prefs_df: pd.Dat
             for rank in range(1, 6):  # Assuming max 5 student rankings per project
                 rank_col = f'Student Rank {rank}' if project_num == 1 else f'Student Rank {rank}.{project_num-1}'
                 if rank_col in row and not pd.isna(row[rank_col]):
-                    student_rankings.append(row[rank_col])
+                    student_rankings.append((rank_col, row[rank_col]))
             
             # Store project details
             faculty_projects[full_project_identifier] = {
@@ -105,52 +232,149 @@ def process_preferences(student_prefs_df: pd.DataFrame, faculty_prefs_df: pd.Dat
                 break
                 
             project_num += 1
+
+    return faculty_projects, faculty_slots
+
+
+def resolve_rank_names(student_prefs_df: pd.DataFrame, faculty_projects: dict):
+    """
+    Resolve every rank cell to integer ids and build the rank matrices.
+
+    Parameters:
+        student_prefs_df (pd.DataFrame): DataFrame containing student preferences
+        faculty_projects (dict): Project details from the faculty responses
+
+    Returns:
+        tuple: (students, student_rank, faculty_rank, issues)
+            - students: Unique student names, in input order
+            - student_rank: (students x projects) array of student ranks, -1 if unranked
+            - faculty_rank: (students x projects) array of faculty ranks, -1 if unranked
+            - issues: List of dicts describing rank cells that did not match exactly
+    """
+    student_rows = student_prefs_df.drop_duplicates('Full Name')
+    students = student_rows['Full Name'].to_numpy()
+    project_ids = list(faculty_projects)
+    student_index = NameIndex(students)
+
+    # Projects sharing a title are all ranked by a student who names that title
+    title_projects = {}
+    for p, project in enumerate(faculty_projects.values()):
+        title_projects.setdefault(project['project_name'], []).append(p)
+    project_index = NameIndex(title_projects)
+
+    student_rank = np.full((len(students), len(project_ids)), -1, dtype=np.int64)
+    faculty_rank = np.full((len(students), len(project_ids)), -1, dtype=np.int64)
+    issues = []
+
+    def record(source, who, column, value, status, candidates):
+        if status != 'exact':
+            issues.append({'source': source, 'respondent': who, 'column': column, 'value': value,
+                           'status': status, 'resolved_to': ', '.join(map(str, candidates))})
+
+    rank_columns = [f'Rank {rank}' for rank in range(1, 7) if f'Rank {rank}' in student_rows.columns]
+    for s, row in enumerate(student_rows[['Full Name'] + rank_columns].itertuples(index=False, name=None)):
+        # Ranks skip empty cells, so each cell keeps the name of the column it came from
+        ranked = [(column, value) for column, value in zip(rank_columns, row[1:]) if not pd.isna(value)]
+        for rank, (column, value) in enumerate(ranked, 1):
+            title, status, candidates = project_index.resolve(value)
+            record('student', row[0], column, value, status, candidates)
+            if title is None:
+                continue
+            for p in title_projects[title]:
+                if student_rank[s, p] == -1:
+                    student_rank[s, p] = rank
+
+    for p, (project_identifier, project) in enumerate(faculty_projects.items()):
+        for rank, (column, value) in enumerate(project['student_rankings'], 1):
+            name, status, candidates = student_index.resolve(value)
+            record('faculty', project_identifier, column, value, status, candidates)
+            if name is None:
+                continue
+            s = student_index.ids[name]
+            if faculty_rank[s, p] == -1:
+                faculty_rank[s, p] = rank
+
+    return students, student_rank, faculty_rank, issues
+
+
+def process_preferences(student_prefs_df: pd.DataFrame, faculty_prefs_df: pd.DataFrame, issues: list = None):
+    """
+    Process the raw preference DataFrames into a comprehensive format for ILP matching.
+
+    Rank cells are resolved to project titles and student names through hash
+    indexes (exact, normalized, then fuzzy lookup); cells that cannot be resolved
+    unambiguously count as unranked. Nothing is printed here, since this runs on
+    every solve: callers that load the input warn once (see name_resolution_warning).
     
-    # Generate pairs for ALL students and projects
-    pairs = []
-    students = student_prefs_df['Full Name'].unique()
-    
-    for student_name in students:
-        student_row = student_prefs_df[student_prefs_df['Full Name'] == student_name].iloc[0]
-        
-        # Get student's faculty preferences
-        student_faculty_prefs = []
-        for rank in range(1, 7):
-            rank_col = f'Rank {rank}'
-            if rank_col in student_row and not pd.isna(student_row[rank_col]):
-                student_faculty_prefs.append(student_row[rank_col])
-
-        # Generate match probabilities for ALL projects
-        for project_identifier, project in faculty_projects.items():
-            # Calculate base probability
-            # First, check student's preference for this faculty
-            student_rank = -1
-            for rank, faculty_choice in enumerate(student_faculty_prefs, 1):
-                if faculty_choice == project['project_name']:
-                    student_rank = rank
-                    break
-
-            # Check faculty's ranking of this student
-            faculty_rank = -1
-            for i, ranked_student in enumerate(project['student_rankings'], 1):
-                if ranked_student == student_name:
-                    faculty_rank = i
-                    break
+    Parameters:
+        student_prefs_df (pd.DataFrame): DataFrame containing student preferences
+        faculty_prefs_df (pd.DataFrame): DataFrame containing faculty preferences
+        issues (list): Optional list extended with the rank cells that did not match exactly
         
-            match_probability = calculate_probability(student_rank, faculty_rank)
-            
-            # Append pair information
-            pairs.append({
-                'faculty_project': project_identifier,
-                'student_name': student_name,
-                'probability_of_match': match_probability,
-                'student_rank': student_rank,
-                'faculty_rank': faculty_rank,
-                'original_project_name': project['original_project_name'],
-                'faculty_name': project['faculty_name']
-            })
-    
-    return pd.DataFrame(pairs), faculty_slots
+    Returns:
+        tuple: (input_data, faculty_slots)
+            - input_data: DataFrame with all possible faculty-student pairs and match probabilities
+            - faculty_slots: Dictionary mapping faculty to their project slots
+    """
+    faculty_projects, faculty_slots = _extract_faculty_projects(faculty_prefs_df)
+    students, student_rank, faculty_rank, rank_issues = resolve_rank_names(student_prefs_df, faculty_projects)
+    if issues is not None:
+        issues.extend(rank_issues)
+
+    # Generate pairs for ALL students and projects
+    projects = list(faculty_projects.values())
+    n_students, n_projects = len(students), len(projects)
+    return pd.DataFrame({
+        'faculty_project': np.tile(np.array(list(faculty_projects), dtype=object), n_students),
+        'student_name': np.repeat(students, n_projects),
+        'probability_of_match': calculate_probabilities(student_rank, faculty_rank).ravel(),
+        'student_rank': student_rank.ravel(),
+        'faculty_rank': faculty_rank.ravel(),
+        'original_project_name': np.tile(np.array([p['original_project_name'] for p in projects], dtype=object), n_students),
+        'faculty_name': np.tile(np.array([p['faculty_name'] for p in projects], dtype=object), n_students)
+    }), faculty_slots
+
+
+def name_resolution_report(student_prefs_df: pd.DataFrame, faculty_prefs_df: pd.DataFrame):
+    """
+    List the rank cells that did not exactly match a project title or student name.
+
+    Parameters:
+        student_prefs_df (pd.DataFrame): DataFrame containing student preferences
+        faculty_prefs_df (pd.DataFrame): DataFrame containing faculty preferences
+
+    Returns:
+        pd.DataFrame: One row per inexact cell with columns 'source', 'respondent',
+            'column', 'value', 'status' and 'resolved_to'
+    """
+    faculty_projects, _ = _extract_faculty_projects(faculty_prefs_df)
+    issues = resolve_rank_names(student_prefs_df, faculty_projects)[3]
+    return pd.DataFrame(issues, columns=['source', 'respondent', 'column', 'value', 'status', 'resolved_to'])
+
+
+def name_resolution_warning(issues):
+    """
+    Describe the rank cells that did not match exactly, for printing once per input.
+
+    A fuzzy match may map a name that is not in the responses onto a similar one,
+    so every fuzzy match is listed with the name it was read as.
+
+    Parameters:
+        issues (list): Issue dicts from process_preferences(issues=...) or the
+            records of name_resolution_report
+
+    Returns:
+        str: Warning text, or None if there is nothing to report
+    """
+    unresolved = sum(issue['status'] in ('unresolved', 'ambiguous') for issue in issues)
+    corrected = [issue for issue in issues if issue['status'] == 'fuzzy']
+    if not unresolved and not corrected:
+        return None
+    lines = [f"Warning: {unresolved} rank entries could not be resolved (treated as unranked) and "
+             f"{len(corrected)} were matched approximately. Run 'name_report' for details."]
+    lines += [f"  {issue['source']} '{issue['respondent']}', {issue['column']}: "
+              f"'{issue['value']}' was read as '{issue['resolved_to']}'" for issue in corrected]
+    return '\n'.join(lines)
 
 def process_locks_exclusions(locking_df: pd.DataFrame):
     """
@@ -264,16 +488,173 @@ def assign_mandatory_matches(input_data: pd.DataFrame, faculty_slots: dict, lock
 
 # ---------------------------- END PREPROCESSING FUNCTIONS ----------------
 
+# ---------------------------- START ILP FUNCTIONS ------------------------
+
+# Distance from 1 within which a solved variable counts as a match
+INTEGRALITY_TOLERANCE = 1e-6
+
+# Columns of a matching, in output order
+MATCH_COLUMNS = ['faculty_project', 'student_name', 'probability_of_match', 'student_rank',
+                 'faculty_rank', 'original_project_name', 'faculty_name']
+
+# Constraint families that together form a bipartite incidence matrix (totally unimodular)
+TU_CONSTRAINT_FAMILIES = ('Student_Assignment_', 'Faculty_Openings_')
+
+
+class PairTable:
+    """
+    Compact struct-of-arrays view of the candidate pairs of an ILP.
+
+    Students and projects are stored as integer codes into the 'students' and
+    'projects' name arrays; 'rows' maps each candidate back to its position in
+    the input DataFrame, which is only read again for the matched pairs.
+    """
+
+    __slots__ = ('rows', 'student', 'project', 'probability', 'previous', 'students', 'projects')
+
+    def __init__(self, rows, student, project, probability, previous, students, projects):
+        self.rows = rows
+        self.student = student
+        self.project = project
+        self.probability = probability
+        self.previous = previous
+        self.students = students
+        self.projects = projects
+
+    def __len__(self):
+        return len(self.rows)
+
+    @classmethod
+    def from_frame(cls, input_data: pd.DataFrame, exclusions: list = None, previous: pd.DataFrame = None):
+        """
+        Build the candidate pairs of a pair table.
+
+        Excluded pairs are dropped, as are pairs that can never add to the objective
+        (zero probability and not part of the previous matching).
+
+        Parameters:
+        input_data (pd.DataFrame): Pair table from process_preferences
+        exclusions (list): Optional list of excluded (project, student) tuples
+        previous (pd.DataFrame): Optional previous matching used for the similarity term
+
+        Returns:
+        PairTable: The candidate pairs
+        """
+        probability = input_data['probability_of_match'].to_numpy(dtype=np.float64)
+
+        # Name columns are only read for the rows that can still be candidates:
+        # converting every row of a large pair table costs far more than the solve
+        in_previous = np.zeros(len(input_data), dtype=bool)
+        if previous is not None and not previous.empty:
+            rows = np.flatnonzero(input_data['student_name'].isin(set(previous['student_name'])).to_numpy())
+            pair_index = pd.MultiIndex.from_arrays([input_data['faculty_project'].take(rows).to_numpy(),
+                                                    input_data['student_name'].take(rows).to_numpy()])
+            in_previous[rows] = pair_index.isin(list(zip(previous['faculty_project'], previous['student_name'])))
+        rows = np.flatnonzero((probability > 0) | in_previous)
+        student_names = input_data['student_name'].take(rows).to_numpy()
+        project_names = input_data['faculty_project'].take(rows).to_numpy()
+        if exclusions:
+            allowed = ~pd.MultiIndex.from_arrays([project_names, student_names]).isin(list(exclusions))
+            rows, student_names, project_names = rows[allowed], student_names[allowed], project_names[allowed]
+
+        student_codes, students = pd.factorize(student_names)
+        project_codes, projects = pd.factorize(project_names)
+        return cls(rows, student_codes.astype(np.int32), project_codes.astype(np.int32),
+                   probability[rows], in_previous[rows], students, projects)
+
+
+def solution_values(variables):
+    """
+    Read the solved values of a list of variables into an array.
+
+    Parameters:
+    variables (list): pulp variables, in candidate order
+
+    Returns:
+    np.ndarray: Variable values (unset values read as 0)
+    """
+    return np.fromiter((0.0 if var.varValue is None else var.varValue for var in variables),
+                       dtype=np.float64, count=len(variables))
+
+
+def new_variable(problem, name, cat='Binary'):
+    """
+    Create a [0, 1] decision variable attached to a problem.
+
+    Uses LpProblem.add_variable where pulp provides it and LpVariable otherwise.
+    """
+    if hasattr(problem, 'add_variable'):
+        return problem.add_variable(name, 0, 1, cat=cat)
+    return pulp.LpVariable(name, 0, 1, cat=cat)
+
+
+def problem_constraints(problem):
+    """
+    List the constraints of a problem.
+
+    Calls LpProblem.constraints() where pulp provides it; older pulp exposes a
+    name -> constraint dictionary instead (deprecated, and gone in PuLP 4).
+    """
+    if callable(problem.constraints):
+        return problem.constraints()
+    return list(problem.constraints.values())
+
+
+def is_totally_unimodular(problem):
+    """
+    Check that an LP relaxation of the problem is guaranteed to have integral optimal vertices.
+
+    True when every constraint is a '<=' constraint with an integral right-hand side
+    from one of TU_CONSTRAINT_FAMILIES, all coefficients are 1, and each variable
+    appears in at most one constraint of each family (a bipartite incidence matrix).
+    Any other kind of constraint makes this False.
+
+    Parameters:
+    problem (pulp.LpProblem): Matching problem
+
+    Returns:
+    bool: True if the constraint matrix is known to be totally unimodular
+    """
+    seen = {family: set() for family in TU_CONSTRAINT_FAMILIES}
+    for constraint in problem_constraints(problem):
+        name = constraint.name
+        family = next((family for family in TU_CONSTRAINT_FAMILIES if name.startswith(family)), None)
+        if family is None or constraint.sense != pulp.LpConstraintLE or not float(-constraint.constant).is_integer():
+            return False
+        for var, coefficient in constraint.items():
+            if coefficient != 1 or var.name in seen[family]:
+                return False
+            seen[family].add(var.name)
+    return True
+
+
+def _group_positions(codes, n_groups):
+    """Return, for each code 0..n_groups-1, the positions where it occurs."""
+    order = np.argsort(codes, kind='stable')
+    boundaries = np.searchsorted(codes[order], np.arange(n_groups + 1))
+    return [order[boundaries[g]:boundaries[g + 1]] for g in range(n_groups)]
+
+
 def perform_ilp_matching(input_data: pd.DataFrame, faculty_slots: dict,
-                    exclusions: list = None, previous: pd.DataFrame = None):
+                    exclusions: list = None, previous: pd.DataFrame = None,
+                    warm_start: pd.DataFrame = None, relax: bool = False, stats: dict = None,
+                    log_path: str = None):
     """
-    Solves the faculty-student matching problem using two separate preference DataFrames.
+    Solves the faculty-student matching problem as an ILP over the candidate pairs.
     
     Parameters:
-        student_prefs_df (pd.DataFrame): DataFrame containing student preferences with columns:
-            'Full Name', 'Rank 1', 'Rank 2', etc.
-        faculty_prefs_df (pd.DataFrame): DataFrame containing faculty preferences with columns:
-            'Full Name', 'Project #1', 'Number of Open Slots', 'Student Rank 1', etc.
+        input_data (pd.DataFrame): Pair table from process_preferences (after mandatory matches)
+        faculty_slots (dict): Dictionary mapping faculty projects to number of open slots
+        exclusions (list): Optional list of excluded (project, student) tuples
+        previous (pd.DataFrame): Optional previous matching used for the similarity term
+        warm_start (pd.DataFrame): Optional matching passed to CBC as the initial solution
+        relax (bool): Solve the LP relaxation with continuous [0, 1] variables and
+            fall back to the MIP only if the constraints are not totally unimodular
+            or the LP solution is fractional
+        stats (dict): Optional dictionary filled with model and solver statistics:
+            'candidate_pairs', 'pruned_pairs', 'variables', 'constraints', 'method'
+            ('lp' or 'mip'), 'solver_status', 'solver_objective', 'gap' and 'solve_seconds'
+        log_path (str): Optional file CBC writes its log to while solving (see progress.SolverProgress)
             
     Returns:
         pd.DataFrame: A DataFrame containing the optimal matches with columns:
@@ -282,106 +663,128 @@ def perform_ilp_matching(input_data: pd.DataFrame, faculty_slots: dict,
             - 'probability_of_match': Probability of the match
             - 'student_rank': The rank the student gave this faculty
             - 'faculty_rank': The rank the faculty gave this student
+            - 'original_project_name': Original name of the faculty member's project
+            - 'faculty_name': Name of the faculty member
     """
     run_config()
 
-    # Convert the input DataFrame to a list of dictionaries for easier access
-    pairs = input_data.to_dict("records")
+    pairs = PairTable.from_frame(input_data, exclusions, previous)
+    if stats is None:
+        stats = {}
+    stats.update({'candidate_pairs': len(input_data), 'pruned_pairs': len(input_data) - len(pairs),
+                  'variables': len(pairs), 'constraints': 0, 'method': 'lp' if relax else 'mip',
+                  'solver_status': 'Not Solved', 'solver_objective': None, 'gap': None, 'solve_seconds': 0.0})
+    if len(pairs) == 0:
+        stats.update({'solver_status': 'Empty', 'solver_objective': 0.0, 'gap': 0.0})
+        return pd.DataFrame(columns=MATCH_COLUMNS)
 
     # Initialize the ILP problem to maximize the objective
     problem = pulp.LpProblem("Faculty_Student_Matching", pulp.LpMaximize)
 
-    # Define binary decision variables for each faculty-student pair
-    x = pulp.LpVariable.dicts("match", (range(len(pairs))), cat="Binary")
-
-    # Define the base probability maximization component
-    probability_component = pulp.lpSum(
-        [pairs[i]["probability_of_match"] * x[i] for i in range(len(pairs))]
-    )
+    # Define decision variables for each candidate pair (continuous [0, 1] when relaxing)
+    category = 'Continuous' if relax else 'Binary'
+    x = [new_variable(problem, f"match_{i}", category) for i in range(len(pairs))]
 
-    # Add similarity component if there are previous matchings
+    # Objective: probability of each match, blended with similarity to the previous matching
     if previous is not None:
-        # Convert previous matchings to a set for fast lookup
-        previous_matches = set([(row["faculty_project"], row["student_name"]) 
-                            for _, row in previous.iterrows()])
-        
-        # Define similarity component
-        similarity_component = pulp.lpSum(
-            [x[i] for i in range(len(pairs)) 
-            if (pairs[i]["faculty_project"], pairs[i]["student_name"]) in previous_matches]
-        )
-        
-        # Combined objective with weights
-        problem += (1 - SIMILARITY_WEIGHT) * probability_component + SIMILARITY_WEIGHT * similarity_component
+        coefficients = (1 - SIMILARITY_WEIGHT) * pairs.probability + SIMILARITY_WEIGHT * pairs.previous
     else:
-        # Just use probability component if no previous matchings
-        problem += probability_component
+        coefficients = pairs.probability
+    problem += pulp.LpAffineExpression(zip(x, coefficients.tolist()))
 
     # Constraints: Each student can be matched with at most one faculty project
-    for student in input_data["student_name"].unique():
+    for code, positions in enumerate(_group_positions(pairs.student, len(pairs.students))):
         problem += (
-            pulp.lpSum(
-                [
-                    x[i]
-                    for i in range(len(pairs))
-                    if pairs[i]["student_name"] == student
-                ]
-            )
-            <= 1,
-            f"Student_Assignment_{student}",
+            pulp.LpAffineExpression([(x[i], 1) for i in positions]) <= 1,
+            f"Student_Assignment_{pairs.students[code]}",
         )
 
     # Constraints: Each faculty project can be matched with up to their number of openings
-    for faculty_project, num_openings in faculty_slots.items():
-        problem += (
-            pulp.lpSum(
-                [
-                    x[i]
-                    for i in range(len(pairs))
-                    if pairs[i]["faculty_project"] == faculty_project
-                ]
+    for code, positions in enumerate(_group_positions(pairs.project, len(pairs.projects))):
+        faculty_project = pairs.projects[code]
+        if faculty_project in faculty_slots:
+            problem += (
+                pulp.LpAffineExpression([(x[i], 1) for i in positions]) <= faculty_slots[faculty_project],
+                f"Faculty_Openings_{faculty_project}",
             )
-            <= num_openings,
-            f"Faculty_Openings_{faculty_project}",
-        )
 
-    # Add constraints for exclusions if provided
-    if exclusions and len(exclusions) > 0:
-        for i in range(len(pairs)):
-            faculty_project = pairs[i]["faculty_project"]
-            student_name = pairs[i]["student_name"]
-            
-            # If this pair is in the exclusions list, force its x variable to be 0
-            if (faculty_project, student_name) in exclusions:
-                problem += (
-                    x[i] == 0,
-                    f"Exclusion_{faculty_project}_{student_name}"
-                )
+    # Start from a known matching (e.g. a parent sandbox's solution) when one is given
+    if warm_start is not None and not warm_start.empty:
+        candidate_index = pd.MultiIndex.from_arrays([input_data['faculty_project'].to_numpy()[pairs.rows],
+                                                     input_data['student_name'].to_numpy()[pairs.rows]])
+        initial = candidate_index.isin(list(zip(warm_start['faculty_project'], warm_start['student_name'])))
+        for var, value in zip(x, initial):
+            var.setInitialValue(int(value))
+
+    # The LP relaxation is only exact when the constraint matrix is totally unimodular
+    if relax and not is_totally_unimodular(problem):
+        print("Note: Constraints are not totally unimodular; solving as an ILP instead of the LP relaxation.")
+        relax = False
+        for var in x:
+            var.cat = pulp.LpInteger
 
-    # Solve the ILP problem
-    problem.solve(pulp.PULP_CBC_CMD(msg=False))
+    # Solve the problem (the LP relaxation with the simplex method when relaxing)
+    warm = warm_start is not None and not warm_start.empty
+    stats.update({'constraints': len(problem_constraints(problem)), 'method': 'lp' if relax else 'mip'})
+    solve_start = time.perf_counter()
+    problem.solve(pulp.PULP_CBC_CMD(msg=False, mip=not relax, warmStart=warm and not relax,
+                                        logPath=log_path))
+    stats['solve_seconds'] = time.perf_counter() - solve_start
+    stats['solver_status'] = pulp.LpStatus[problem.status]
 
     # Check if an optimal solution was found
     if pulp.LpStatus[problem.status] != "Optimal":
         print(f"Warning: No optimal solution found. Status: {pulp.LpStatus[problem.status]}")
         return pd.DataFrame()  # Return empty DataFrame if no solution
 
-    # Extract the matches from the solution
-    final_matching = [
-        {
-            "faculty_project": pairs[i]["faculty_project"],
-            "student_name": pairs[i]["student_name"],
-            "probability_of_match": pairs[i]["probability_of_match"],
-            "student_rank": pairs[i]["student_rank"],
-            "faculty_rank": pairs[i]["faculty_rank"],
-            "original_project_name": pairs[i]["original_project_name"],
-            "faculty_name": pairs[i]["faculty_name"]
-        }
-        for i in range(len(pairs))
-        if pulp.value(x[i]) == 1
-    ]
-
-    # Return the final matching as a DataFrame
-    return pd.DataFrame(final_matching)
+    values = solution_values(x)
+    if relax and (np.abs(values - np.round(values)) > INTEGRALITY_TOLERANCE).any():
+        print("Note: LP relaxation solution is fractional; re-solving as an ILP.")
+        for var in x:
+            var.cat = pulp.LpInteger
+        solve_start = time.perf_counter()
+        problem.solve(pulp.PULP_CBC_CMD(msg=False, logPath=log_path))
+        stats['solve_seconds'] += time.perf_counter() - solve_start
+        stats['solver_status'] = pulp.LpStatus[problem.status]
+        stats['method'] = 'mip'
+        if pulp.LpStatus[problem.status] != "Optimal":
+            print(f"Warning: No optimal solution found. Status: {pulp.LpStatus[problem.status]}")
+            return pd.DataFrame()
+        values = solution_values(x)
+
+    # An optimal CBC solve closes the gap; the solver objective excludes mandatory matches
+    stats['solver_objective'] = float(pulp.value(problem.objective) or 0.0)
+    stats['gap'] = 0.0
+
+    # Extract the matches from the solution in one pass, allowing for solver round-off
+    matched = np.flatnonzero(np.abs(values - 1.0) <= INTEGRALITY_TOLERANCE)
+
+    # Return the final matching as a DataFrame, reading only the matched rows
+    return input_data.take(pairs.rows[matched])[MATCH_COLUMNS].reset_index(drop=True)
+
+def matching_objective(matches: pd.DataFrame, previous: pd.DataFrame = None):
+    """
+    Compute the objective value of a complete matching, as perform_ilp_matching scores it.
+
+    Parameters:
+    matches (pd.DataFrame): Matched pairs with 'faculty_project', 'student_name' and 'probability_of_match'
+    previous (pd.DataFrame): Optional previous matching used for the similarity term
+
+    Returns:
+    float: Objective value of the matching
+    """
+    run_config()
+    if matches is None or matches.empty:
+        return 0.0
+
+    probability_component = float(matches['probability_of_match'].sum())
+    if previous is None:
+        return probability_component
+
+    previous_matches = set(zip(previous['faculty_project'], previous['student_name']))
+    similarity_component = sum(
+        1 for pair in zip(matches['faculty_project'], matches['student_name']) if pair in previous_matches
+    )
+    return (1 - SIMILARITY_WEIGHT) * probability_component + SIMILARITY_WEIGHT * similarity_component
 
 # ---------------------------- END ILP FUNCTIONS --------------------------
\ No newline at end of file
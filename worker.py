@@ -0,0 +1,171 @@
+"""Background solve jobs for the matching shell."""
+
+import multiprocessing
+import os
+import signal
+import threading
+import time
+
+# Solver processes are forked from a server that already imported the solver
+# code, so starting one costs milliseconds rather than a fresh interpreter.
+if 'forkserver' in multiprocessing.get_all_start_methods():
+    _CONTEXT = multiprocessing.get_context('forkserver')
+    _CONTEXT.set_forkserver_preload(['utils'])
+else:
+    _CONTEXT = multiprocessing.get_context('spawn')
+
+# How often a waiting job checks for a result or a cancel request (seconds).
+POLL_INTERVAL = 0.05
+
+# How often watchers (e.g. solver progress readers) are called during a solve (seconds).
+WATCH_INTERVAL = 0.5
+
+
+class SolveCancelled(Exception):
+    """Raised inside a job when the user cancels it."""
+
+
+def _process_entry(conn, func, args, kwargs):
+    """Run func in the solver process and send its outcome back to the parent."""
+    if hasattr(os, 'setsid'):
+        # Own process group, so cancelling also stops the CBC child process
+        os.setsid()
+    try:
+        conn.send(('ok', func(*args, **kwargs)))
+    except Exception as e:
+        conn.send(('error', e))
+    finally:
+        conn.close()
+
+
+class SolveJob:
+    """
+    A solve running in a background thread.
+
+    The target is called as target(job, *args). Long-running solver calls should
+    go through job.run_in_process so they can be cancelled; job.set_stage
+    records progress for the status command and job.notes collects messages
+    shown with the result. Callbacks added with job.watch are called while a
+    solver process runs and once more when it ends.
+    """
+
+    def __init__(self, description, target, *args):
+        self.description = description
+        self.stage = 'starting'
+        self.result = None
+        self.error = None
+        self.cancelled = False
+        self.started = time.time()
+        self.finished = None
+        self.on_done = None
+        self.notes = []
+        self.progress = None
+        self._watchers = []
+        self._target = target
+        self._args = args
+        self._cancel_event = threading.Event()
+        self._done_event = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        """Start the job thread."""
+        self._thread.start()
+        return self
+
+    def _run(self):
+        try:
+            self.result = self._target(self, *self._args)
+            self.stage = 'finished'
+        except SolveCancelled:
+            self.cancelled = True
+            self.stage = 'cancelled'
+        except Exception as e:
+            self.error = e
+            self.stage = 'failed'
+        self.finished = time.time()
+        self._done_event.set()
+        if self.on_done is not None:
+            self.on_done(self)
+
+    def set_stage(self, stage):
+        """Record the current stage, stopping early if the job was cancelled."""
+        if self._cancel_event.is_set():
+            raise SolveCancelled()
+        self.stage = stage
+
+    def watch(self, callback):
+        """Call callback() every WATCH_INTERVAL seconds while a solver process runs."""
+        self._watchers.append(callback)
+
+    def _notify_watchers(self):
+        # A failing callback is removed below, so iterate over a copy
+        for callback in list(self._watchers):
+            try:
+                callback()
+            except Exception as e:
+                # Progress reporting must never break the solve
+                self.notes.append(f"Progress reporting failed: {e}")
+                self._watchers.remove(callback)
+
+    def run_in_process(self, func, *args, **kwargs):
+        """
+        Run func(*args, **kwargs) in a separate solver process and return its result.
+
+        Raises SolveCancelled if the job is cancelled before the process finishes;
+        the process and any solver it started are killed.
+        """
+        if self._cancel_event.is_set():
+            raise SolveCancelled()
+
+        parent_conn, child_conn = _CONTEXT.Pipe(duplex=False)
+        process = _CONTEXT.Process(target=_process_entry, args=(child_conn, func, args, kwargs), daemon=True)
+        process.start()
+        child_conn.close()
+        last_watch = time.time()
+        try:
+            while not parent_conn.poll(POLL_INTERVAL):
+                if self._watchers and time.time() - last_watch >= WATCH_INTERVAL:
+                    last_watch = time.time()
+                    self._notify_watchers()
+                if self._cancel_event.is_set():
+                    _kill_process(process)
+                    raise SolveCancelled()
+                if not process.is_alive() and not parent_conn.poll():
+                    raise RuntimeError(f"Solver process exited with code {process.exitcode}")
+            status, value = parent_conn.recv()
+        finally:
+            parent_conn.close()
+            process.join()
+            self._notify_watchers()
+
+        if status == 'error':
+            raise value
+        return value
+
+    def cancel(self):
+        """Ask the job to stop."""
+        self._cancel_event.set()
+
+    def done(self):
+        """True once the job has finished, failed or been cancelled."""
+        return self._done_event.is_set()
+
+    def wait(self, timeout=None):
+        """Block until the job is done; returns True if it finished in time."""
+        return self._done_event.wait(timeout)
+
+    def elapsed(self):
+        """Seconds since the job started (or its total runtime once done)."""
+        end = self.finished if self.finished is not None else time.time()
+        return end - self.started
+
+
+def _kill_process(process):
+    """Kill a solver process together with the processes it started."""
+    try:
+        if hasattr(os, 'killpg'):
+            os.killpg(process.pid, signal.SIGKILL)
+        else:
+            process.terminate()
+    except (ProcessLookupError, PermissionError):
+        process.terminate()